@@ -0,0 +1,151 @@
+"""
+Account deletion: ``DELETE /profile``.
+
+``db.delete(user)`` loads every child collection of the user into memory and
+then fails on (or orphans) the children, all inside one long transaction
+holding the SQLite write lock. Instead deletion has two steps:
+
+1. Lockout, at once and in the request: the password becomes unusable, the
+   email is released (so the address can sign up again) and the profile
+   fields are cleared. ``get_current_user`` refuses locked users, so existing
+   tokens stop working immediately.
+2. Purge: the user's rows are removed table by table with bulk DELETE
+   statements of at most ``ACCOUNT_DELETE_CHUNK`` rows, one short transaction
+   each; nothing is loaded through the ORM. Accounts with at most
+   ``ACCOUNT_DELETE_INLINE_ROWS`` rows are purged in the request, bigger ones
+   by the job worker (``account.purge``). The locked user row stays, with
+   nothing but its id: SQLite hands the id of a deleted last row to the next
+   insert, and the old account's tokens would then open the new account.
+
+Every request gets an ``account_deletions`` row with a random id. Its status
+is public at ``GET /account-deletions/{id}``, since the account can't log in
+anymore.
+"""
+
+import secrets
+from datetime import datetime
+
+from sqlalchemy import delete, func
+
+try:
+    from .config import settings
+    from .database import SessionLocal
+    from .job_queue import enqueue_and_commit
+    from .models import AccountDeletion, Job, Recommendation, UserShard
+    from . import sharding
+except ImportError:
+    from config import settings
+    from database import SessionLocal
+    from job_queue import enqueue_and_commit
+    from models import AccountDeletion, Job, Recommendation, UserShard
+    import sharding
+
+# Not a hash passlib knows, so no password ever matches it
+LOCKED_PASSWORD = "!deleted"
+
+# Rows of the user in the main database besides the user itself
+MAIN_MODELS = (Recommendation, Job)
+
+
+def is_locked(user):
+    return user.hashed_password == LOCKED_PASSWORD
+
+
+def lock(user):
+    user.hashed_password = LOCKED_PASSWORD
+    user.email = f"deleted-{user.id}@deleted.invalid"
+    user.full_name = user.bio = None
+    user.age = user.weight = user.cycle_length = None
+
+
+def deletion_status(deletion):
+    return {
+        "id": deletion.id,
+        "status": deletion.status,
+        "rows_deleted": deletion.rows_deleted,
+        "requested_at": deletion.requested_at,
+        "finished_at": deletion.finished_at,
+    }
+
+
+def count_rows(db, user_db, user_id):
+    rows = sum(user_db.query(func.count()).select_from(model).filter(model.user_id == user_id).scalar()
+               for model in sharding.SHARDED_MODELS)
+    return rows + sum(db.query(func.count()).select_from(model).filter(model.user_id == user_id).scalar()
+                      for model in MAIN_MODELS)
+
+
+def request_deletion(db, user):
+    """Lock ``user`` out and purge the account now or in the background. Returns the AccountDeletion."""
+    lock(user)
+    deletion = AccountDeletion(id=secrets.token_urlsafe(16), user_id=user.id, status="pending", rows_deleted=0)
+    db.add(deletion)
+    db.commit()
+
+    user_db = sharding.user_session(user.id)
+    try:
+        rows = count_rows(db, user_db, user.id)
+    finally:
+        user_db.close()
+    if rows <= settings.ACCOUNT_DELETE_INLINE_ROWS:
+        try:
+            purge(deletion.id)
+        except Exception as e:
+            # The account is locked already; the job worker retries the purge
+            print(f"Inline purge of account deletion {deletion.id} failed: {e}")
+        db.refresh(deletion)
+    if deletion.status != "completed":
+        enqueue_and_commit(db, "account.purge", {"deletion_id": deletion.id}, dedupe_key=f"account.purge:{deletion.id}")
+    return deletion
+
+
+def _delete_chunked(db, model, user_id, chunk):
+    """Delete ``model`` rows of the user ``chunk`` at a time, committing each chunk. Returns the count."""
+    table = model.__table__
+    deleted = 0
+    while True:
+        # Ids first: DELETE ... LIMIT isn't portable
+        ids = [i for (i,) in db.query(model.id).filter(model.user_id == user_id).limit(chunk)]
+        if not ids:
+            return deleted
+        db.execute(delete(table).where(table.c.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+
+
+def purge(deletion_id, chunk=None):
+    """Delete every row of the account of ``deletion_id``; safe to run again after a failure."""
+    chunk = chunk or settings.ACCOUNT_DELETE_CHUNK
+    db = SessionLocal()
+    try:
+        deletion = db.query(AccountDeletion).filter(AccountDeletion.id == deletion_id).first()
+        if deletion is None or deletion.status == "completed":
+            return None
+        user_id = deletion.user_id
+        deletion.status = "running"
+        deletion.error = None
+        db.commit()
+        try:
+            user_db = sharding.user_session(user_id)
+            try:
+                for model in sharding.SHARDED_MODELS:
+                    deletion.rows_deleted += _delete_chunked(user_db, model, user_id, chunk)
+                    db.commit()
+            finally:
+                user_db.close()
+            for model in MAIN_MODELS:
+                deletion.rows_deleted += _delete_chunked(db, model, user_id, chunk)
+            db.execute(delete(UserShard.__table__).where(UserShard.__table__.c.user_id == user_id))
+            deletion.status = "completed"
+            deletion.finished_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            deletion.status = "failed"
+            deletion.error = str(e)[:1000]
+            db.commit()
+            raise
+        sharding.directory.forget(user_id)
+        return {"deletion_id": deletion.id, "rows_deleted": deletion.rows_deleted}
+    finally:
+        db.close()
@@ -0,0 +1,225 @@
+"""
+Admission control and overload shedding.
+
+Every HTTP request needs a slot before it reaches the app. Up to ``limit``
+requests run at once; the rest wait in a bounded queue and are served by
+priority, then arrival order:
+
+- ``high``: sign-in and health (``/auth``, ``/health``, ``/metrics``)
+- ``normal``: everything else
+- ``low``: debug and admin endpoints
+
+When the queue is full a new request is turned away with 503 and
+``Retry-After``, unless it outranks someone already waiting, in which case
+the newest lowest-priority waiter is shed instead. Requests that wait longer
+than ``ADMISSION_QUEUE_TIMEOUT`` are shed too.
+
+The limit adapts with AIMD: every response that starts within
+``ADMISSION_TARGET_LATENCY`` adds 1/limit (about +1 per limit's worth of
+requests), a slower one cuts the limit by ``ADMISSION_DECREASE_FACTOR`` (at
+most once per ``ADMISSION_DECREASE_INTERVAL``). Latency is measured to the
+first response byte, so long streams don't count as slow.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import deque
+
+try:
+    from .config import settings
+    from .metrics import Counter, Gauge
+except ImportError:
+    from config import settings
+    from metrics import Counter, Gauge
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+HIGH_PRIORITY_PREFIXES = ("/auth/", "/health", "/metrics")
+LOW_PRIORITY_PREFIXES = ("/debug/", "/admin/")
+# Long-lived streams would hold slots for minutes; the voice stream has its own limits (voice_limits)
+BYPASS_PATHS = ("/voice-chat/stream", "/events")
+
+ADMITTED = Counter("shecare_admission_admitted", "Requests admitted", ("priority",))
+SHED = Counter("shecare_admission_shed", "Requests rejected with 503", ("priority", "reason"))
+LIMIT = Gauge("shecare_admission_limit", "Current adaptive concurrency limit")
+QUEUED = Gauge("shecare_admission_queue_length", "Requests waiting for a slot")
+
+
+def priority_of(path):
+    if path.startswith(HIGH_PRIORITY_PREFIXES):
+        return "high"
+    if path.startswith(LOW_PRIORITY_PREFIXES):
+        return "low"
+    return "normal"
+
+
+class Shed(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(self, initial_limit=None, min_limit=None, max_limit=None, max_queue=None, queue_timeout=None,
+                 target_latency=None, decrease_factor=None, decrease_interval=None):
+        self.min_limit = min_limit or settings.ADMISSION_MIN_LIMIT
+        self.max_limit = max_limit or settings.ADMISSION_MAX_LIMIT
+        self.limit = float(initial_limit or settings.ADMISSION_INITIAL_LIMIT)
+        self.max_queue = settings.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or settings.ADMISSION_QUEUE_TIMEOUT
+        self.target_latency = target_latency or settings.ADMISSION_TARGET_LATENCY
+        self.decrease_factor = decrease_factor or settings.ADMISSION_DECREASE_FACTOR
+        self.decrease_interval = decrease_interval or settings.ADMISSION_DECREASE_INTERVAL
+        self.in_flight = 0
+        self._waiters = {rank: deque() for rank in PRIORITIES.values()}
+        self._last_decrease = 0.0
+        self.admitted = 0
+        self.shed = 0
+        LIMIT.set(int(self.limit))
+
+    @property
+    def queue_length(self):
+        return sum(len(q) for q in self._waiters.values())
+
+    def _has_capacity(self):
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self, priority):
+        rank = PRIORITIES[priority]
+        if self._has_capacity() and self.queue_length == 0:
+            self.in_flight += 1
+            return
+        if self.queue_length >= self.max_queue and not self._shed_lower_than(rank):
+            raise Shed("queue_full")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[rank].append(future)
+        QUEUED.set(self.queue_length)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._drop(rank, future)
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Handed a slot just as the wait timed out: take it
+                return
+            raise Shed("queue_timeout")
+        except asyncio.CancelledError:
+            self._drop(rank, future)
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(None)
+            raise
+        finally:
+            QUEUED.set(self.queue_length)
+        if future.exception() is not None:
+            raise future.exception()
+
+    def _drop(self, rank, future):
+        try:
+            self._waiters[rank].remove(future)
+        except ValueError:
+            pass
+
+    def _shed_lower_than(self, rank):
+        """Reject the newest waiter with a lower priority than ``rank`` to make room."""
+        for lower in sorted(self._waiters, reverse=True):
+            if lower <= rank:
+                return False
+            if self._waiters[lower]:
+                victim = self._waiters[lower].pop()
+                if not victim.done():
+                    victim.set_exception(Shed("preempted"))
+                return True
+        return False
+
+    def release(self, latency):
+        if latency is not None:
+            self._adapt(latency)
+        self.in_flight -= 1
+        # Hand freed slots to waiters, highest priority first
+        while self._has_capacity():
+            future = self._next_waiter()
+            if future is None:
+                break
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _next_waiter(self):
+        for rank in sorted(self._waiters):
+            queue = self._waiters[rank]
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    return future
+        return None
+
+    def _adapt(self, latency):
+        if latency <= self.target_latency:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.decrease_interval:
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        LIMIT.set(int(self.limit))
+
+    def retry_after(self):
+        return max(1, math.ceil(self.queue_timeout))
+
+    def stats(self):
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queue_length": self.queue_length,
+            "queued_by_priority": {name: len(self._waiters[rank]) for name, rank in PRIORITIES.items()},
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware putting every HTTP request through an AdmissionController."""
+
+    def __init__(self, app, controller=None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(BYPASS_PATHS):
+            return await self.app(scope, receive, send)
+        priority = priority_of(scope["path"])
+        try:
+            await self.controller.acquire(priority)
+        except Shed as e:
+            self.controller.shed += 1
+            SHED.labels(priority, e.reason).inc()
+            return await self._reject(send)
+        self.controller.admitted += 1
+        ADMITTED.labels(priority).inc()
+        started = time.perf_counter()
+        first_byte = None
+
+        async def send_and_time(message):
+            nonlocal first_byte
+            if message["type"] == "http.response.start":
+                first_byte = time.perf_counter() - started
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_time)
+        finally:
+            self.controller.release(first_byte)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "The server is busy. Please try again shortly."}).encode()
+        await send({"type": "http.response.start", "status": 503, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(self.controller.retry_after()).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+
+admission = AdmissionController()
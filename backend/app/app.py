@@ -1,26 +1,82 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Body
+from .startup import startup_stats, mark_import_started, mark_import_finished, FirstRequestTimer
+mark_import_started()
+
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from fastapi import FastAPI, HTTPException, Depends, status, Body, Header, Request, Response
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Any, List, Optional
 import os
 import json
-from dotenv import load_dotenv
-from .models import User, PCOSCheck, CycleEntry, JournalEntry, Recommendation
-from .database import SessionLocal, engine
+import hmac
+import time
+from sqlalchemy import text
+from .models import User, PCOSCheck, CycleEntry, JournalEntry, Recommendation, Job, AccountDeletion
+from .database import SessionLocal, ShardSessions, engine, shard_engines
+from .config import settings
+from .journal_analysis import pipeline as analysis_pipeline, is_low_mood
+from .job_queue import enqueue_and_commit, job_status
+from .overview import latest_activity
+from .omni_client import omni_client
+from .cache import get_cache
+from . import query_counter
+from . import metrics
+from . import profiler
+from . import tracing
+from .health import ReadinessMonitor
+from . import admission
+from . import batch
+from . import sync
+from . import events
+from . import sharding
+from . import archive
+from . import accounts
+from . import mood_trends
+from .quotas import quotas as write_quotas
+from .routes import voice_agent
 from . import models
 
-# Load .env
-env_path = os.path.join(os.path.dirname(__file__), ".env")
-load_dotenv(dotenv_path=env_path)
+# .env is loaded by config.py when settings are first imported
+
+def check_database():
+    """Create missing tables and make sure the database answers."""
+    models.Base.metadata.create_all(bind=engine)
+    sharding.create_tables()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
 
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Runs once per worker before it accepts traffic, instead of at import time
+    await run_in_threadpool(check_database)
+    # The analysis queue is in memory: pick up entries a previous run didn't get to.
+    # With several workers each one requeues them; analysing twice is harmless.
+    await run_in_threadpool(analysis_pipeline.requeue_pending)
+    startup_stats["lifespan_seconds"] = round(time.perf_counter() - started, 4)
+    yield
+    await omni_client.aclose()
 
-app = FastAPI(title="SheCare AI API", version="1.0.0")
+app = FastAPI(title="SheCare AI API", version="1.0.0", lifespan=lifespan,
+              default_response_class=tracing.traced_json_response())
 
+app.add_middleware(FirstRequestTimer)
+app.add_middleware(query_counter.QueryCounter)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiler.ProfilerMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+# Added last, so outermost: responses made by the middlewares above (admission's
+# 503s included) still carry the CORS headers the browser needs to read them
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,8 +84,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+for db_engine in [engine, *shard_engines]:
+    tracing.instrument_engine(db_engine)
+    query_counter.install(db_engine)
+for session_factory in [SessionLocal, *ShardSessions]:
+    sync.install(session_factory)
+    mood_trends.install(session_factory)
+    events.install(session_factory, lambda user_id: live_overview(user_id))
+
+app.include_router(voice_agent.router)
+
+readiness = ReadinessMonitor(engine, omni_client.breaker)
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    # passlib and the bcrypt backend load on the first signup/login, not at startup
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def hash_password(password: str) -> str:
+    with tracing.span("bcrypt.hash"), metrics.BCRYPT_TIME.labels("hash").time():
+        return get_pwd_context().hash(password)
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    with tracing.span("bcrypt.verify"), metrics.BCRYPT_TIME.labels("verify").time():
+        return get_pwd_context().verify(password, hashed_password)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SECRET_KEY", "shecare_secret_key_2024")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
@@ -105,6 +185,15 @@ class CycleEntryOut(BaseModel):
     "from_attributes": True
 }
 
+class BatchRequestItem(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str  # may include a query string
+    body: Optional[Any] = None
+
+class BatchIn(BaseModel):
+    requests: List[BatchRequestItem]
+
 class JournalEntryIn(BaseModel):
     date: Optional[datetime] = None
     mood: str
@@ -115,10 +204,23 @@ class JournalEntryOut(BaseModel):
     date: datetime
     mood: str
     text: str
+    analysis: Optional[str] = None
 
     class Config:
         orm_mode = True
 
+class JobOut(BaseModel):
+    id: int
+    name: str
+    status: str
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    last_error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: datetime
+    updated_at: datetime
+
 class RecommendationOut(BaseModel):
     id: int
     type: str
@@ -130,6 +232,11 @@ class RecommendationOut(BaseModel):
 
 # --- Dependencies ---
 def get_db():
+    context = batch.current()
+    if context is not None and context.db is not None:
+        # A write inside POST /batch uses the batch's session, which the batch closes
+        yield context.db
+        return
     db = SessionLocal()
     try:
         yield db
@@ -152,23 +259,60 @@ from fastapi.security import OAuth2PasswordBearer
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub") or payload.get("id")
-        if user_id is None:
+    context = batch.current()
+    if context is not None:
+        # Sub-request of POST /batch: the batch already authenticated this token
+        if accounts.is_locked(context.user):
+            # An earlier sub-request deleted the account
+            raise HTTPException(status_code=401, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+        return context.user
+    with tracing.span("auth.get_current_user") as auth_span:
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        try:
+            with tracing.span("auth.jwt_decode"):
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: int = payload.get("sub") or payload.get("id")
+            if user_id is None or payload.get("scope"):
+                # Scoped tokens (the /events stream token) are good for nothing else
+                raise credentials_exception
+            token_data = TokenData(user_id=int(user_id))
+        except JWTError:
+            raise credentials_exception
+        user = get_user_by_id(db, user_id=token_data.user_id)
+        if user is None or accounts.is_locked(user):
             raise credentials_exception
-        token_data = TokenData(user_id=int(user_id))
-    except JWTError:
-        raise credentials_exception
-    user = get_user_by_id(db, user_id=token_data.user_id)
-    if user is None:
-        raise credentials_exception
-    return user
+        auth_span.set("user.id", user.id)
+        return user
+
+def get_user_db(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Session for the current user's entries: on the user's shard, or ``get_db``'s without sharding."""
+    if not sharding.enabled():
+        yield db
+        return
+    user_db = sharding.user_session(current_user.id)
+    try:
+        yield user_db
+    finally:
+        user_db.close()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin access required.")
+
+def write_quota(endpoint: str):
+    """Dependency charging one write to the current user's quota for ``endpoint``."""
+    def check(response: Response, current_user: User = Depends(get_current_user)):
+        if not settings.WRITE_QUOTA_ENABLED:
+            return
+        decision = write_quotas.take(current_user.id, endpoint)
+        if not decision.allowed:
+            raise HTTPException(status_code=429, detail="Too many writes. Please slow down.", headers=decision.headers())
+        response.headers.update(decision.headers())
+    return check
 
 # --- API Endpoints ---
 
@@ -176,16 +320,35 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 def read_root():
     return {"message": "Welcome to SheCare AI API", "version": "1.0.0"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
-def health_check():
+async def health_check():
+    database = await readiness.probe.check()
+    if not database["ok"]:
+        return JSONResponse({"status": "unhealthy", "database": "unavailable"}, status_code=503)
     return {"status": "healthy", "database": "connected"}
 
+@app.get("/health/live")
+async def liveness():
+    # No dependencies: only says the event loop is serving requests
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    ready, report = await readiness.report()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
 @app.post("/auth/signup", response_model=UserOut)
 def signup(user: UserCreate, db: Session = Depends(get_db)):
     existing = db.query(User).filter(User.email == user.email).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered.")
-    hashed_pw = pwd_context.hash(user.password)
+    hashed_pw = hash_password(user.password)
     db_user = User(
         email=user.email,
         hashed_password=hashed_pw,
@@ -205,7 +368,7 @@ def login(data: dict = Body(...), db: Session = Depends(get_db)):
     email = data.get("email")
     password = data.get("password")
     user = db.query(User).filter(User.email == email).first()
-    if not user or not pwd_context.verify(password, user.hashed_password):
+    if not user or accounts.is_locked(user) or not verify_password(password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid email or password.")
     access_token = create_access_token(
         data={"user_id": user.id},
@@ -229,17 +392,89 @@ def update_profile(
 ):
     for field, value in data.dict(exclude_unset=True).items():
         if field == "password" and value:
-            setattr(current_user, "hashed_password", pwd_context.hash(value))
+            setattr(current_user, "hashed_password", hash_password(value))
         elif field != "password":
             setattr(current_user, field, value)
     db.commit()
     db.refresh(current_user)
     return UserOut.from_orm(current_user)
 
+@app.delete("/profile")
+def delete_profile(
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Locks the account at once; small accounts are purged right away, big ones in the background (see accounts.py)."""
+    deletion = accounts.request_deletion(db, current_user)
+    if deletion.status != "completed":
+        response.status_code = status.HTTP_202_ACCEPTED
+    return {
+        "message": "Profile deleted." if deletion.status == "completed" else "Profile locked; deleting your data.",
+        "deletion": accounts.deletion_status(deletion),
+        "status_url": f"/account-deletions/{deletion.id}",
+    }
+
+@app.get("/account-deletions/{deletion_id}")
+def get_account_deletion(deletion_id: str, db: Session = Depends(get_db)):
+    # No login: the account is locked by now; the random id is the credential
+    deletion = db.query(AccountDeletion).filter(AccountDeletion.id == deletion_id).first()
+    if not deletion:
+        raise HTTPException(status_code=404, detail="Account deletion not found.")
+    return accounts.deletion_status(deletion)
+
+# --- Batch ---
+batch_dispatcher = batch.Dispatcher(app)
+
+@app.post("/batch")
+async def run_batch(
+    payload: BatchIn,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    error = batch.validate(payload.requests)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    responses = await batch.run(batch_dispatcher, request.scope, payload.requests, current_user, db)
+    return {"responses": responses}
+
+# --- Sync ---
+class JournalChanges(BaseModel):
+    upserted: List[JournalEntryOut]
+    deleted: List[int]
+
+class CycleChanges(BaseModel):
+    upserted: List[CycleEntryOut]
+    deleted: List[int]
+
+class SyncOut(BaseModel):
+    token: str
+    has_more: bool
+    reset: bool  # the token had expired: this is the full state, replace the local copy
+    journal: JournalChanges
+    cycle: CycleChanges
+
+@app.get("/sync", response_model=SyncOut)
+def sync_changes(
+    since: Optional[str] = None,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Journal and cycle entries changed since ``since`` (see sync.py); everything without it."""
+    generation = sharding.directory.generation_of(current_user.id)
+    try:
+        since = None if since is None else sync.decode_token(since, generation)
+        token, changes, has_more, reset = sync.changes(db, current_user.id, since, generation=generation)
+    except sync.InvalidToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    archive.load_texts(db, changes["journal"]["upserted"])
+    return {"token": token, "has_more": has_more, "reset": reset, **changes}
+
 # --- Dashboard ---
 @app.get("/dashboard")
 def get_dashboard(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     latest_cycle = db.query(CycleEntry).filter(CycleEntry.user_id == current_user.id).order_by(CycleEntry.start_date.desc()).first()
@@ -263,10 +498,10 @@ def get_dashboard(
     }
 
 # --- PCOS Checker ---
-@app.post("/pcos-checker", response_model=PCOSCheckOut)
+@app.post("/pcos-checker", response_model=PCOSCheckOut, dependencies=[Depends(write_quota("pcos-checker"))])
 def pcos_checker(
     form: dict = Body(...),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     # Extract data from the form
@@ -340,7 +575,7 @@ def pcos_checker(
 @app.delete("/pcos-checker/{pcos_id}")
 def delete_pcos_check(
     pcos_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     entry = db.query(PCOSCheck).filter(
@@ -356,15 +591,15 @@ def delete_pcos_check(
 # --- Cycle Tracker ---
 @app.get("/cycle-tracker", response_model=List[CycleEntryOut])
 def get_cycle_entries(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     return db.query(CycleEntry).filter(CycleEntry.user_id == current_user.id).all()
 
-@app.post("/cycle-tracker", response_model=CycleEntryOut)
+@app.post("/cycle-tracker", response_model=CycleEntryOut, dependencies=[Depends(write_quota("cycle-tracker"))])
 def add_cycle_entry(
     data: CycleEntryIn,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     # Convert date strings to datetime objects
@@ -385,7 +620,7 @@ def add_cycle_entry(
 @app.delete("/cycle-tracker/{entry_id}")
 def delete_cycle_entry(
     entry_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     entry = db.query(CycleEntry).filter(
@@ -401,15 +636,31 @@ def delete_cycle_entry(
 # --- Journal ---
 @app.get("/journal", response_model=List[JournalEntryOut])
 def get_journal_entries(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Texts of old entries come from the compressed archive (see archive.py)
+    return archive.load_texts(db, db.query(JournalEntry).filter(JournalEntry.user_id == current_user.id).all())
+
+@app.get("/journal/mood-trends")
+def get_mood_trends(
+    granularity: str = "day",
+    periods: Optional[int] = None,
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
-    return db.query(JournalEntry).filter(JournalEntry.user_id == current_user.id).all()
+    """Entries per mood label per day, week or month, and journaling streaks (see mood_trends.py)."""
+    if granularity not in mood_trends.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(mood_trends.GRANULARITIES)}.")
+    periods = periods or mood_trends.DEFAULT_PERIODS[granularity]
+    if not 1 <= periods <= settings.MOOD_TRENDS_MAX_PERIODS:
+        raise HTTPException(status_code=400, detail=f"periods must be between 1 and {settings.MOOD_TRENDS_MAX_PERIODS}.")
+    return mood_trends.trends(db, current_user.id, granularity, periods)
 
-@app.post("/journal", response_model=JournalEntryOut)
+@app.post("/journal", response_model=JournalEntryOut, dependencies=[Depends(write_quota("journal"))])
 def add_journal_entry(
     data: JournalEntryIn,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     entry = JournalEntry(
@@ -421,12 +672,14 @@ def add_journal_entry(
     db.add(entry)
     db.commit()
     db.refresh(entry)
+    # Sentiment/keyword/symptom analysis happens in the background
+    analysis_pipeline.submit(entry.id, sharding.directory.shard_of(current_user.id) if sharding.enabled() else None)
     return entry
 
 @app.delete("/journal/{journal_id}")
 def delete_journal_entry(
     journal_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     entry = db.query(JournalEntry).filter(
@@ -436,9 +689,116 @@ def delete_journal_entry(
     if not entry:
         raise HTTPException(status_code=404, detail="Journal entry not found.")
     db.delete(entry)
+    db.flush()
+    # After the DELETE, so an archive run can't slip the text into a block unnoticed (see archive.forget)
+    archive.forget(db, entry)
     db.commit()
     return {"message": "Journal entry deleted."}
 
+@app.get("/admin/journal-analysis", dependencies=[Depends(require_admin)])
+def journal_analysis_stats():
+    return analysis_pipeline.stats()
+
+@app.post("/admin/journal-analysis/backfill", response_model=JobOut, dependencies=[Depends(require_admin)])
+def journal_analysis_backfill(force: bool = False, db: Session = Depends(get_db)):
+    # Runs in the job worker; a backfill that is already pending is reused
+    job = enqueue_and_commit(db, "journal.backfill", {"force": force}, dedupe_key="journal.backfill")
+    return job_status(job)
+
+@app.get("/admin/journal-archive", dependencies=[Depends(require_admin)])
+def journal_archive_stats():
+    # Hot and archived journal storage of every shard, read in parallel
+    return archive.total(sharding.fan_out(archive.stats))
+
+@app.post("/admin/journal-archive", response_model=JobOut, dependencies=[Depends(require_admin)])
+def journal_archive_run(older_than_days: Optional[int] = None, db: Session = Depends(get_db)):
+    # Runs in the job worker; a run that is already pending is reused
+    job = enqueue_and_commit(db, "journal.archive", {"older_than_days": older_than_days}, dedupe_key="journal.archive")
+    return job_status(job)
+
+# --- Voice Agent Cache ---
+@app.get("/admin/voice-cache", dependencies=[Depends(require_admin)])
+def voice_cache_stats():
+    return voice_agent.response_cache.stats()
+
+@app.delete("/admin/voice-cache", dependencies=[Depends(require_admin)])
+def clear_voice_cache():
+    voice_agent.response_cache.clear()
+    return {"message": "Voice cache cleared."}
+
+@app.get("/admin/voice-limits", dependencies=[Depends(require_admin)])
+def voice_limits_stats():
+    return voice_agent.limits_stats()
+
+@app.get("/admin/cache", dependencies=[Depends(require_admin)])
+def cache_stats():
+    return get_cache().stats()
+
+@app.delete("/admin/cache", dependencies=[Depends(require_admin)])
+def clear_cache(key: Optional[str] = None):
+    # With a key only that entry is dropped, in every worker
+    if key:
+        get_cache().invalidate(key)
+    else:
+        get_cache().clear()
+    return {"message": "Cache cleared."}
+
+@app.get("/admin/admission", dependencies=[Depends(require_admin)])
+def admission_stats():
+    return admission.admission.stats()
+
+@app.get("/admin/write-quotas", dependencies=[Depends(require_admin)])
+def write_quota_stats():
+    return write_quotas.stats()
+
+@app.get("/admin/events", dependencies=[Depends(require_admin)])
+def event_stream_stats():
+    return events.broker.stats()
+
+@app.get("/admin/shards", dependencies=[Depends(require_admin)])
+def shard_stats():
+    # Counted on every shard at once (see sharding.fan_out)
+    return sharding.stats()
+
+@app.get("/admin/startup", dependencies=[Depends(require_admin)])
+def startup_report():
+    return startup_stats
+
+# --- Request Profiles ---
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    return profiler.store.list()
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile_report(profile_id: str, format: str = "tree"):
+    profile = profiler.store.load(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    if format == "tree":
+        return PlainTextResponse(profiler.call_tree(profile))
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed(profile))
+    return profile
+
+# --- Background Jobs ---
+@app.get("/jobs/{job_id}", response_model=JobOut)
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    job = db.query(Job).filter(Job.id == job_id, Job.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job_status(job)
+
+@app.get("/admin/jobs/{job_id}", response_model=JobOut, dependencies=[Depends(require_admin)])
+def admin_get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job_status(job)
+
 # --- Recommendations ---
 @app.get("/recommendations/public")
 def get_public_recommendations():
@@ -507,15 +867,18 @@ def get_public_recommendations():
         }
     ]
 
-@app.get("/recommendations", response_model=List[RecommendationOut])
-def get_recommendations(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def global_recommendations(db: Session):
+    # Same for every user, so cached
+    return get_cache().get_or_set("recommendations:global", lambda: [
+        {"type": r.type, "text": r.text, "date": r.date.isoformat() if r.date else None}
+        for r in db.query(Recommendation).filter(Recommendation.user_id == None).all()
+    ])
+
+def build_recommendations(latest_cycle, latest_journal, latest_pcos, global_recs):
+    """Recommendations from the user's newest cycle entry, journal entry and PCOS check."""
     recs = []
 
     # 1. Cycle Tracker Data
-    latest_cycle = db.query(CycleEntry).filter(CycleEntry.user_id == current_user.id).order_by(CycleEntry.start_date.desc()).first()
     if latest_cycle:
         recs.append(RecommendationOut(
             id=1001, type="cycle", text="Your period started on {}. Remember to track your symptoms!".format(latest_cycle.start_date.strftime("%b %d")),
@@ -523,15 +886,13 @@ def get_recommendations(
         ))
 
     # 2. Journal Data
-    latest_journal = db.query(JournalEntry).filter(JournalEntry.user_id == current_user.id).order_by(JournalEntry.date.desc()).first()
-    if latest_journal and "sad" in latest_journal.mood.lower():
+    if latest_journal and is_low_mood(latest_journal):
         recs.append(RecommendationOut(
             id=1002, type="mood", text="We noticed a low mood entry. Try some self-care or journaling today! 😊",
             date=latest_journal.date
         ))
 
     # 3. PCOS Checker Data
-    latest_pcos = db.query(PCOSCheck).filter(PCOSCheck.user_id == current_user.id).order_by(PCOSCheck.date.desc()).first()
     if latest_pcos and latest_pcos.risk == "High":
         recs.append(RecommendationOut(
             id=1003, type="pcos", text="Your recent PCOS check suggests high risk. Consider consulting a specialist. 🩺",
@@ -539,13 +900,12 @@ def get_recommendations(
         ))
 
     # Add global recommendations from database
-    global_recs = db.query(Recommendation).filter(Recommendation.user_id == None).all()
     for i, global_rec in enumerate(global_recs):
         recs.append(RecommendationOut(
             id=2000 + i,
-            type=global_rec.type,
-            text=global_rec.text,
-            date=global_rec.date
+            type=global_rec["type"],
+            text=global_rec["text"],
+            date=global_rec["date"]
         ))
 
     # If still no recommendations, add some default ones
@@ -607,6 +967,95 @@ def get_recommendations(
 
     return recs
 
+@app.get("/recommendations", response_model=List[RecommendationOut])
+def get_recommendations(
+    db: Session = Depends(get_db),
+    user_db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user)
+):
+    latest_cycle = user_db.query(CycleEntry).filter(CycleEntry.user_id == current_user.id).order_by(CycleEntry.start_date.desc()).first()
+    latest_journal = user_db.query(JournalEntry).filter(JournalEntry.user_id == current_user.id).order_by(JournalEntry.date.desc()).first()
+    latest_pcos = user_db.query(PCOSCheck).filter(PCOSCheck.user_id == current_user.id).order_by(PCOSCheck.date.desc()).first()
+    return build_recommendations(latest_cycle, latest_journal, latest_pcos, global_recommendations(db))
+
+@app.get("/me/overview")
+def get_overview(
+    db: Session = Depends(get_db),
+    user_db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Profile, dashboard summary and recommendations in one call (see overview.py)."""
+    return {"profile": UserOut.from_orm(current_user), **overview_summary(db, user_db, current_user.id)}
+
+def overview_summary(db: Session, user_db: Session, user_id: int):
+    latest = latest_activity(user_db, user_id)
+    cycle, journal, pcos = latest["cycle"], latest["journal"], latest["pcos"]
+    return {
+        "cycle_day": cycle.start_date.strftime("%Y-%m-%d") if cycle else None,
+        "mood": journal.mood if journal and journal.mood else None,
+        "pcos_risk": pcos.risk if pcos and pcos.risk else None,
+        "recommendations": build_recommendations(cycle, journal, pcos, global_recommendations(db)),
+    }
+
+def live_overview(user_id: int):
+    """JSON-ready overview pushed to /events streams; uses its own short session."""
+    db = SessionLocal()
+    user_db = sharding.user_session(user_id) if sharding.enabled() else db
+    try:
+        return jsonable_encoder(overview_summary(db, user_db, user_id))
+    finally:
+        user_db.close()
+        db.close()
+
+# --- Live updates ---
+EVENTS_TOKEN_SCOPE = "events"
+
+@app.post("/events/token")
+def event_stream_token(current_user: User = Depends(get_current_user)):
+    """
+    Short-lived token for ``GET /events?token=``. EventSource can't set headers,
+    and the access token must not end up in URLs (access logs, proxies).
+    """
+    token = create_access_token({"user_id": current_user.id, "scope": EVENTS_TOKEN_SCOPE},
+                                expires_delta=timedelta(seconds=settings.EVENTS_TOKEN_TTL))
+    return {"token": token, "expires_in": settings.EVENTS_TOKEN_TTL}
+
+def stream_user_id(token: str, stream_token: bool):
+    """User id of an access token, or of a ``/events/token`` token with ``stream_token``."""
+    db = SessionLocal()
+    try:
+        if not stream_token:
+            return get_current_user(token=token, db=db).id
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            payload = {}
+        user = None
+        if payload.get("scope") == EVENTS_TOKEN_SCOPE and payload.get("sub"):
+            user = get_user_by_id(db, int(payload["sub"]))
+        if user is None or accounts.is_locked(user):
+            raise HTTPException(status_code=401, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+        return user.id
+    finally:
+        db.close()
+
+@app.get("/events")
+async def event_stream(request: Request, token: Optional[str] = None):
+    """Server-sent dashboard updates (see events.py): bearer header, or ?token= from POST /events/token."""
+    authorization = request.headers.get("authorization", "")
+    header_token = authorization[7:] if authorization.lower().startswith("bearer ") else None
+    if not token and not header_token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    # No DB session is held while the stream is open
+    user_id = await run_in_threadpool(stream_user_id, token or header_token, bool(token))
+    snapshot = await run_in_threadpool(live_overview, user_id)
+    subscription = events.broker.subscribe(user_id, snapshot)
+    return StreamingResponse(
+        events.stream(subscription, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.delete("/recommendations/{rec_id}")
 def delete_recommendation(
     rec_id: int,
@@ -625,7 +1074,7 @@ def delete_recommendation(
 
 @app.get("/debug/cycle-tracker")
 def debug_cycle_entries(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     entries = db.query(CycleEntry).filter(CycleEntry.user_id == current_user.id).all()
@@ -633,7 +1082,7 @@ def debug_cycle_entries(
 
 @app.get("/debug/pcos-checker")
 def debug_pcos_checks(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     entries = db.query(PCOSCheck).filter(PCOSCheck.user_id == current_user.id).all()
@@ -647,6 +1096,8 @@ def debug_pcos_checks(
             "tips": json.loads(p.tips) if p.tips else []
         })
     return result
+mark_import_finished()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,331 @@
+"""
+Cold storage for old journal texts.
+
+Entries older than ``JOURNAL_ARCHIVE_AFTER_DAYS`` are rarely read, but their
+texts make up most of ``journal_entries``. The archive job moves them into
+``journal_archives``: one block per user and month holding ``{entry id: text}``
+as JSON, compressed with zlib (or zstd, ``JOURNAL_ARCHIVE_CODEC=zstd``, if the
+``zstandard`` package is installed). Similar entries of one month compress far
+better together than one by one.
+
+The entry row stays in ``journal_entries`` with its date, mood and analysis,
+so ids, sync, the dashboard and mood statistics don't change; only ``text``
+becomes NULL. Only analysed entries are archived (run the journal analysis
+backfill first on old data). Reads call ``load_texts``, which fetches the
+blocks of the archived entries in one query and decompresses each block once.
+Deleting an archived entry removes its text from the block too.
+
+Run the job from the job worker (``POST /admin/journal-archive``) or directly:
+
+    python -m app.archive run --older-than-days 365
+    python -m app.archive bench    # storage and read latency of both tiers, in a scratch database
+
+SQLite reuses the space freed in ``journal_entries`` for new rows; ``VACUUM``
+gives it back to the file system.
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+try:
+    from .config import settings
+    from .database import SessionLocal, ShardSessions
+    from .models import JournalArchive, JournalEntry
+except ImportError:
+    from config import settings
+    from database import SessionLocal, ShardSessions
+    from models import JournalArchive, JournalEntry
+
+
+# --- Blocks ---
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("The zstd archive codec needs the zstandard package: pip install zstandard")
+    return zstandard
+
+
+def compress(texts, codec=None):
+    """``(codec, data, raw_bytes)`` of a block holding ``{entry id: text}``."""
+    codec = codec or settings.JOURNAL_ARCHIVE_CODEC
+    raw = json.dumps({str(k): v for k, v in texts.items()}, separators=(",", ":")).encode()
+    if codec == "zstd":
+        data = _zstd().ZstdCompressor(level=min(settings.JOURNAL_ARCHIVE_LEVEL, 22)).compress(raw)
+    elif codec == "zlib":
+        data = zlib.compress(raw, min(settings.JOURNAL_ARCHIVE_LEVEL, 9))
+    else:
+        raise ValueError(f"Unknown journal archive codec {codec!r}")
+    return codec, data, len(raw)
+
+
+def decompress(codec, data):
+    raw = _zstd().ZstdDecompressor().decompress(data) if codec == "zstd" else zlib.decompress(data)
+    return {int(k): v for k, v in json.loads(raw).items()}
+
+
+def month_of(date):
+    return date.strftime("%Y-%m")
+
+
+def _store(db, block, user_id, month, texts, codec=None):
+    if block is None:
+        block = JournalArchive(user_id=user_id, month=month)
+        db.add(block)
+    block.codec, block.data, block.raw_bytes = compress(texts, codec)
+    block.entries = len(texts)
+    block.updated_at = datetime.utcnow()
+    return block
+
+
+def remap(codec, data, new_ids):
+    """A block's ``(codec, data, raw_bytes)`` with entry ids replaced by ``new_ids[old id]``."""
+    return compress({new_ids.get(k, k): v for k, v in decompress(codec, data).items()}, codec)
+
+
+# --- Reading ---
+def load_texts(db, entries):
+    """Fill in the text of archived entries (``text`` is NULL) from their blocks. Returns ``entries``."""
+    missing = [e for e in entries if e.text is None and e.date is not None]
+    if not missing:
+        return entries
+    wanted = {(e.user_id, month_of(e.date)) for e in missing}
+    blocks = db.query(JournalArchive.user_id, JournalArchive.month, JournalArchive.codec, JournalArchive.data).filter(
+        JournalArchive.user_id.in_({user_id for user_id, _ in wanted}),
+        JournalArchive.month.in_({month for _, month in wanted}),
+    ).all()
+    texts = {}
+    for user_id, month, codec, data in blocks:
+        if (user_id, month) in wanted:
+            texts.update(decompress(codec, data))
+    for entry in missing:
+        # Loaded, not changed: a commit must not write the text back to the hot table.
+        # An entry without a text anywhere reads as empty rather than failing the response.
+        set_committed_value(entry, "text", texts.get(entry.id, ""))
+    return entries
+
+
+def forget(db, entry):
+    """
+    Drop a deleted entry's text from its block, if it has one; the caller
+    commits. Call it after the entry's DELETE is flushed: the block is then read
+    under the write lock, so an archive run that committed in between (after
+    ``entry`` was loaded with its text) can't leave the text behind.
+    """
+    if entry.date is None:
+        return
+    block = db.query(JournalArchive).filter(
+        JournalArchive.user_id == entry.user_id,
+        JournalArchive.month == month_of(entry.date),
+    ).first()
+    if block is None:
+        return
+    texts = decompress(block.codec, block.data)
+    if texts.pop(entry.id, None) is None:
+        return
+    if texts:
+        _store(db, block, block.user_id, block.month, texts, block.codec)
+    else:
+        db.delete(block)
+
+
+# --- Archiving ---
+def archive_database(db, cutoff, batch_size=None):
+    """Archive the texts of entries dated before ``cutoff`` in one database. Returns the number archived."""
+    batch_size = batch_size or settings.JOURNAL_ARCHIVE_BATCH_SIZE
+    entries = JournalEntry.__table__
+    archived = 0
+    while True:
+        rows = (db.query(JournalEntry.id, JournalEntry.user_id, JournalEntry.date, JournalEntry.text)
+                # Only analysed entries: the analysis never needs the text again
+                .filter(JournalEntry.date < cutoff, JournalEntry.text.isnot(None), JournalEntry.analysis.isnot(None),
+                        JournalEntry.deleted.isnot(True))
+                .order_by(JournalEntry.user_id, JournalEntry.date)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+        # Not an edit of the entries, so no change log rows for sync. Runs before the blocks are
+        # written and takes the write lock: an entry deleted since the SELECT no longer matches
+        ids = [row[0] for row in rows]
+        cleared = db.execute(update(entries).where(
+            entries.c.id.in_(ids), entries.c.text.isnot(None), entries.c.deleted.isnot(True),
+        ).values(text=None)).rowcount
+        if cleared != len(ids):
+            # Its text must not end up in a block, so the batch starts over without it
+            db.rollback()
+            continue
+        groups = {}  # (user id, month) -> {entry id: text}
+        for entry_id, user_id, date, text in rows:
+            groups.setdefault((user_id, month_of(date)), {})[entry_id] = text
+        existing = db.query(JournalArchive).filter(
+            JournalArchive.user_id.in_({user_id for user_id, _ in groups}),
+            JournalArchive.month.in_({month for _, month in groups}),
+        ).all()
+        blocks = {(block.user_id, block.month): block for block in existing}
+        for (user_id, month), texts in groups.items():
+            block = blocks.get((user_id, month))
+            if block is not None:
+                # Entries of a month archived earlier stay in the same block
+                texts = {**decompress(block.codec, block.data), **texts}
+            _store(db, block, user_id, month, texts)
+        db.commit()
+        archived += len(rows)
+    return archived
+
+
+def run(older_than_days=None, batch_size=None):
+    """Archive old entries in every database (every shard when sharding is on)."""
+    days = settings.JOURNAL_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = 0
+    for session_factory in ShardSessions or [SessionLocal]:
+        db = session_factory()
+        try:
+            archived += archive_database(db, cutoff, batch_size)
+        finally:
+            db.close()
+    return {"archived": archived, "cutoff": cutoff.isoformat()}
+
+
+def stats(db):
+    hot_entries, hot_bytes = db.query(func.count(JournalEntry.id), func.sum(func.length(JournalEntry.text))).filter(
+        JournalEntry.text.isnot(None)).one()
+    blocks, archived, raw_bytes, stored_bytes = db.query(
+        func.count(JournalArchive.id), func.sum(JournalArchive.entries),
+        func.sum(JournalArchive.raw_bytes), func.sum(func.length(JournalArchive.data))).one()
+    return {
+        "hot_entries": hot_entries or 0,
+        "hot_text_bytes": hot_bytes or 0,
+        "blocks": blocks or 0,
+        "archived_entries": archived or 0,
+        "archived_raw_bytes": raw_bytes or 0,
+        "archived_stored_bytes": stored_bytes or 0,
+    }
+
+
+def total(per_database):
+    """``stats`` of several databases added up, with the archive's compression ratio."""
+    summed = {key: sum(s[key] for s in per_database) for key in per_database[0]}
+    stored = summed["archived_stored_bytes"]
+    summed["compression_ratio"] = round(summed["archived_raw_bytes"] / stored, 2) if stored else None
+    return summed
+
+
+# --- Benchmark ---
+def bench(users, entries, days, older_than_days, rounds):
+    """Storage and journal read latency before and after archiving, in the current directory's database."""
+    import os
+    import random
+    import statistics
+    import time
+
+    from sqlalchemy import text
+
+    from .app import check_database
+    from .database import engine
+    from .datagen import MOOD_PHRASES, SHARED_PHRASES
+    from .models import User
+
+    check_database()
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"email": f"archive-bench-{i}@example.com", "hashed_password": "x"}
+                                               for i in range(users)])
+        user_ids = [row[0] for row in conn.execute(User.__table__.select().with_only_columns([User.id]))]
+        rows = []
+        for user_id in user_ids:
+            for _ in range(entries):
+                mood = rng.choice(list(MOOD_PHRASES))
+                phrases = rng.sample(MOOD_PHRASES[mood], min(3, len(MOOD_PHRASES[mood]))) + rng.sample(SHARED_PHRASES, 2)
+                rng.shuffle(phrases)
+                rows.append({"user_id": user_id, "date": now - timedelta(days=rng.uniform(0, days)), "mood": mood,
+                             "text": " ".join(phrases), "analysis": "{}", "deleted": False})
+        conn.execute(JournalEntry.__table__.insert(), rows)
+
+    def measure():
+        with engine.connect() as conn:
+            conn.execute(text("VACUUM"))
+        timings = []
+        for r in range(rounds):
+            db = SessionLocal()
+            started = time.perf_counter()
+            # What GET /journal does
+            load_texts(db, db.query(JournalEntry).filter(JournalEntry.user_id == user_ids[r % len(user_ids)]).all())
+            timings.append((time.perf_counter() - started) * 1000)
+            db.close()
+        db = SessionLocal()
+        try:
+            storage = stats(db)
+        finally:
+            db.close()
+        return {"database_bytes": os.path.getsize("shecare.db"), **storage,
+                "read_p50_ms": round(statistics.median(timings), 3), "read_mean_ms": round(statistics.fmean(timings), 3)}
+
+    before = measure()
+    started = time.perf_counter()
+    job = run(older_than_days)
+    archive_seconds = time.perf_counter() - started
+    after = measure()
+    after["compression_ratio"] = total([after])["compression_ratio"]
+    return {
+        "users": users, "entries_per_user": entries, "history_days": days, "older_than_days": older_than_days,
+        "codec": settings.JOURNAL_ARCHIVE_CODEC, "archived": job["archived"], "archive_seconds": round(archive_seconds, 2),
+        "all_hot": before, "archived_tier": after,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SheCare journal cold storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_cmd = sub.add_parser("run", help="archive the texts of old journal entries")
+    run_cmd.add_argument("--older-than-days", type=int, default=settings.JOURNAL_ARCHIVE_AFTER_DAYS)
+    run_cmd.add_argument("--batch-size", type=int, default=settings.JOURNAL_ARCHIVE_BATCH_SIZE)
+    bench_cmd = sub.add_parser("bench", help="storage and read latency of hot and archived entries")
+    bench_cmd.add_argument("--users", type=int, default=200)
+    bench_cmd.add_argument("--entries", type=int, default=300, help="journal entries per user")
+    bench_cmd.add_argument("--days", type=int, default=1095, help="history the entries are spread over")
+    bench_cmd.add_argument("--older-than-days", type=int, default=90)
+    bench_cmd.add_argument("--rounds", type=int, default=200)
+    bench_cmd.add_argument("--here", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        try:
+            from .database import engine
+            from .models import Base
+            from . import sharding
+        except ImportError:
+            from database import engine
+            from models import Base
+            import sharding
+        Base.metadata.create_all(bind=engine)
+        sharding.create_tables()
+        result = run(args.older_than_days, args.batch_size)
+    elif not args.here:
+        # The SQLite path is fixed when the engine is created, so the scratch
+        # database needs a process started in the scratch directory
+        import os
+        import subprocess
+        import sys
+        import tempfile
+
+        from .startup import BACKEND_DIR
+
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR, SQLITE_SHARDS="0")
+        sys.exit(subprocess.call([sys.executable, "-m", "app.archive", *sys.argv[1:], "--here"],
+                                 cwd=tempfile.mkdtemp(prefix="shecare-archive-bench-"), env=env))
+    else:
+        result = bench(args.users, args.entries, args.days, args.older_than_days, args.rounds)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+``POST /batch``: several API calls in one round trip.
+
+Sub-requests go through the app's own routes in-process (past the HTTP
+middleware), so they get the same validation, quotas and responses as
+standalone calls. The batch authenticates once: inside a batch
+``get_current_user`` returns the user loaded for the batch instead of
+decoding the JWT and querying the user again.
+
+Sub-requests run in order, except that consecutive GETs don't depend on each
+other and run concurrently, each with its own short DB session (a SQLAlchemy
+session can't be shared between threads). Writes are barriers: they run one at
+a time, after the GETs before them and before the GETs after them, so their
+commits happen in request order. They share the batch's session for the main
+database (users, jobs); with sharding, the user's entries are on their shard,
+where ``get_user_db`` opens a session for each write as for a standalone call.
+"""
+
+import asyncio
+import json
+from contextvars import ContextVar
+from urllib.parse import unquote
+
+try:
+    from .config import settings
+    from . import tracing
+except ImportError:
+    from config import settings
+    import tracing
+
+# Paths a batch may not call: itself, streams, sign-in and operator endpoints
+BLOCKED_PREFIXES = ("/batch", "/events", "/voice-chat", "/auth/login", "/auth/signup", "/admin/", "/debug/", "/metrics")
+
+
+class BatchContext:
+    __slots__ = ("user", "db")
+
+    def __init__(self, user, db=None):
+        self.user = user
+        self.db = db  # shared session for writes; None for concurrent GETs
+
+
+_current = ContextVar("batch_context", default=None)
+
+
+def current():
+    return _current.get()
+
+
+def validate(items):
+    """Error message for the first sub-request a batch can't run, or None."""
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        return f"A batch can hold at most {settings.BATCH_MAX_REQUESTS} requests."
+    for item in items:
+        if item.method.upper() not in ("GET", "POST", "PUT", "DELETE"):
+            return f"Method {item.method} is not allowed in a batch."
+        if not item.path.startswith("/") or item.path.startswith(BLOCKED_PREFIXES):
+            return f"{item.path} can't be called from a batch."
+        if item.method.upper() == "DELETE" and item.path.partition("?")[0] == "/profile":
+            return "Account deletion can't be part of a batch."
+    return None
+
+
+class Dispatcher:
+    """Runs sub-requests against the app's router with the batch's context."""
+
+    def __init__(self, app):
+        from fastapi.middleware.asyncexitstack import AsyncExitStackMiddleware
+        from starlette.middleware.exceptions import ExceptionMiddleware
+
+        # The innermost part of the app's middleware stack: HTTPException and
+        # validation errors become responses, dependencies with yield are closed
+        handlers = {k: v for k, v in app.exception_handlers.items() if k not in (500, Exception)}
+        self.asgi = ExceptionMiddleware(AsyncExitStackMiddleware(app.router), handlers=handlers)
+
+    async def call(self, parent_scope, item, context):
+        path, _, query = item.path.partition("?")
+        body = b"" if item.body is None else json.dumps(item.body).encode()
+        headers = [(name, value) for name, value in parent_scope["headers"] if name == b"authorization"]
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        scope = {k: v for k, v in parent_scope.items() if k not in ("route", "endpoint", "path_params", "fastapi_astack")}
+        scope.update({
+            "method": item.method.upper(),
+            "path": unquote(path),
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "headers": headers,
+        })
+        delivered = False
+
+        async def receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return {"type": "http.disconnect"}
+
+        result = {"status": 500, "headers": {}}
+        chunks = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                result["status"] = message["status"]
+                result["headers"] = {k.decode("latin-1"): v.decode("latin-1") for k, v in message.get("headers", [])}
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        token = _current.set(context)
+        try:
+            with tracing.span("batch.request", method=scope["method"], path=path):
+                await self.asgi(scope, receive, send)
+        except Exception as e:
+            # One failing sub-request shouldn't take the rest of the batch down
+            print(f"Batch sub-request {scope['method']} {path} failed: {e!r}")
+            result = {"status": 500, "headers": {"content-type": "application/json"}}
+            chunks = [json.dumps({"detail": "Internal Server Error"}).encode()]
+        finally:
+            _current.reset(token)
+        raw = b"".join(chunks)
+        content_type = result["headers"].pop("content-type", "")
+        result["headers"].pop("content-length", None)
+        if content_type.startswith("application/json") and raw:
+            result["body"] = json.loads(raw)
+        else:
+            result["body"] = raw.decode("utf-8", "replace") or None
+        return result
+
+
+async def run(dispatcher, parent_scope, items, user, db):
+    """Run ``items`` and return their results in the same order."""
+    from fastapi.concurrency import run_in_threadpool
+
+    results = [None] * len(items)
+    reads = []
+    user_expired = False
+
+    async def flush_reads():
+        nonlocal user_expired
+        if not reads:
+            return
+        if user_expired:
+            # Commits expire the user; reload it once here rather than have the
+            # concurrent GETs lazy-load it from the shared session
+            await run_in_threadpool(db.refresh, user)
+            user_expired = False
+        context = BatchContext(user)
+        outcomes = await asyncio.gather(*(dispatcher.call(parent_scope, items[i], context) for i in reads))
+        for i, outcome in zip(reads, outcomes):
+            results[i] = outcome
+        reads.clear()
+
+    for i, item in enumerate(items):
+        if item.method.upper() == "GET":
+            reads.append(i)
+            continue
+        await flush_reads()
+        results[i] = await dispatcher.call(parent_scope, item, BatchContext(user, db))
+        if results[i]["status"] >= 500:
+            await run_in_threadpool(db.rollback)
+        user_expired = True
+    await flush_reads()
+    return [{"id": item.id, **result} for item, result in zip(items, results)]
@@ -0,0 +1,440 @@
+"""
+Backend-agnostic cache for SheCare AI.
+
+Code in app.py only talks to ``get_cache()``; the storage is picked with
+``CACHE_BACKEND``:
+
+- ``memory``  in-process LRU. Fastest, but every uvicorn worker has its own copy.
+- ``sqlite``  a shared SQLite file (``CACHE_SQLITE_PATH``) for several workers on one host.
+- ``redis``   anything speaking the Redis protocol (``CACHE_REDIS_URL``). No client
+              library is needed; ``app.resp_stub`` is a local stand-in for testing.
+
+All backends store JSON-encoded values with the same TTL semantics and report
+the same metrics. With ``CACHE_LOCAL_TTL`` > 0 a small in-process near cache
+sits in front of a shared backend; ``invalidate`` broadcasts the key through
+the backend so every worker drops its near-cache copy as well, and ``clear``
+broadcasts ``CLEAR_ALL`` so every worker empties its near cache.
+"""
+
+import json
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+try:
+    from .config import settings
+except ImportError:
+    from config import settings
+
+
+# Published by ``Cache.clear``: every near cache drops everything
+CLEAR_ALL = "*"
+
+
+class CacheBackend:
+    """Stores encoded values with an absolute expiry. Subclasses do the storage."""
+
+    name = "base"
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def size(self):
+        return None
+
+    # Invalidation broadcast: publish a key, poll for keys published since a cursor
+    def publish(self, key):
+        pass
+
+    def poll(self, cursor):
+        return cursor, []
+
+
+class MemoryBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class SQLiteBackend(CacheBackend):
+    """Cache table in its own SQLite file, shared by every worker on the host."""
+
+    name = "sqlite"
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or settings.CACHE_SQLITE_PATH
+        self.max_entries = max_entries or settings.CACHE_MAX_ENTRIES
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_invalidations "
+                     "(id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, created_at REAL NOT NULL)")
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, value, time.time() + ttl if ttl else None))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        now = time.time()
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        conn.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (now - 3600,))
+        overflow = self.size() - self.max_entries
+        if overflow > 0:
+            # Drop the entries closest to expiry first
+            conn.execute("DELETE FROM cache WHERE key IN "
+                         "(SELECT key FROM cache ORDER BY expires_at IS NULL, expires_at LIMIT ?)", (overflow,))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+    def size(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def publish(self, key):
+        self._conn().execute("INSERT INTO cache_invalidations (key, created_at) VALUES (?, ?)", (key, time.time()))
+
+    def poll(self, cursor):
+        conn = self._conn()
+        if cursor is None:
+            row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()
+            return row[0], []
+        rows = conn.execute("SELECT id, key FROM cache_invalidations WHERE id > ? ORDER BY id", (cursor,)).fetchall()
+        return (rows[-1][0] if rows else cursor), [key for _, key in rows]
+
+
+class RedisError(Exception):
+    pass
+
+
+class RESPConnection:
+    """Minimal Redis protocol (RESP2) client: enough commands for the cache."""
+
+    def __init__(self, host, port, db=0, password=None, timeout=2.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    def execute(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise RedisError("connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            count = int(rest)
+            return None if count == -1 else [self._read() for _ in range(count)]
+        raise RedisError(f"unexpected reply {line!r}")
+
+    def close(self):
+        self.sock.close()
+
+
+class RedisBackend(CacheBackend):
+    name = "redis"
+
+    def __init__(self, url=None, prefix="shecare:cache:"):
+        parsed = urlparse(url or settings.CACHE_REDIS_URL)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = RESPConnection(self.host, self.port, self.db, self.password)
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, *args):
+        try:
+            return self._conn().execute(*args)
+        except (OSError, RedisError):
+            # Reconnect once on a dropped connection
+            conn = getattr(self._local, "conn", None)
+            if conn is not None:
+                conn.close()
+            self._local.conn = None
+            return self._conn().execute(*args)
+
+    def get(self, key):
+        return self._execute("GET", self.prefix + key)
+
+    def set(self, key, value, ttl):
+        if ttl:
+            self._execute("SET", self.prefix + key, value, "PX", int(ttl * 1000))
+        else:
+            self._execute("SET", self.prefix + key, value)
+
+    def delete(self, key):
+        self._execute("DEL", self.prefix + key)
+
+    def clear(self):
+        cursor = "0"
+        while True:
+            cursor, keys = self._execute("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+            if keys:
+                self._execute("DEL", *keys)
+            if cursor == "0":
+                break
+
+    def size(self):
+        return None
+
+    def publish(self, key):
+        seq = self._execute("INCR", self.prefix + "_inv:seq")
+        self._execute("SET", f"{self.prefix}_inv:{seq}", key, "PX", 3600 * 1000)
+
+    def poll(self, cursor):
+        seq = int(self._execute("GET", self.prefix + "_inv:seq") or 0)
+        if cursor is None or seq <= cursor:
+            return seq, []
+        if seq - cursor > 1000:
+            # Fell too far behind to replay the keys
+            return seq, [CLEAR_ALL]
+        keys = self._execute("MGET", *[f"{self.prefix}_inv:{i}" for i in range(cursor + 1, seq + 1)])
+        return seq, [k for k in keys if k is not None]
+
+
+class Cache:
+    """The interface app code uses. Values must be JSON-serializable."""
+
+    def __init__(self, backend, default_ttl=None, local_ttl=None, poll_interval=0.5):
+        self.backend = backend
+        self.default_ttl = default_ttl or settings.CACHE_DEFAULT_TTL
+        self.local_ttl = settings.CACHE_LOCAL_TTL if local_ttl is None else local_ttl
+        # Near cache only makes sense in front of a shared backend
+        self._near = MemoryBackend() if self.local_ttl and not isinstance(backend, MemoryBackend) else None
+        self._cursor = None
+        self._poll_interval = poll_interval
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.invalidations = 0
+        self.errors = 0
+        if self._near is not None:
+            self._cursor, _ = backend.poll(None)
+
+    def _sync_invalidations(self):
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        with self._lock:
+            self._next_poll = now + self._poll_interval
+            self._cursor, keys = self.backend.poll(self._cursor)
+        if CLEAR_ALL in keys:
+            self._near.clear()
+            return
+        for key in keys:
+            self._near.delete(key)
+
+    def get(self, key):
+        try:
+            if self._near is not None:
+                self._sync_invalidations()
+                raw = self._near.get(key)
+                if raw is not None:
+                    self.near_hits += 1
+                    self.hits += 1
+                    return json.loads(raw)
+            raw = self.backend.get(key)
+        except Exception as e:
+            # A broken cache must never break the request; treat it as a miss
+            print("Cache error:", e)
+            self.errors += 1
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self._near is not None:
+            self._near.set(key, raw, self.local_ttl)
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        raw = json.dumps(value)
+        try:
+            self.backend.set(key, raw, ttl or self.default_ttl)
+        except Exception as e:
+            print("Cache error:", e)
+            self.errors += 1
+            return
+        self.sets += 1
+        if self._near is not None:
+            self._near.set(key, raw, min(self.local_ttl, ttl or self.default_ttl))
+
+    def get_or_set(self, key, compute, ttl=None):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key):
+        """Remove a key everywhere, including other workers' near caches."""
+        self.invalidations += 1
+        try:
+            self.backend.delete(key)
+            self.backend.publish(key)
+        except Exception as e:
+            print("Cache error:", e)
+            self.errors += 1
+        if self._near is not None:
+            self._near.delete(key)
+
+    def publish(self, key):
+        """Make every worker drop its near-cache copy of ``key``, after it was overwritten."""
+        try:
+            self.backend.publish(key)
+        except Exception as e:
+            print("Cache error:", e)
+            self.errors += 1
+
+    def clear(self):
+        """Remove every key, including other workers' near-cache copies."""
+        try:
+            self.backend.clear()
+            self.backend.publish(CLEAR_ALL)
+        except Exception as e:
+            print("Cache error:", e)
+            self.errors += 1
+        if self._near is not None:
+            self._near.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "backend": self.backend.name,
+            "size": size,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "sets": self.sets,
+            "invalidations": self.invalidations,
+            "evictions": getattr(self.backend, "evictions", None),
+            "errors": self.errors,
+        }
+
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend, "redis": RedisBackend}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The process-wide cache, built from settings on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend_cls = BACKENDS.get(settings.CACHE_BACKEND)
+                if backend_cls is None:
+                    raise ValueError(f"Unknown CACHE_BACKEND '{settings.CACHE_BACKEND}', use one of {sorted(BACKENDS)}")
+                _cache = Cache(backend_cls())
+    return _cache
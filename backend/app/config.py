@@ -2,6 +2,8 @@ import os
 from dotenv import load_dotenv
 
 load_dotenv()
+# Also pick up backend/app/.env when started from another directory
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
 class Settings:
     # Database settings
@@ -28,6 +30,144 @@ class Settings:
     SECRET_KEY = os.getenv("SECRET_KEY", "shecare_secret_key_change_this")
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
+
+    # Admin endpoints (disabled when no token is configured)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+    # Journal analysis pipeline
+    JOURNAL_ANALYSIS_WORKERS = int(os.getenv("JOURNAL_ANALYSIS_WORKERS", "1"))
+    JOURNAL_ANALYSIS_BATCH_SIZE = int(os.getenv("JOURNAL_ANALYSIS_BATCH_SIZE", "50"))
+    JOURNAL_ANALYSIS_BATCH_WAIT = float(os.getenv("JOURNAL_ANALYSIS_BATCH_WAIT", "0.5"))  # seconds
+    JOURNAL_ANALYSIS_REQUEUE_WINDOW = int(os.getenv("JOURNAL_ANALYSIS_REQUEUE_WINDOW", "10000"))  # newest entries checked at startup
+
+    # Background job queue (python -m app.job_queue)
+    JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # seconds
+    JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))  # seconds
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "2.0"))  # seconds
+    JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "600"))  # seconds
+
+    # OmniDimension voice agent client
+    OMNIDIM_API_KEY = os.getenv("OMNIDIM_API_KEY", "")
+    OMNIDIM_BASE_URL = os.getenv("OMNIDIM_BASE_URL", "https://api.omnidim.io")
+    OMNIDIM_CONNECT_TIMEOUT = float(os.getenv("OMNIDIM_CONNECT_TIMEOUT", "3"))  # seconds
+    OMNIDIM_READ_TIMEOUT = float(os.getenv("OMNIDIM_READ_TIMEOUT", "20"))  # seconds
+    OMNIDIM_MAX_CONNECTIONS = int(os.getenv("OMNIDIM_MAX_CONNECTIONS", "20"))
+    OMNIDIM_MAX_KEEPALIVE = int(os.getenv("OMNIDIM_MAX_KEEPALIVE", "10"))
+    OMNIDIM_RETRIES = int(os.getenv("OMNIDIM_RETRIES", "2"))
+    OMNIDIM_BACKOFF_BASE = float(os.getenv("OMNIDIM_BACKOFF_BASE", "0.2"))  # seconds
+    OMNIDIM_BACKOFF_MAX = float(os.getenv("OMNIDIM_BACKOFF_MAX", "2"))  # seconds
+    OMNIDIM_BREAKER_THRESHOLD = int(os.getenv("OMNIDIM_BREAKER_THRESHOLD", "5"))  # consecutive failures
+    OMNIDIM_BREAKER_RESET = float(os.getenv("OMNIDIM_BREAKER_RESET", "30"))  # seconds before a trial call
+
+    # Streaming /voice-chat/stream
+    VOICE_STREAM_BUFFER = int(os.getenv("VOICE_STREAM_BUFFER", "32"))  # pieces buffered per client
+    VOICE_STREAM_HEARTBEAT = float(os.getenv("VOICE_STREAM_HEARTBEAT", "15"))  # seconds
+
+    # Voice agent concurrency limits
+    VOICE_MAX_PER_USER = int(os.getenv("VOICE_MAX_PER_USER", "2"))  # concurrent requests per user
+    VOICE_UPSTREAM_CONCURRENCY = int(os.getenv("VOICE_UPSTREAM_CONCURRENCY", "10"))
+    VOICE_UPSTREAM_QUEUE = int(os.getenv("VOICE_UPSTREAM_QUEUE", "100"))  # waiting requests before rejecting
+    VOICE_UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("VOICE_UPSTREAM_QUEUE_TIMEOUT", "10"))  # seconds
+
+    # Voice agent response cache
+    VOICE_CACHE_ENABLED = os.getenv("VOICE_CACHE_ENABLED", "true").lower() == "true"
+    VOICE_CACHE_MAX_ENTRIES = int(os.getenv("VOICE_CACHE_MAX_ENTRIES", "1000"))
+    VOICE_CACHE_TTL = float(os.getenv("VOICE_CACHE_TTL", "3600"))  # seconds
+    VOICE_CACHE_SIMILARITY = float(os.getenv("VOICE_CACHE_SIMILARITY", "0"))  # Jaccard threshold, 0 = exact only
+    # Messages matching this are treated as personal and never cached
+    VOICE_CACHE_PERSONAL_PATTERN = os.getenv("VOICE_CACHE_PERSONAL_PATTERN", r"\d|@|\bmy name\b|\bi am\b|\bi'm\b")
+
+    # Prometheus metrics at GET /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # development or production; development turns on diagnostics like the X-DB-* headers
+    APP_ENV = os.getenv("APP_ENV", "production")
+
+    # Request profiler: X-Profile: 1 with an admin token, or a random sample of requests
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 0.01 = 1% of requests
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+
+    # Tracing: none, console, jsonl or otlp
+    TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))  # share of new traces recorded
+    TRACE_FILE = os.getenv("TRACE_FILE", "./traces.jsonl")
+    TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+    TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "shecare-api")
+
+    # Report per-request SQL query counts in X-DB-* response headers
+    DB_QUERY_HEADERS = os.getenv("DB_QUERY_HEADERS", "true" if APP_ENV == "development" else "false").lower() == "true"
+    DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))  # same statement this often = N+1
+
+    # Readiness probe
+    READINESS_DB_TTL = float(os.getenv("READINESS_DB_TTL", "0.5"))  # seconds a DB ping result is reused
+    READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", "1"))  # seconds
+    READINESS_MAX_QUEUE = int(os.getenv("READINESS_MAX_QUEUE", "50"))  # calls waiting for the threadpool
+    READINESS_MAX_POOL_USAGE = float(os.getenv("READINESS_MAX_POOL_USAGE", "0.95"))  # share of DB connections in use
+    READINESS_OVERLOAD_SECONDS = float(os.getenv("READINESS_OVERLOAD_SECONDS", "5"))  # overload this long = not ready
+
+    # Admission control: adaptive concurrency limit with a bounded priority queue
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", "32"))
+    ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "4"))
+    ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "64"))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))  # seconds
+    ADMISSION_TARGET_LATENCY = float(os.getenv("ADMISSION_TARGET_LATENCY", "1.0"))  # seconds to first byte
+    ADMISSION_DECREASE_FACTOR = float(os.getenv("ADMISSION_DECREASE_FACTOR", "0.9"))
+    ADMISSION_DECREASE_INTERVAL = float(os.getenv("ADMISSION_DECREASE_INTERVAL", "0.5"))  # seconds
+
+    # Per-user write quotas: a burst of writes, then this many per minute
+    WRITE_QUOTA_ENABLED = os.getenv("WRITE_QUOTA_ENABLED", "true").lower() == "true"
+    WRITE_QUOTA_MAX_BUCKETS = int(os.getenv("WRITE_QUOTA_MAX_BUCKETS", "100000"))  # (user, endpoint) pairs kept
+    WRITE_QUOTA_JOURNAL_BURST = int(os.getenv("WRITE_QUOTA_JOURNAL_BURST", "10"))
+    WRITE_QUOTA_JOURNAL_PER_MINUTE = float(os.getenv("WRITE_QUOTA_JOURNAL_PER_MINUTE", "20"))
+    WRITE_QUOTA_CYCLE_BURST = int(os.getenv("WRITE_QUOTA_CYCLE_BURST", "5"))
+    WRITE_QUOTA_CYCLE_PER_MINUTE = float(os.getenv("WRITE_QUOTA_CYCLE_PER_MINUTE", "10"))
+    WRITE_QUOTA_PCOS_BURST = int(os.getenv("WRITE_QUOTA_PCOS_BURST", "3"))
+    WRITE_QUOTA_PCOS_PER_MINUTE = float(os.getenv("WRITE_QUOTA_PCOS_PER_MINUTE", "5"))
+
+    # POST /batch
+    BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))  # sub-requests per batch
+
+    # GET /sync
+    SYNC_MAX_CHANGES = int(os.getenv("SYNC_MAX_CHANGES", "500"))  # change log rows per response
+    SYNC_LOG_RETENTION_DAYS = int(os.getenv("SYNC_LOG_RETENTION_DAYS", "30"))  # older tokens get a full reset
+    SYNC_PRUNE_EVERY = int(os.getenv("SYNC_PRUNE_EVERY", "1000"))  # logged changes between prunes
+
+    # Live dashboard updates at GET /events
+    EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "32"))  # events buffered per stream before dropping the oldest
+    EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))  # seconds
+    EVENTS_TOKEN_TTL = int(os.getenv("EVENTS_TOKEN_TTL", "60"))  # seconds a ?token= from POST /events/token can open a stream
+
+    # Per-user SQLite shards: 0 = off, N = entries spread over N database files
+    SQLITE_SHARDS = int(os.getenv("SQLITE_SHARDS", "0"))
+    SQLITE_SHARD_PATH = os.getenv("SQLITE_SHARD_PATH", "./shecare_shard_{shard}.db")
+    SHARD_DIRECTORY_CACHE = int(os.getenv("SHARD_DIRECTORY_CACHE", "100000"))  # users whose shard is kept in memory
+
+    # Journal cold storage: texts of old entries compressed per user and month
+    JOURNAL_ARCHIVE_AFTER_DAYS = int(os.getenv("JOURNAL_ARCHIVE_AFTER_DAYS", "365"))
+    JOURNAL_ARCHIVE_CODEC = os.getenv("JOURNAL_ARCHIVE_CODEC", "zlib")  # zlib, or zstd (needs the zstandard package)
+    JOURNAL_ARCHIVE_LEVEL = int(os.getenv("JOURNAL_ARCHIVE_LEVEL", "9"))
+    JOURNAL_ARCHIVE_BATCH_SIZE = int(os.getenv("JOURNAL_ARCHIVE_BATCH_SIZE", "2000"))  # entries per transaction
+
+    # GET /journal/mood-trends
+    MOOD_TRENDS_MAX_PERIODS = int(os.getenv("MOOD_TRENDS_MAX_PERIODS", "366"))
+
+    # Account deletion (DELETE /profile)
+    ACCOUNT_DELETE_CHUNK = int(os.getenv("ACCOUNT_DELETE_CHUNK", "500"))  # rows per DELETE and per transaction
+    ACCOUNT_DELETE_INLINE_ROWS = int(os.getenv("ACCOUNT_DELETE_INLINE_ROWS", "2000"))  # bigger accounts go to the job worker
+
+    # Shared cache (memory, sqlite or redis)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "./shecare_cache.db")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+    CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "300"))  # seconds
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "0"))  # seconds of in-process near cache, 0 = off
     
     @property
     def DATABASE_URL(self):
@@ -1,3 +1,5 @@
+import zlib
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -24,6 +26,19 @@ else:
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Per-user shards (SQLite only, see sharding.py): users, jobs and the shard
+# directory stay in the main database, each user's entries live in one shard
+SHARD_COUNT = settings.SQLITE_SHARDS if settings.DATABASE_TYPE == "sqlite" else 0
+shard_engines = [
+    create_engine(f"sqlite:///{settings.SQLITE_SHARD_PATH.format(shard=i)}", connect_args={"check_same_thread": False})
+    for i in range(SHARD_COUNT)
+]
+ShardSessions = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in shard_engines]
+
+def shard_hash(user_id, shards):
+    """Home shard of a user: stable across processes and restarts, unlike hash()."""
+    return zlib.crc32(str(user_id).encode()) % shards
+
 Base = declarative_base()
 
 # Dependency to get database session
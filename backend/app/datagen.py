@@ -0,0 +1,253 @@
+"""
+Synthetic data generator for scale testing.
+
+Fills a database matching ``models.py`` with plausible users, cycles, journal
+entries and PCOS checks:
+
+    python -m app.datagen --users 1000000 --cycles 20 --journals 50 --seed 42
+    python -m app.datagen --users 1000000 --resume          # continue an interrupted run
+    python -m app.datagen --database-url postgresql://user:pw@host/db --users 100000
+
+Users are generated in chunks of ``--chunk-size``. Each chunk draws from its
+own NumPy generator seeded with ``(seed, chunk)`` and dates are relative to
+``--anchor``, so the output does not depend on where a previous run stopped.
+A chunk's rows and its entry in the ``datagen_progress`` table are written in
+one transaction; ``--resume`` continues after the users recorded there (also
+to grow an earlier run with a larger ``--users``).
+
+Needs NumPy (``pip install numpy``); it is not a dependency of the app itself.
+Every generated user has the password ``synthetic-password``.
+"""
+
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, func, select
+
+try:
+    from .config import settings
+    from .models import Base, CycleEntry, JournalEntry, PCOSCheck, User
+except ImportError:
+    from config import settings
+    from models import Base, CycleEntry, JournalEntry, PCOSCheck, User
+
+PASSWORD = "synthetic-password"
+
+FIRST_NAMES = ["Aisha", "Priya", "Maya", "Sara", "Emma", "Olivia", "Ananya", "Fatima", "Grace", "Chloe",
+               "Riya", "Zara", "Isabella", "Mia", "Leah", "Nora", "Ivy", "Amara", "Sofia", "Hannah"]
+LAST_NAMES = ["Sharma", "Khan", "Smith", "Patel", "Garcia", "Brown", "Nguyen", "Lopez", "Singh", "Wilson",
+              "Ahmed", "Martin", "Kim", "Clark", "Das", "Lee", "Walker", "Hall", "Young", "Allen"]
+
+# Labels used by the journal page, and how often each is picked
+MOODS = ["Happy", "Content", "Neutral", "Sad", "Stressed"]
+MOOD_WEIGHTS = [0.22, 0.28, 0.24, 0.13, 0.13]
+MOOD_PHRASES = {
+    "Happy": ["Had a great day with friends.", "Felt energetic and strong today.", "Finally finished my project!",
+              "Went dancing in the evening.", "Slept really well and woke up refreshed."],
+    "Content": ["Quiet day, a walk after lunch.", "Cooked a healthy dinner.", "Read a few chapters of my book.",
+                "Yoga in the morning felt good.", "Caught up with my sister on the phone."],
+    "Neutral": ["Normal day at work.", "Nothing special happened.", "Ran some errands.",
+                "Watched a movie in the evening.", "Tracked my water intake."],
+    "Sad": ["Feeling low and tired today.", "Cried a bit in the evening.", "Missed my family a lot.",
+            "Cramps kept me in bed.", "Felt lonely most of the day."],
+    "Stressed": ["Deadlines are piling up.", "Headache and bloating all afternoon.", "Could not sleep well, anxious.",
+                 "Too many meetings, no time to eat.", "Worried about my irregular period."],
+}
+SHARED_PHRASES = ["Drank more water.", "Took a short walk.", "Skipped the gym.", "Had some tea.", "Stretched before bed.",
+                  "Acne flared up a little.", "Mild cramps in the morning.", "Craving chocolate.", ""]
+CYCLE_NOTES = ["", "", "", "Heavy flow", "Mild cramps", "Spotting before", "Back pain", "Headache", "Bloating"]
+PCOS_SYMPTOMS = ["irregularPeriods", "hirsutism", "acne", "hairLoss", "weightGain", "moodChanges", "fertilityIssues"]
+PCOS_TIPS = {
+    "High": ["Consult a healthcare provider for a detailed diagnosis and management plan.",
+             "Consider consulting a gynecologist or endocrinologist."],
+    "Moderate": ["Consider consulting a gynecologist for further evaluation.",
+                 "Monitor symptoms and menstrual cycle closely."],
+    "Low": ["Maintain a balanced diet and regular exercise.", "Continue tracking your cycle and symptoms."],
+}
+
+metadata = MetaData()
+progress_table = Table(
+    "datagen_progress", metadata,
+    Column("seed", Integer, primary_key=True),
+    Column("chunk", Integer, primary_key=True),
+    Column("id_offset", Integer, nullable=False),
+    Column("users", Integer, nullable=False),
+    Column("chunk_size", Integer, nullable=False),
+    Column("anchor", String, nullable=False),
+)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        sys.exit("app.datagen needs NumPy: pip install numpy")
+    return numpy
+
+
+def text_pool(np, seed, size=200):
+    """Pre-built journal texts per mood; entries pick from these by index."""
+    rng = np.random.default_rng([seed, 0xFEED])
+    pool = np.empty((len(MOODS), size), dtype=object)
+    for m, mood in enumerate(MOODS):
+        own = rng.choice(len(MOOD_PHRASES[mood]), size=(size, 2))
+        shared = rng.choice(len(SHARED_PHRASES), size=size)
+        for i in range(size):
+            parts = [MOOD_PHRASES[mood][own[i, 0]], SHARED_PHRASES[shared[i]], MOOD_PHRASES[mood][own[i, 1]]]
+            pool[m, i] = " ".join(p for p in dict.fromkeys(parts) if p)
+    return pool
+
+
+def generate_chunk(np, seed, chunk, first_id, chunk_size, start, stop, cycles, journals, pcos, now, hashed_password, pool):
+    """
+    Rows for the users at positions ``start .. stop - 1`` of a chunk, as dicts
+    per table. Draws are always made for the full chunk so a user's data does
+    not depend on how much of the chunk is generated.
+    """
+    rng = np.random.default_rng([seed, chunk])
+    user_ids = np.arange(first_id, first_id + chunk_size)
+    selected = range(start, stop)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Users: each one has a typical cycle length of their own
+    mean_cycle = np.clip(rng.normal(28.5, 2.5, chunk_size), 21, 40)
+    ages = np.clip(rng.normal(29, 7, chunk_size), 16, 55).astype(int)
+    weights = np.clip(rng.normal(65, 12, chunk_size), 40, 130).astype(int)
+    first = rng.integers(0, len(FIRST_NAMES), chunk_size)
+    last = rng.integers(0, len(LAST_NAMES), chunk_size)
+    users = [
+        {"id": int(uid), "email": f"synthetic{uid}@example.com", "hashed_password": hashed_password,
+         "full_name": f"{FIRST_NAMES[f]} {LAST_NAMES[l]}", "age": int(a), "weight": int(w),
+         "cycle_length": int(round(c)), "bio": None}
+        for uid, f, l, a, w, c in zip(user_ids[start:stop], first[start:stop], last[start:stop],
+                                      ages[start:stop], weights[start:stop], mean_cycle[start:stop])
+    ]
+
+    # Cycles: lengths vary around the user's mean, walked backwards from a recent start
+    lengths = np.clip(np.rint(mean_cycle[:, None] + rng.normal(0, 1.8, (chunk_size, cycles))), 18, 45)
+    latest_start = rng.integers(0, 28, chunk_size)
+    starts = latest_start[:, None] + np.concatenate([np.zeros((chunk_size, 1)), np.cumsum(lengths[:, :-1], axis=1)], axis=1)
+    period = np.clip(np.rint(rng.normal(5, 1.2, (chunk_size, cycles))), 2, 9)
+    notes = rng.integers(0, len(CYCLE_NOTES), (chunk_size, cycles))
+    cycle_rows = [
+        {"user_id": int(user_ids[u]), "start_date": today - timedelta(days=int(starts[u, k])),
+         "end_date": today - timedelta(days=int(starts[u, k] - period[u, k])),
+         "notes": CYCLE_NOTES[notes[u, k]], "deleted": False}
+        for u in selected for k in range(cycles)
+    ]
+
+    # Journals: spread over the last two years, mood drives the text
+    offsets = rng.integers(0, 730 * 24 * 60, (chunk_size, journals))
+    moods = rng.choice(len(MOODS), size=(chunk_size, journals), p=MOOD_WEIGHTS)
+    texts = pool[moods, rng.integers(0, pool.shape[1], (chunk_size, journals))]
+    journal_rows = [
+        {"user_id": int(user_ids[u]), "date": now - timedelta(minutes=int(offsets[u, k])),
+         "mood": MOODS[moods[u, k]], "text": texts[u, k], "analysis": None, "deleted": False}
+        for u in selected for k in range(journals)
+    ]
+
+    # PCOS checks: symptom count decides risk, as in the /pcos-checker endpoint
+    has_symptom = rng.random((chunk_size, pcos, len(PCOS_SYMPTOMS))) < 0.22
+    check_offsets = rng.integers(0, 365, (chunk_size, pcos))
+    pcos_rows = []
+    for u in selected:
+        for k in range(pcos):
+            symptoms = [s for s, on in zip(PCOS_SYMPTOMS, has_symptom[u, k]) if on]
+            risk = "High" if len(symptoms) >= 4 else "Moderate" if len(symptoms) >= 2 else "Low"
+            pcos_rows.append({
+                "user_id": int(user_ids[u]), "date": now - timedelta(days=int(check_offsets[u, k])),
+                "answers": json.dumps({"age": int(ages[u]), "weight": int(weights[u]), "symptoms": symptoms}),
+                "risk": risk, "tips": json.dumps(PCOS_TIPS[risk]),
+            })
+    return users, cycle_rows, journal_rows, pcos_rows
+
+
+def generate(database_url, users, cycles, journals, pcos, seed, chunk_size, resume, anchor=None):
+    np = _numpy()
+    from passlib.context import CryptContext
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        progress = conn.execute(select(progress_table).where(progress_table.c.seed == seed)).fetchall()
+        if progress and not resume:
+            sys.exit(f"Seed {seed} already has {len(progress)} chunks in this database; use --resume or another --seed.")
+        done = {row.chunk: row.users for row in progress}
+        if progress:
+            # Continue exactly where the earlier run left off
+            first = progress[0]
+            if first.chunk_size != chunk_size:
+                sys.exit(f"Seed {seed} was generated with --chunk-size {first.chunk_size}; resume with the same value.")
+            id_offset, now = first.id_offset, datetime.fromisoformat(first.anchor)
+            hashed_password = conn.execute(select(User.hashed_password).where(User.id == id_offset)).scalar()
+        else:
+            id_offset = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+            # Dates are relative to the anchor, so a run resumed on another day still matches
+            now = anchor or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            hashed_password = None
+    hashed_password = hashed_password or CryptContext(schemes=["bcrypt"], deprecated="auto").hash(PASSWORD)
+    pool = text_pool(np, seed)
+    chunks = (users + chunk_size - 1) // chunk_size
+    started = time.perf_counter()
+    rows_written = 0
+    for chunk in range(chunks):
+        count = min(chunk_size, users - chunk * chunk_size)
+        already = done.get(chunk, 0)
+        if already >= count:
+            continue
+        user_rows, cycle_rows, journal_rows, pcos_rows = generate_chunk(
+            np, seed, chunk, id_offset + chunk * chunk_size, chunk_size, already, count,
+            cycles, journals, pcos, now, hashed_password, pool)
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), user_rows)
+            if cycle_rows:
+                conn.execute(CycleEntry.__table__.insert(), cycle_rows)
+            if journal_rows:
+                conn.execute(JournalEntry.__table__.insert(), journal_rows)
+            if pcos_rows:
+                conn.execute(PCOSCheck.__table__.insert(), pcos_rows)
+            if already:
+                conn.execute(progress_table.update()
+                             .where(progress_table.c.seed == seed, progress_table.c.chunk == chunk)
+                             .values(users=count))
+            else:
+                conn.execute(progress_table.insert(), {"seed": seed, "chunk": chunk, "id_offset": id_offset,
+                                                      "users": count, "chunk_size": chunk_size,
+                                                      "anchor": now.isoformat()})
+        rows_written += len(user_rows) + len(cycle_rows) + len(journal_rows) + len(pcos_rows)
+        elapsed = time.perf_counter() - started
+        print(f"chunk {chunk + 1}/{chunks}: {rows_written} rows, {rows_written / elapsed:,.0f} rows/s")
+
+    if engine.dialect.name == "postgresql":
+        # User ids were assigned explicitly; move the sequence past them so signups keep working
+        with engine.begin() as conn:
+            conn.exec_driver_sql("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT MAX(id) FROM users))")
+    return rows_written
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic SheCare data")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--cycles", type=int, default=20, help="cycle entries per user")
+    parser.add_argument("--journals", type=int, default=50, help="journal entries per user")
+    parser.add_argument("--pcos", type=int, default=1, help="PCOS checks per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=2000, help="users per transaction")
+    parser.add_argument("--resume", action="store_true", help="skip chunks an earlier run with this seed finished")
+    parser.add_argument("--anchor", type=datetime.fromisoformat, help="date the generated history ends at (default today)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = generate(args.database_url, args.users, args.cycles, args.journals, args.pcos,
+                    args.seed, args.chunk_size, args.resume, args.anchor)
+    print(f"✅ Wrote {rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
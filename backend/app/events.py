@@ -0,0 +1,358 @@
+"""
+Live dashboard updates over server-sent events: ``GET /events``.
+
+When a cycle entry, journal entry or PCOS check of a user is committed, the
+dashboard summary and recommendations of that user are recomputed (one query,
+and only if the user has a stream open) and every open stream of that user
+receives a ``delta`` event with the fields that changed.
+
+- ``EventBroker`` is an in-process pub/sub: user id -> open subscriptions.
+  The commit hook only passes the user id to ``notify``, so writes don't wait
+  for the overview. The event loop recomputes it in the threadpool, once at a
+  time per user: commits arriving meanwhile are coalesced into one more run.
+  ``publish`` diffs the new overview against the previous one and fans it out.
+- Each subscription buffers at most ``EVENTS_BUFFER`` events and drops the
+  oldest when a client doesn't keep up. A client that lost events is sent one
+  full ``overview`` event instead of the deltas it missed.
+- Streams send a comment every ``EVENTS_HEARTBEAT`` seconds so proxies keep
+  idle connections open. An idle stream is one buffer, one timer and no DB
+  connection, so a worker holds thousands of them; measure with
+
+    python -m app.events bench --connections 5000
+
+Events are per worker. Behind several workers a user's stream only sees
+writes handled by the same worker; run the stream on a single worker or
+sticky sessions until there is a shared pub/sub.
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+
+try:
+    from .config import settings
+    from .metrics import Counter, Gauge
+    from .models import CycleEntry, JournalEntry, PCOSCheck
+except ImportError:
+    from config import settings
+    from metrics import Counter, Gauge
+    from models import CycleEntry, JournalEntry, PCOSCheck
+
+WATCHED = (CycleEntry, JournalEntry, PCOSCheck)
+
+CONNECTIONS = Gauge("shecare_event_stream_connections", "Open /events streams")
+PUBLISHED = Counter("shecare_event_stream_events", "Events queued for /events streams", ("event",))
+DROPPED = Counter("shecare_event_stream_dropped", "Events dropped because a stream's buffer was full")
+
+
+def sse(event_name, data):
+    return f"event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class Subscription:
+    def __init__(self, user_id, buffer_size):
+        self.user_id = user_id
+        self.buffer = deque(maxlen=buffer_size)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, event_name, data):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+            DROPPED.inc()
+        self.buffer.append((event_name, data))  # a full deque drops its oldest item
+        self.ready.set()
+
+
+class EventBroker:
+    def __init__(self, buffer_size=None):
+        self.buffer_size = buffer_size or settings.EVENTS_BUFFER
+        self._subscriptions = {}  # user id -> set of Subscription
+        self._snapshots = {}  # user id -> latest overview sent to that user's streams
+        self._lock = threading.Lock()  # guards the user id set read by publishers in other threads
+        self._loop = None
+        self._refreshing = {}  # user id -> task recomputing the user's overview
+        self._stale = set()  # ... and who committed again since that started
+
+    def has_subscribers(self, user_id):
+        with self._lock:
+            return user_id in self._subscriptions
+
+    def subscribe(self, user_id, snapshot):
+        """Open a stream for ``user_id``; ``snapshot`` is the overview the client starts from."""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(user_id, self.buffer_size)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            connections = sum(len(s) for s in self._subscriptions.values())
+        self._snapshots[user_id] = snapshot
+        CONNECTIONS.set(connections)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+                    self._snapshots.pop(subscription.user_id, None)
+            connections = sum(len(s) for s in self._subscriptions.values())
+        CONNECTIONS.set(connections)
+
+    def _call_in_loop(self, callback, *args):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            callback(*args)
+        else:
+            loop.call_soon_threadsafe(callback, *args)
+
+    def publish(self, user_id, snapshot):
+        """Send the changes between the user's last overview and ``snapshot``; callable from any thread."""
+        self._call_in_loop(self._fan_out, user_id, snapshot)
+
+    def notify(self, user_id, snapshot):
+        """The user's data changed: publish ``snapshot(user_id)``, computed off the caller's thread."""
+        self._call_in_loop(self._schedule_refresh, user_id, snapshot)
+
+    def _schedule_refresh(self, user_id, snapshot):
+        if user_id in self._refreshing:
+            # The running refresh may have read the data before this commit
+            self._stale.add(user_id)
+        elif self.has_subscribers(user_id):
+            self._refreshing[user_id] = self._loop.create_task(self._refresh(user_id, snapshot))
+
+    async def _refresh(self, user_id, snapshot):
+        try:
+            while True:
+                self._stale.discard(user_id)
+                try:
+                    overview = await run_in_threadpool(snapshot, user_id)
+                except Exception as e:
+                    # The write has committed; a missed live update must not fail anything else
+                    print("Event publish failed:", e)
+                else:
+                    self._fan_out(user_id, overview)
+                if user_id not in self._stale or not self.has_subscribers(user_id):
+                    break
+        finally:
+            self._refreshing.pop(user_id, None)
+            self._stale.discard(user_id)
+
+    def _fan_out(self, user_id, snapshot):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        if not subscriptions:
+            return
+        previous = self._snapshots.get(user_id) or {}
+        delta = {key: value for key, value in snapshot.items() if previous.get(key) != value}
+        self._snapshots[user_id] = snapshot
+        if not delta:
+            return
+        PUBLISHED.labels("delta").inc(len(subscriptions))
+        for subscription in subscriptions:
+            subscription.push("delta", delta)
+
+    def latest(self, user_id):
+        return self._snapshots.get(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._subscriptions),
+                "connections": sum(len(s) for s in self._subscriptions.values()),
+                "buffer_size": self.buffer_size,
+                "refreshing": len(self._refreshing),
+            }
+
+
+broker = EventBroker()
+
+
+async def stream(subscription, snapshot, heartbeat=None):
+    """SSE body of one subscription: the starting overview, then deltas and heartbeats."""
+    heartbeat = heartbeat or settings.EVENTS_HEARTBEAT
+    try:
+        yield sse("overview", snapshot)
+        while True:
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            subscription.ready.clear()
+            if subscription.dropped:
+                # Deltas were lost; the latest overview replaces all of them
+                subscription.dropped = 0
+                subscription.buffer.clear()
+                yield sse("overview", broker.latest(subscription.user_id) or {})
+                continue
+            while subscription.buffer:
+                event_name, data = subscription.buffer.popleft()
+                yield sse(event_name, data)
+    finally:
+        # Client went away (the response is cancelled) or the server is stopping
+        broker.unsubscribe(subscription)
+
+
+# --- Publishing on commit ---
+def _after_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, WATCHED):
+            session.info.setdefault("changed_users", set()).add(obj.user_id)
+
+
+def _after_rollback(session):
+    session.info.pop("changed_users", None)
+
+
+def install(session_factory, snapshot):
+    """
+    Publish to ``broker`` after commits of ``session_factory`` sessions that
+    touched watched rows. ``snapshot(user_id)`` returns the user's overview;
+    the broker calls it in the threadpool, not in the committing thread.
+    """
+
+    def after_commit(session):
+        changed = session.info.pop("changed_users", None)
+        for user_id in changed or ():
+            if broker.has_subscribers(user_id):
+                broker.notify(user_id, snapshot)
+
+    if not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+        event.listen(session_factory, "after_commit", after_commit)
+        event.listen(session_factory, "after_rollback", _after_rollback)
+
+
+# --- Benchmark ---
+def bench(connections, seconds, heartbeat):
+    """Hold ``connections`` idle streams on one uvicorn worker and report memory and heartbeat delivery."""
+    import os
+    import resource
+    import subprocess
+    import sys
+    import tempfile
+    import time
+
+    from .startup import BACKEND_DIR, _free_port
+
+    # The server gets a scratch directory, so a scratch SQLite database
+    workdir = tempfile.mkdtemp(prefix="shecare-events-bench-")
+    port = _free_port()
+    # Each connection is a socket in this process and one in the server
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, connections * 2 + 256)), hard))
+    env = dict(os.environ, EVENTS_HEARTBEAT=str(heartbeat), ADMISSION_ENABLED="false", PYTHONPATH=BACKEND_DIR)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.app:app", "--port", str(port), "--log-level", "warning",
+         "--limit-concurrency", str(connections * 2)],
+        cwd=workdir, env=env, preexec_fn=lambda: resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard)))
+
+    def server_rss_mb():
+        with open(f"/proc/{server.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    async def run():
+        for _ in range(100):
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        async def post(path, payload):
+            body = json.dumps(payload).encode()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"POST %s HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\nConnection: close\r\n\r\n%s" % (path.encode(), len(body), body))
+            response = await reader.read()
+            writer.close()
+            return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+        credentials = {"email": "events-bench@example.com", "password": "events-bench-password"}
+        await post("/auth/signup", credentials)
+        token = (await post("/auth/login", credentials))["access_token"]
+
+        idle_rss = server_rss_mb()
+        heartbeats = 0
+        opened = []
+
+        async def open_stream():
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET /events HTTP/1.1\r\nHost: x\r\nAuthorization: Bearer {token}\r\n\r\n".encode())
+            await reader.readuntil(b"event: overview")
+            opened.append(writer)
+            return reader
+
+        started = time.perf_counter()
+        readers = []
+        for i in range(0, connections, 200):
+            readers += await asyncio.gather(*(open_stream() for _ in range(min(200, connections - i))))
+        connect_seconds = time.perf_counter() - started
+
+        alive = set()
+
+        async def count_heartbeats(index, reader):
+            nonlocal heartbeats
+            while True:
+                await reader.readuntil(b": heartbeat")
+                heartbeats += 1
+                if holding:
+                    alive.add(index)
+
+        holding = False
+        counters = [asyncio.ensure_future(count_heartbeats(i, r)) for i, r in enumerate(readers)]
+        await asyncio.sleep(heartbeat * 2)  # drain heartbeats sent while connecting
+        holding = True
+        await asyncio.sleep(seconds)
+        held_rss = server_rss_mb()
+        for task in counters:
+            task.cancel()
+        for writer in opened:
+            writer.close()
+        return {
+            "connections": len(readers),
+            "connect_seconds": round(connect_seconds, 2),
+            "server_rss_mb_before": round(idle_rss, 1),
+            "server_rss_mb_with_streams": round(held_rss, 1),
+            "kb_per_connection": round((held_rss - idle_rss) * 1024 / max(1, len(readers)), 1),
+            "heartbeats_received": heartbeats,
+            "streams_with_heartbeat_while_held": len(alive),
+        }
+
+    try:
+        return asyncio.run(run())
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SheCare live event stream tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_cmd = sub.add_parser("bench", help="hold many idle /events streams on one worker")
+    bench_cmd.add_argument("--connections", type=int, default=5000)
+    bench_cmd.add_argument("--seconds", type=float, default=10, help="how long to hold them")
+    bench_cmd.add_argument("--heartbeat", type=float, default=2, help="EVENTS_HEARTBEAT for the server")
+    args = parser.parse_args()
+    print(json.dumps(bench(args.connections, args.seconds, args.heartbeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Liveness and readiness checks.
+
+``/health/live`` only says the process is serving requests. ``/health/ready``
+is what a load balancer should route on. It combines:
+
+- a DB ping, cached for ``READINESS_DB_TTL`` seconds so frequent probes from
+  many balancers cost at most one query per TTL. The ping runs on its own
+  thread, so it still answers when the request threadpool is saturated.
+- connection pool saturation (where the pool has a size; SQLite uses none)
+- the request threadpool's busy threads and queue depth
+- the voice agent circuit breaker state (reported only, the voice agent is optional)
+
+A failing DB ping makes the instance not-ready at once. Overload (threadpool
+queue past ``READINESS_MAX_QUEUE`` or pool usage past
+``READINESS_MAX_POOL_USAGE``) only flips it after lasting
+``READINESS_OVERLOAD_SECONDS``, so short bursts don't drain traffic.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+try:
+    from .config import settings
+except ImportError:
+    from config import settings
+
+
+class DatabaseProbe:
+    def __init__(self, engine, ttl=None, timeout=None):
+        self.engine = engine
+        self.ttl = settings.READINESS_DB_TTL if ttl is None else ttl
+        self.timeout = timeout or settings.READINESS_DB_TIMEOUT
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="readiness-db")
+        self._pending = None
+        self._lock = None
+        self.result = None
+        self.checked_at = 0.0
+        self.pings = 0
+
+    def _ping(self):
+        # SELECT 1 never touches the SQLite file; reading the schema version needs its shared lock
+        statement = "PRAGMA schema_version" if self.engine.dialect.name == "sqlite" else "SELECT 1"
+        started = time.perf_counter()
+        with self.engine.connect() as conn:
+            conn.execute(text(statement))
+        return time.perf_counter() - started
+
+    async def check(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.result is not None and time.monotonic() - self.checked_at < self.ttl:
+                return self.result
+            if self._pending is not None and not self._pending.done():
+                # The last ping is still stuck; don't pile more onto the database
+                self.result = {"ok": False, "error": "previous ping still running"}
+            else:
+                self.pings += 1
+                self._pending = asyncio.get_running_loop().run_in_executor(self._executor, self._ping)
+                try:
+                    seconds = await asyncio.wait_for(asyncio.shield(self._pending), self.timeout)
+                    self.result = {"ok": True, "latency_ms": round(seconds * 1000, 2)}
+                except asyncio.TimeoutError:
+                    self.result = {"ok": False, "error": f"no answer within {self.timeout}s"}
+                except Exception as e:
+                    self.result = {"ok": False, "error": str(e).splitlines()[0][:200]}
+            self.checked_at = time.monotonic()
+            return self.result
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    if hasattr(pool, "checkedout") and hasattr(pool, "size"):
+        capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "saturation": round(pool.checkedout() / capacity, 3) if capacity else None,
+        })
+    return stats
+
+
+def threadpool_stats():
+    """Busy threads and waiting calls of the threadpool sync endpoints run in."""
+    from anyio import to_thread
+
+    limiter = to_thread.current_default_thread_limiter()
+    return {
+        "limit": int(limiter.total_tokens),
+        "busy": limiter.borrowed_tokens,
+        "waiting": limiter.statistics().tasks_waiting,
+    }
+
+
+class ReadinessMonitor:
+    def __init__(self, engine, breaker, probe=None):
+        self.engine = engine
+        self.breaker = breaker
+        self.probe = probe or DatabaseProbe(engine)
+        self.overloaded_since = None
+
+    async def report(self):
+        database = await self.probe.check()
+        pool = pool_stats(self.engine)
+        threadpool = threadpool_stats()
+
+        reasons = []
+        if threadpool["waiting"] > settings.READINESS_MAX_QUEUE:
+            reasons.append(f"{threadpool['waiting']} calls waiting for the threadpool")
+        if (pool.get("saturation") or 0) >= settings.READINESS_MAX_POOL_USAGE:
+            reasons.append(f"connection pool {pool['saturation']:.0%} used")
+        now = time.monotonic()
+        if reasons:
+            self.overloaded_since = self.overloaded_since or now
+        else:
+            self.overloaded_since = None
+        sustained = self.overloaded_since is not None and now - self.overloaded_since >= settings.READINESS_OVERLOAD_SECONDS
+
+        ready = database["ok"] and not sustained
+        return ready, {
+            "status": "ready" if ready else "not_ready",
+            "database": database,
+            "pool": pool,
+            "threadpool": threadpool,
+            "overload": {
+                "overloaded": bool(reasons),
+                "sustained": sustained,
+                "for_seconds": round(now - self.overloaded_since, 2) if self.overloaded_since else 0,
+                "reasons": reasons,
+            },
+            "voice_agent": {"circuit": self.breaker.state, "consecutive_failures": self.breaker.failures},
+        }
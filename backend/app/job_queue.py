@@ -0,0 +1,300 @@
+"""
+Durable background job queue for SheCare AI.
+
+Jobs are rows in the ``jobs`` table of the app's own database, so no broker is
+needed. Request handlers call ``enqueue`` with their own session; the job is
+committed together with the handler's write and picked up later by a worker:
+
+    python -m app.job_queue --concurrency 4
+
+A worker claims a job by moving it to ``running`` and setting ``locked_until``
+(the visibility timeout), which a heartbeat thread keeps extending while the
+handler runs. If the worker dies, the lock expires and another worker picks
+the job up again; the first worker's late result is then discarded, since
+only the lock holder (``locked_by``) may finish a job. Failed jobs are retried with exponential
+backoff and full jitter until ``max_attempts`` is reached.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from .config import settings
+    from .database import SessionLocal, engine
+    from .models import Base, Job
+except ImportError:
+    from config import settings
+    from database import SessionLocal, engine
+    from models import Base, Job
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# name -> callable(payload: dict, db: Session) -> JSON-serializable result
+HANDLERS = {}
+
+
+def task(name):
+    """Register a function as the handler for jobs called ``name``."""
+    def decorator(func):
+        HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(db, name, payload=None, dedupe_key=None, user_id=None, delay=0, max_attempts=None):
+    """
+    Add a job to the caller's session. The caller commits it together with its
+    own changes. With a ``dedupe_key``, an already queued or running job with
+    the same key is returned instead of creating a new one.
+
+    Two requests can both pass that check; the unique key then fails the
+    second one's commit with IntegrityError. ``enqueue_and_commit`` retries
+    it for a session that holds nothing but the job.
+    """
+    if dedupe_key:
+        existing = _active_job(db, dedupe_key)
+        if existing:
+            return existing
+    job = Job(
+        name=name,
+        payload=json.dumps(payload or {}),
+        status="queued",
+        user_id=user_id,
+        dedupe_key=dedupe_key,
+        attempts=0,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    # No savepoint around the insert: pysqlite doesn't track SAVEPOINT, so
+    # releasing one could commit the caller's transaction early
+    db.add(job)
+    db.flush()
+    return job
+
+
+def enqueue_and_commit(db, name, payload=None, dedupe_key=None, **options):
+    """
+    ``enqueue`` a job and commit it. When a concurrent request queued the same
+    ``dedupe_key`` first, the commit is rolled back and retried, which returns
+    that request's job. The session must hold nothing else to commit.
+    """
+    for attempt in range(2):
+        try:
+            job = enqueue(db, name, payload, dedupe_key=dedupe_key, **options)
+            db.commit()
+            return job
+        except IntegrityError:
+            db.rollback()
+            if not dedupe_key or attempt:
+                raise
+
+
+def _active_job(db, dedupe_key):
+    return db.query(Job).filter(
+        Job.dedupe_key == dedupe_key,
+        Job.status.in_(ACTIVE_STATUSES)
+    ).first()
+
+
+def backoff_delay(attempts, base=None, maximum=None):
+    """Exponential backoff with full jitter, in seconds."""
+    base = settings.JOB_BACKOFF_BASE if base is None else base
+    maximum = settings.JOB_BACKOFF_MAX if maximum is None else maximum
+    return random.uniform(0, min(maximum, base * (2 ** max(0, attempts - 1))))
+
+
+def job_status(job):
+    return {
+        "id": job.id,
+        "name": job.name,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_at": job.run_at,
+        "last_error": job.last_error,
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+class Worker:
+    """Polls the jobs table and runs handlers on a pool of threads."""
+
+    def __init__(self, concurrency=None, poll_interval=None, visibility_timeout=None, names=None):
+        self.concurrency = concurrency or settings.JOB_CONCURRENCY
+        self.poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+        self.visibility_timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT
+        self.names = names  # restrict to these job names, default: every registered handler
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+
+    def _ready_clause(self, now):
+        ready = or_(
+            and_(Job.status == "queued", Job.run_at <= now),
+            and_(Job.status == "running", Job.locked_until < now),  # visibility timeout expired
+        )
+        names = self.names or list(HANDLERS)
+        return and_(ready, Job.name.in_(names))
+
+    def claim(self, db):
+        """Atomically claim the next runnable job, or return None."""
+        now = datetime.utcnow()
+        candidates = db.query(Job.id).filter(self._ready_clause(now)).order_by(Job.run_at).limit(self.concurrency).all()
+        for (job_id,) in candidates:
+            claimed = db.query(Job).filter(Job.id == job_id, self._ready_clause(now)).update({
+                Job.status: "running",
+                Job.locked_until: now + timedelta(seconds=self.visibility_timeout),
+                Job.locked_by: f"{self.worker_id}:{threading.get_ident()}",
+                Job.attempts: Job.attempts + 1,
+                Job.updated_at: now,
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return db.query(Job).filter(Job.id == job_id).first()
+        return None
+
+    def _finish(self, db, job_id, owner, **values):
+        """Update a running job if ``owner`` still holds its lock. Returns False if the lock was lost."""
+        values.update(locked_until=None, updated_at=datetime.utcnow())
+        finished = db.query(Job).filter(Job.id == job_id, Job.status == "running", Job.locked_by == owner).update(
+            {getattr(Job, key): value for key, value in values.items()}, synchronize_session=False)
+        db.commit()
+        return bool(finished)
+
+    def _heartbeat(self, job_id, owner, done):
+        """Extend the job's lock until ``done`` is set, so a long handler isn't claimed a second time."""
+        interval = max(1.0, self.visibility_timeout / 3)
+        while not done.wait(interval):
+            db = SessionLocal()
+            try:
+                extended = db.query(Job).filter(Job.id == job_id, Job.status == "running", Job.locked_by == owner).update(
+                    {Job.locked_until: datetime.utcnow() + timedelta(seconds=self.visibility_timeout)},
+                    synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                print(f"Job {job_id} heartbeat failed: {e}")
+                extended = True  # try again on the next beat
+            finally:
+                db.close()
+            if not extended:
+                return
+
+    def run_job(self, db, job):
+        handler = HANDLERS.get(job.name)
+        # Handlers commit the session, which expires ``job``
+        job_id, name, owner = job.id, job.name, job.locked_by
+        attempts, max_attempts = job.attempts, job.max_attempts
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, owner, done),
+                                     name=f"job-heartbeat-{job_id}", daemon=True)
+        heartbeat.start()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job '{name}'")
+            result = handler(json.loads(job.payload or "{}"), db)
+            error = None
+        except Exception as e:
+            db.rollback()
+            error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        finally:
+            done.set()
+            heartbeat.join()
+        if error is not None:
+            if attempts >= max_attempts:
+                values = {"status": "failed", "dedupe_key": None}
+            else:
+                values = {"status": "queued", "run_at": datetime.utcnow() + timedelta(seconds=backoff_delay(attempts))}
+            if self._finish(db, job_id, owner, last_error=error, **values):
+                print(f"Job {job_id} ({name}) failed on attempt {attempts}: {error}")
+            else:
+                print(f"Job {job_id} ({name}) failed after losing its lock: {error}")
+            return False
+        if not self._finish(db, job_id, owner, status="succeeded", last_error=None, dedupe_key=None,
+                            result=json.dumps(result) if result is not None else None):
+            print(f"Job {job_id} ({name}) finished after losing its lock; result discarded")
+            return False
+        return True
+
+    def run_once(self):
+        """Claim and run a single job. Returns True if a job was run."""
+        db = SessionLocal()
+        try:
+            job = self.claim(db)
+            if job is None:
+                return False
+            self.run_job(db, job)
+            return True
+        finally:
+            db.close()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as e:
+                print("Job worker error:", e)
+                ran = False
+            if not ran:
+                # Spread polls out so idle threads don't hit the DB in lockstep
+                self._stop.wait(self.poll_interval * random.uniform(0.5, 1.5))
+
+    def start(self):
+        threads = []
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self):
+        threads = self.start()
+        print(f"Job worker {self.worker_id} running {self.concurrency} threads for: {', '.join(sorted(HANDLERS))}")
+        try:
+            while any(t.is_alive() for t in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            print("Stopping job worker...")
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SheCare background job worker")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_CONCURRENCY)
+    parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL)
+    parser.add_argument("--visibility-timeout", type=int, default=settings.JOB_VISIBILITY_TIMEOUT)
+    parser.add_argument("--only", nargs="*", help="only run jobs with these names")
+    args = parser.parse_args()
+
+    # Registers the job handlers
+    try:
+        from . import tasks  # noqa: F401
+    except ImportError:
+        import tasks  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    Worker(
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        visibility_timeout=args.visibility_timeout,
+        names=args.only,
+    ).run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+Journal analysis pipeline for SheCare AI.
+
+Fills ``JournalEntry.analysis`` with a JSON document holding a lexicon-based
+sentiment score, the most frequent keywords and any symptoms mentioned in the
+entry. Everything runs locally on the CPU; nothing leaves the server.
+
+New entries are submitted from ``POST /journal`` and analysed in batches by a
+small pool of background threads, so the request only pays for a queue put.
+The queue lives in memory, so on startup each worker requeues the newest
+entries still without analysis (``requeue_pending``). Existing entries can be
+processed with the backfill mode:
+
+    python -m app.journal_analysis --backfill --workers 4
+"""
+
+import argparse
+import json
+import math
+import queue
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import func
+
+try:
+    from .config import settings
+    from .database import SessionLocal, ShardSessions
+    from .models import JournalEntry
+    from . import sync
+except ImportError:
+    from config import settings
+    from database import SessionLocal, ShardSessions
+    from models import JournalEntry
+    import sync
+
+ANALYSIS_VERSION = 1
+
+# --- Lexicons ---
+POSITIVE_WORDS = {
+    "happy": 2.0, "joy": 2.0, "great": 1.8, "good": 1.2, "calm": 1.2, "relaxed": 1.4,
+    "energetic": 1.5, "energized": 1.5, "better": 1.0, "love": 1.8, "loved": 1.8,
+    "grateful": 1.8, "thankful": 1.6, "excited": 1.8, "proud": 1.6, "peaceful": 1.5,
+    "content": 1.2, "hopeful": 1.4, "rested": 1.2, "strong": 1.2, "fine": 0.6,
+    "okay": 0.4, "ok": 0.4, "motivated": 1.5, "productive": 1.3, "confident": 1.5,
+    "amazing": 2.2, "wonderful": 2.2, "fun": 1.4, "laugh": 1.4, "laughed": 1.4,
+    "smile": 1.3, "relief": 1.2, "relieved": 1.3, "comfortable": 1.0, "healthy": 1.2,
+}
+
+NEGATIVE_WORDS = {
+    "sad": -2.0, "unhappy": -2.0, "depressed": -2.6, "down": -1.2, "low": -1.0,
+    "stressed": -1.8, "stress": -1.6, "anxious": -1.9, "anxiety": -1.9, "worried": -1.6,
+    "angry": -1.9, "irritable": -1.5, "irritated": -1.5, "upset": -1.7, "cry": -1.6,
+    "cried": -1.6, "crying": -1.6, "lonely": -1.8, "tired": -1.1, "exhausted": -1.8,
+    "awful": -2.2, "terrible": -2.3, "bad": -1.5, "worse": -1.6, "worst": -2.3,
+    "hate": -2.2, "overwhelmed": -1.9, "frustrated": -1.7, "hopeless": -2.5,
+    "pain": -1.5, "painful": -1.7, "hurt": -1.5, "hurts": -1.5, "sick": -1.5,
+    "miserable": -2.4, "drained": -1.6, "moody": -1.1, "scared": -1.7, "afraid": -1.6,
+}
+
+LEXICON = {**POSITIVE_WORDS, **NEGATIVE_WORDS}
+
+NEGATIONS = {"not", "no", "never", "none", "nothing", "hardly", "barely", "don't", "didn't",
+             "doesn't", "isn't", "wasn't", "aren't", "can't", "couldn't", "won't", "without"}
+
+INTENSIFIERS = {"very": 1.4, "really": 1.3, "so": 1.3, "extremely": 1.6, "super": 1.4,
+                "quite": 1.15, "too": 1.2, "totally": 1.4, "slightly": 0.6, "little": 0.7}
+
+# Mood labels used by the frontend (Journal.js) and their baseline sentiment
+MOOD_SCORES = {"happy": 2.0, "content": 1.0, "neutral": 0.0, "sad": -2.0, "stressed": -1.8}
+
+# Canonical symptom -> phrases that indicate it
+SYMPTOM_TERMS = {
+    "cramps": ["cramp", "cramps", "cramping"],
+    "bloating": ["bloated", "bloating"],
+    "headache": ["headache", "headaches", "migraine"],
+    "fatigue": ["fatigue", "tired", "exhausted", "drained", "no energy"],
+    "acne": ["acne", "pimple", "pimples", "breakout", "breakouts", "oily skin"],
+    "back_pain": ["back pain", "backache", "lower back"],
+    "breast_tenderness": ["tender breasts", "breast pain", "sore breasts"],
+    "nausea": ["nausea", "nauseous", "vomit", "vomiting"],
+    "insomnia": ["insomnia", "can't sleep", "couldn't sleep", "could not sleep", "cannot sleep", "sleepless"],
+    "mood_swings": ["mood swings", "moody", "irritable"],
+    "heavy_flow": ["heavy flow", "heavy bleeding", "heavy period"],
+    "spotting": ["spotting"],
+    "hair_loss": ["hair loss", "hair fall", "losing hair"],
+    "weight_gain": ["weight gain", "gained weight"],
+    "irregular_periods": ["irregular period", "irregular periods", "missed period", "late period"],
+    "cravings": ["craving", "cravings"],
+}
+
+STOPWORDS = {
+    "a", "about", "after", "again", "all", "also", "am", "an", "and", "any", "are", "as", "at",
+    "be", "because", "been", "before", "being", "but", "by", "can", "could", "did", "do", "does",
+    "doing", "for", "from", "had", "has", "have", "having", "he", "her", "here", "him", "his",
+    "how", "i", "i'm", "i've", "if", "in", "into", "is", "it", "it's", "its", "just", "me",
+    "more", "most", "my", "myself", "of", "on", "once", "only", "or", "other", "our", "out",
+    "over", "she", "should", "some", "such", "than", "that", "the", "their", "them", "then",
+    "there", "these", "they", "this", "those", "to", "today", "up", "was", "we", "were", "what",
+    "when", "which", "while", "who", "will", "with", "would", "you", "your", "day", "feel",
+    "feeling", "felt", "got", "get", "went", "still", "much", "bit", "lot", "like",
+} | NEGATIONS | set(INTENSIFIERS)
+
+TOKEN_RE = re.compile(r"[a-z][a-z']*")
+
+_SYMPTOM_PATTERNS = {
+    name: re.compile(r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b")
+    for name, phrases in SYMPTOM_TERMS.items()
+}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def sentiment_score(tokens):
+    """VADER-style compound score in [-1, 1] from the word lexicon."""
+    total = 0.0
+    for i, token in enumerate(tokens):
+        weight = LEXICON.get(token)
+        if weight is None:
+            continue
+        if i > 0 and tokens[i - 1] in INTENSIFIERS:
+            weight *= INTENSIFIERS[tokens[i - 1]]
+        if any(t in NEGATIONS for t in tokens[max(0, i - 3):i]):
+            weight *= -0.5
+        total += weight
+    return total / math.sqrt(total * total + 15) if total else 0.0
+
+
+def extract_keywords(tokens, limit=5):
+    counts = Counter(t for t in tokens if len(t) > 2 and t not in STOPWORDS)
+    return [word for word, _ in counts.most_common(limit)]
+
+
+def extract_symptoms(text):
+    lowered = (text or "").lower()
+    return [name for name, pattern in _SYMPTOM_PATTERNS.items() if pattern.search(lowered)]
+
+
+def analyze_text(text, mood=None):
+    """Analyse one journal entry. Pure function, safe to run in worker processes."""
+    tokens = tokenize(text)
+    text_score = sentiment_score(tokens)
+    mood_score = MOOD_SCORES.get((mood or "").strip().lower())
+    if mood_score is None:
+        # Free-form mood: score it like text
+        mood_score = sentiment_score(tokenize(mood)) * 2
+    else:
+        mood_score = mood_score / math.sqrt(mood_score * mood_score + 15) * 2
+    # The mood the user picked is a strong signal; the text refines it
+    score = max(-1.0, min(1.0, 0.6 * text_score + 0.4 * mood_score))
+    if score >= 0.05:
+        label = "positive"
+    elif score <= -0.05:
+        label = "negative"
+    else:
+        label = "neutral"
+    return {
+        "version": ANALYSIS_VERSION,
+        "sentiment": {"score": round(score, 3), "label": label},
+        "keywords": extract_keywords(tokens),
+        "symptoms": extract_symptoms(text),
+        "word_count": len(tokens),
+    }
+
+
+def _analyze_row(row):
+    entry_id, text, mood = row
+    return entry_id, json.dumps(analyze_text(text, mood))
+
+
+def load_analysis(entry):
+    """Return the parsed analysis of a JournalEntry, or None if not analysed yet."""
+    if not entry or not entry.analysis:
+        return None
+    try:
+        return json.loads(entry.analysis)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_low_mood(entry):
+    """True when the entry reads as negative; falls back to the mood label."""
+    analysis = load_analysis(entry)
+    if analysis:
+        return analysis["sentiment"]["label"] == "negative"
+    return MOOD_SCORES.get((entry.mood or "").strip().lower(), 0) < 0 or "sad" in (entry.mood or "").lower()
+
+
+# --- Background pipeline ---
+class JournalAnalysisPipeline:
+    """Queue of journal entry ids drained in batches by background threads."""
+
+    def __init__(self, workers=None, batch_size=None, batch_wait=None):
+        self.workers = workers or settings.JOURNAL_ANALYSIS_WORKERS
+        self.batch_size = batch_size or settings.JOURNAL_ANALYSIS_BATCH_SIZE
+        self.batch_wait = batch_wait if batch_wait is not None else settings.JOURNAL_ANALYSIS_BATCH_WAIT
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(max(1, self.workers)):
+                thread = threading.Thread(target=self._run, name=f"journal-analysis-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, entry_id, shard=None):
+        """Queue an entry (of ``shard`` when sharding is on) for analysis. Never blocks the caller."""
+        if not self._threads:
+            self.start()
+        self._queue.put_nowait((shard, entry_id))
+
+    def requeue_pending(self, window=None):
+        """
+        Submit entries that were queued but never analysed, e.g. because the
+        server restarted. Only the newest ``window`` entries of each database
+        are checked; older ones are left to the backfill. Returns the count.
+        """
+        window = window or settings.JOURNAL_ANALYSIS_REQUEUE_WINDOW
+        requeued = 0
+        for shard, session_factory in enumerate(ShardSessions) if ShardSessions else [(None, SessionLocal)]:
+            db = session_factory()
+            try:
+                newest = db.query(func.max(JournalEntry.id)).scalar() or 0
+                entry_ids = [i for (i,) in db.query(JournalEntry.id).filter(
+                    JournalEntry.id > newest - window,
+                    JournalEntry.analysis == None,
+                    JournalEntry.text.isnot(None))]
+            finally:
+                db.close()
+            for entry_id in entry_ids:
+                self.submit(entry_id, shard)
+            requeued += len(entry_ids)
+        return requeued
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            by_shard = {}
+            for shard, entry_id in batch:
+                by_shard.setdefault(shard, []).append(entry_id)
+            try:
+                count = sum(analyze_entries(entry_ids, shard=shard) for shard, entry_ids in by_shard.items())
+            except Exception as e:
+                print("Journal analysis batch failed:", e)
+                with self._lock:
+                    self.errors += len(batch)
+                continue
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.processed += count
+                self.batches += 1
+                self.busy_seconds += elapsed
+
+    def join(self):
+        """Block until everything queued so far has been processed."""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            rate = self.processed / self.busy_seconds if self.busy_seconds else 0.0
+            return {
+                "queued": self._queue.qsize(),
+                "workers": len(self._threads),
+                "processed": self.processed,
+                "batches": self.batches,
+                "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "entries_per_sec": round(rate, 1),
+            }
+
+
+def analyze_entries(entry_ids, db=None, shard=None):
+    """Analyse the given entries (of ``shard``) and store the results. Returns the number updated."""
+    own_session = db is None
+    db = db or (SessionLocal() if shard is None else ShardSessions[shard]())
+    try:
+        rows = db.query(JournalEntry.id, JournalEntry.text, JournalEntry.mood).filter(
+            JournalEntry.id.in_(list(entry_ids)),
+            JournalEntry.text.isnot(None)  # archived entries were analysed before their text moved
+        ).all()
+        updates = [{"id": entry_id, "analysis": analysis} for entry_id, analysis in map(_analyze_row, rows)]
+        if updates:
+            db.bulk_update_mappings(JournalEntry, updates)
+            sync.record_updates(db, "journal", [u["id"] for u in updates])
+            db.commit()
+        return len(updates)
+    finally:
+        if own_session:
+            db.close()
+
+
+def backfill(batch_size=500, workers=1, force=False):
+    """Analyse every existing entry that has no analysis yet (or all with force)."""
+    # Imported here so the API process doesn't load multiprocessing at startup
+    from concurrent.futures import ProcessPoolExecutor
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    processed = 0
+    started = time.perf_counter()
+    try:
+        # With sharding the entries are spread over the shards, one after another
+        for session_factory in ShardSessions or [SessionLocal]:
+            db = session_factory()
+            last_id = 0
+            try:
+                while True:
+                    query = db.query(JournalEntry.id, JournalEntry.text, JournalEntry.mood).filter(
+                        JournalEntry.id > last_id, JournalEntry.text.isnot(None))  # skip archived entries
+                    if not force:
+                        query = query.filter(JournalEntry.analysis == None)
+                    rows = query.order_by(JournalEntry.id).limit(batch_size).all()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    if pool:
+                        results = pool.map(_analyze_row, rows, chunksize=max(1, len(rows) // (workers * 4)))
+                    else:
+                        results = map(_analyze_row, rows)
+                    updates = [{"id": i, "analysis": a} for i, a in results]
+                    db.bulk_update_mappings(JournalEntry, updates)
+                    sync.record_updates(db, "journal", [u["id"] for u in updates])
+                    db.commit()
+                    processed += len(rows)
+                    elapsed = time.perf_counter() - started
+                    print(f"Analysed {processed} entries ({processed / elapsed:.1f} entries/sec)")
+            finally:
+                db.close()
+    finally:
+        if pool:
+            pool.shutdown()
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": processed,
+        "seconds": round(elapsed, 3),
+        "entries_per_sec": round(processed / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+pipeline = JournalAnalysisPipeline()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SheCare journal analysis")
+    parser.add_argument("--backfill", action="store_true", help="analyse existing journal entries")
+    parser.add_argument("--force", action="store_true", help="re-analyse entries that already have an analysis")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes used for analysis")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do, pass --backfill")
+    result = backfill(batch_size=args.batch_size, workers=args.workers, force=args.force)
+    print(f"✅ Backfill complete: {result['processed']} entries in {result['seconds']}s "
+          f"({result['entries_per_sec']} entries/sec)")
+
+
+if __name__ == "__main__":
+    main()
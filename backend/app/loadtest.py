@@ -0,0 +1,259 @@
+"""
+End-to-end load test for the SheCare API.
+
+Boots ``app.app:app`` under uvicorn on a freshly seeded SQLite database and
+replays user journeys (login -> dashboard -> journal list -> post entry ->
+recommendations) from concurrent virtual users:
+
+    python -m app.loadtest run --users 50 --concurrency 20 --duration 30 --save load.json
+    python -m app.loadtest run --baseline load.json          # compare with an earlier run
+    python -m app.loadtest run --url http://127.0.0.1:8000   # against a running, already seeded server
+
+The report has overall throughput and, per endpoint, p50/p95/p99 latency,
+errors and SQL queries per request (from the ``X-DB-Query-Count`` header,
+which the booted server enables with ``DB_QUERY_HEADERS=true``).
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+from .startup import BACKEND_DIR, _free_port
+
+PASSWORD = "loadtest-password"
+MOODS = ["happy", "calm", "tired", "anxious", "sad", "energetic", "irritable"]
+JOURNAL_LINES = [
+    "Slept well and went for a walk.",
+    "Cramps today, stayed in with a hot water bottle.",
+    "Busy day at work, feeling a bit stressed.",
+    "Tried a new yoga routine, felt great afterwards.",
+    "Headache in the afternoon, drank more water.",
+]
+
+
+def user_email(i):
+    return f"loadtest{i}@example.com"
+
+
+def seed(users, entries_per_user, seed_value=42):
+    """Fill the database of the current working directory with load-test users."""
+    from datetime import datetime, timedelta
+
+    from .app import check_database, hash_password
+    from .database import engine
+    from .models import CycleEntry, JournalEntry, PCOSCheck, Recommendation, User
+
+    check_database()
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    hashed = hash_password(PASSWORD)  # one bcrypt hash shared by every user
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"email": user_email(i), "hashed_password": hashed, "full_name": f"Load Test {i}", "cycle_length": 28}
+            for i in range(users)
+        ])
+        ids = [row[0] for row in conn.execute(User.__table__.select().with_only_columns([User.id]))]
+        conn.execute(CycleEntry.__table__.insert(), [
+            {"user_id": uid, "start_date": now - timedelta(days=28 * k + rng.randint(0, 3)), "notes": "", "deleted": False}
+            for uid in ids for k in range(3)
+        ])
+        conn.execute(JournalEntry.__table__.insert(), [
+            {"user_id": uid, "date": now - timedelta(days=k), "mood": rng.choice(MOODS),
+             "text": rng.choice(JOURNAL_LINES), "deleted": False}
+            for uid in ids for k in range(entries_per_user)
+        ])
+        conn.execute(PCOSCheck.__table__.insert(), [
+            {"user_id": uid, "date": now, "answers": "{}", "risk": rng.choice(["Low", "Moderate", "High"]), "tips": "[]"}
+            for uid in ids
+        ])
+        conn.execute(Recommendation.__table__.insert(), [
+            {"user_id": None, "type": "wellness", "text": "Take a short walk after lunch.", "date": now},
+            {"user_id": None, "type": "nutrition", "text": "Add leafy greens to one meal today.", "date": now},
+        ])
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # endpoint -> list of (seconds, status, queries)
+
+    def add(self, endpoint, seconds, status, queries):
+        self.samples.setdefault(endpoint, []).append((seconds, status, queries))
+
+    def report(self, elapsed):
+        endpoints = {}
+        total = 0
+        for endpoint, samples in self.samples.items():
+            latencies = sorted(s[0] * 1000 for s in samples)
+            queries = [s[2] for s in samples if s[2] is not None]
+            total += len(samples)
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(1 for s in samples if s[1] >= 400),
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "max_ms": round(latencies[-1], 2),
+                "db_queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+            }
+        return {"requests": total, "duration_seconds": round(elapsed, 2),
+                "throughput_rps": round(total / elapsed, 2), "endpoints": endpoints}
+
+
+async def _request(client, recorder, endpoint, method, path, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        status = response.status_code
+    except Exception:
+        response, status = None, 599
+    queries = response.headers.get("x-db-query-count") if response is not None else None
+    recorder.add(endpoint, time.perf_counter() - started, status, int(queries) if queries else None)
+    return response
+
+
+async def journey(client, recorder, email, rng):
+    response = await _request(client, recorder, "POST /auth/login", "POST", "/auth/login",
+                              json={"email": email, "password": PASSWORD})
+    if response is None or response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    await _request(client, recorder, "GET /dashboard", "GET", "/dashboard", headers=headers)
+    await _request(client, recorder, "GET /journal", "GET", "/journal", headers=headers)
+    await _request(client, recorder, "POST /journal", "POST", "/journal", headers=headers,
+                   json={"mood": rng.choice(MOODS), "text": rng.choice(JOURNAL_LINES)})
+    await _request(client, recorder, "GET /recommendations", "GET", "/recommendations", headers=headers)
+
+
+async def run_load(base_url, users, concurrency, duration, seed_value=42):
+    import httpx
+
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def virtual_user(n):
+            rng = random.Random(seed_value + n)
+            i = n
+            while time.perf_counter() < deadline:
+                await journey(client, recorder, user_email(i % users), rng)
+                i += concurrency
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return recorder.report(elapsed)
+
+
+def _wait_for(url, timeout=30.0):
+    import urllib.request
+
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server did not answer {url} within {timeout}s")
+
+
+def run(users, entries, concurrency, duration, workers, url=None, seed_value=42):
+    """Seed a temporary database, boot uvicorn on it and run the journeys."""
+    import subprocess
+    import tempfile
+
+    config = {"users": users, "entries_per_user": entries, "concurrency": concurrency,
+              "duration_seconds": duration, "workers": workers, "seed": seed_value}
+    if url:
+        result = asyncio.run(run_load(url, users, concurrency, duration, seed_value))
+        return {**result, "config": {**config, "url": url}}
+
+    # The journeys write far faster than one user would, so quotas would turn them into 429s
+    env = {**os.environ, "PYTHONPATH": BACKEND_DIR, "DB_QUERY_HEADERS": "true", "WRITE_QUOTA_ENABLED": "false"}
+    with tempfile.TemporaryDirectory() as cwd:
+        subprocess.run([sys.executable, "-m", "app.loadtest", "seed", "--users", str(users),
+                        "--entries", str(entries), "--seed", str(seed_value)], cwd=cwd, env=env, check=True)
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.app:app", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=cwd, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_for(base_url + "/health")
+            result = asyncio.run(run_load(base_url, users, concurrency, duration, seed_value))
+        finally:
+            server.terminate()
+            server.wait()
+    return {**result, "config": config, "python": sys.version.split()[0],
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def print_report(result, baseline=None):
+    print(f"{result['requests']} requests in {result['duration_seconds']}s "
+          f"-> {result['throughput_rps']} req/s")
+    print(f"{'endpoint':<22} {'reqs':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for endpoint, row in result["endpoints"].items():
+        line = (f"{endpoint:<22} {row['requests']:>6} {row['errors']:>4} {row['p50_ms']:>8} "
+                f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['db_queries_per_request'] or '-':>8}")
+        before = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if before:
+            line += f"   p95 {row['p95_ms'] - before['p95_ms']:+.2f} ms vs baseline"
+        print(line)
+    if baseline:
+        print(f"throughput {result['throughput_rps'] - baseline['throughput_rps']:+.2f} req/s vs baseline")
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="SheCare end-to-end load test")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    seed_cmd = sub.add_parser("seed", help="seed the database in the current directory")
+    seed_cmd.add_argument("--users", type=int, default=50)
+    seed_cmd.add_argument("--entries", type=int, default=20, help="journal entries per user")
+    seed_cmd.add_argument("--seed", type=int, default=42)
+
+    run_cmd = sub.add_parser("run", help="seed, boot the app and replay user journeys")
+    run_cmd.add_argument("--users", type=int, default=50, help="seeded users the journeys log in as")
+    run_cmd.add_argument("--entries", type=int, default=20, help="journal entries per seeded user")
+    run_cmd.add_argument("--concurrency", type=int, default=10, help="virtual users running at once")
+    run_cmd.add_argument("--duration", type=float, default=20, help="seconds to run")
+    run_cmd.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    run_cmd.add_argument("--seed", type=int, default=42)
+    run_cmd.add_argument("--url", help="use a running, already seeded server instead of booting one")
+    run_cmd.add_argument("--save", help="write results as JSON to this file")
+    run_cmd.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        seed(args.users, args.entries, args.seed)
+        return
+
+    result = run(args.users, args.entries, args.concurrency, args.duration, args.workers, args.url, args.seed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,11 +12,13 @@ try:
     from .database import SessionLocal, engine, get_db
     from .models import Base, User, PCOSCheck, CycleEntry, JournalEntry, Recommendation
     from .config import settings
+    from . import accounts
 except ImportError:
     # Try absolute imports if relative imports fail
     from database import SessionLocal, engine, get_db
     from models import Base, User, PCOSCheck, CycleEntry, JournalEntry, Recommendation
     from config import settings
+    import accounts
 
 import json
 
@@ -94,7 +96,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     user = get_user_by_id(db, user_id=token_data.user_id)
-    if user is None:
+    if user is None or accounts.is_locked(user):
         raise credentials_exception
     return user
 
@@ -117,7 +119,7 @@ class LoginRequest(BaseModel):
 @app.post("/auth/login", response_model=Token)
 def login(data: LoginRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == data.email).first()
-    if not user or not pwd_context.verify(data.password, user.hashed_password):
+    if not user or accounts.is_locked(user) or not pwd_context.verify(data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid email or password.")
     access_token = create_access_token(
         data={"sub": str(user.id)},
@@ -376,6 +378,6 @@ def delete_profile(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    db.delete(current_user)
-    db.commit()
-    return {"message": "Profile deleted successfully"} 
\ No newline at end of file
+    # Locks the account, then purges it in chunks instead of loading every child row (see accounts.py)
+    deletion = accounts.request_deletion(db, current_user)
+    return {"message": "Profile deleted successfully", "deletion": accounts.deletion_status(deletion)}
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, Boolean, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from pydantic import BaseModel
@@ -64,6 +64,88 @@ class Recommendation(Base):
     date = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="recommendations") 
 
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    payload = Column(Text)  # Store as JSON string
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    dedupe_key = Column(String, unique=True, nullable=True)  # released once the job finishes
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    locked_by = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)  # Store as JSON string
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (Index("ix_jobs_status_run_at", "status", "run_at"),)
+
+class ChangeLog(Base):
+    """One insert, update or delete of a synced entry; the id is the change sequence (see sync.py)."""
+    __tablename__ = "change_log"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    entity = Column(String, nullable=False)  # journal, cycle
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)  # upsert, delete
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_change_log_user_id_id", "user_id", "id"),)
+
+class JournalArchive(Base):
+    """Texts of one user's archived journal entries of one month, compressed (see archive.py)."""
+    __tablename__ = "journal_archives"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    month = Column(String, nullable=False)  # YYYY-MM of the entries' dates
+    codec = Column(String, nullable=False)  # zlib, zstd
+    entries = Column(Integer, nullable=False)
+    raw_bytes = Column(Integer, nullable=False)  # size of the uncompressed block
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_journal_archives_user_id_month", "user_id", "month", unique=True),)
+
+class MoodRollup(Base):
+    """Journal entries of one user with one mood in one day, week or month (see mood_trends.py)."""
+    __tablename__ = "mood_rollups"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    granularity = Column(String, nullable=False)  # day, week, month
+    period = Column(String, nullable=False)  # 2024-05-03, 2024-W18, 2024-05
+    mood = Column(String, nullable=False)  # lower-cased label
+    count = Column(Integer, nullable=False)
+    __table_args__ = (Index("ix_mood_rollups_user_period_mood", "user_id", "granularity", "period", "mood", unique=True),)
+
+class MoodStreak(Base):
+    """A user's latest and longest runs of consecutive days with journal entries."""
+    __tablename__ = "mood_streaks"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    current_start = Column(Date, nullable=False)
+    current_end = Column(Date, nullable=False)
+    longest_start = Column(Date, nullable=False)
+    longest_end = Column(Date, nullable=False)
+
+class AccountDeletion(Base):
+    """A DELETE /profile request and the progress of its purge (see accounts.py)."""
+    __tablename__ = "account_deletions"
+    id = Column(String, primary_key=True)  # random; the status URL needs no login
+    user_id = Column(Integer, nullable=False, index=True)  # no foreign key: the row outlives the user
+    status = Column(String, nullable=False)  # pending, running, completed, failed
+    rows_deleted = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    requested_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class UserShard(Base):
+    """Shard directory: which shard holds a user's entries (see sharding.py)."""
+    __tablename__ = "user_shards"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    shard = Column(Integer, nullable=False)
+    generation = Column(Integer, nullable=False, default=0)  # bumped each time the user is moved
+
 # Example Pydantic model (add your own as needed)
 class JournalEntryIn(BaseModel):
     date: datetime = None
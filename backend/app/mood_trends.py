@@ -0,0 +1,290 @@
+"""
+Mood trends from precomputed rollups: ``GET /journal/mood-trends``.
+
+``mood_rollups`` counts each user's journal entries per mood label and day,
+ISO week and month. ``install`` keeps the counts current: the flush that
+inserts or deletes a journal entry adds or subtracts one in the same
+transaction. A trend request reads at most ``periods`` x labels rows through
+the ``(user_id, granularity, period, mood)`` index, however long the user's
+history is.
+
+``mood_streaks`` holds the user's latest and longest runs of consecutive
+days with an entry. A first entry on the day after the latest run extends it
+and one after a gap starts a new run; anything else (a back-dated entry, a
+deleted day) recomputes the runs from the daily rollups, one row per
+journaling day.
+
+Bulk loads that skip the ORM (``app.loadtest seed``, ``app.datagen``) don't
+update the rollups; rebuild them afterwards:
+
+    python -m app.mood_trends rebuild              # every user on every shard
+    python -m app.mood_trends rebuild --user 42
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+try:
+    from .database import SessionLocal, ShardSessions
+    from .models import JournalEntry, MoodRollup, MoodStreak
+    from . import sharding
+except ImportError:
+    from database import SessionLocal, ShardSessions
+    from models import JournalEntry, MoodRollup, MoodStreak
+    import sharding
+
+GRANULARITIES = ("day", "week", "month")
+DEFAULT_PERIODS = {"day": 30, "week": 12, "month": 12}
+
+_rollups = MoodRollup.__table__
+_streaks = MoodStreak.__table__
+
+
+def label(mood):
+    return (mood or "").strip().lower() or "unknown"
+
+
+def period_of(granularity, day):
+    if granularity == "day":
+        return day.isoformat()
+    if granularity == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year:04d}-W{week:02d}"
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def periods_ending(granularity, day, count):
+    """Keys of the ``count`` periods up to the one holding ``day``, oldest first."""
+    if granularity == "day":
+        keys = [period_of("day", day - timedelta(days=i)) for i in range(count)]
+    elif granularity == "week":
+        monday = day - timedelta(days=day.weekday())
+        keys = [period_of("week", monday - timedelta(weeks=i)) for i in range(count)]
+    else:
+        keys = []
+        year, month = day.year, day.month
+        for _ in range(count):
+            keys.append(f"{year:04d}-{month:02d}")
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return keys[::-1]
+
+
+def _count(deltas, user_id, when, mood, delta):
+    if when is None:
+        return
+    day = when.date() if isinstance(when, datetime) else when
+    for granularity in GRANULARITIES:
+        key = (user_id, granularity, period_of(granularity, day), label(mood))
+        deltas[key] = deltas.get(key, 0) + delta
+
+
+# --- Writing ---
+def _apply(conn, deltas):
+    """Add ``{(user_id, granularity, period, mood): delta}`` to the rollups."""
+    c = _rollups.c
+    rows = [{"user_id": u, "granularity": g, "period": p, "mood": m, "count": d}
+            for (u, g, p, m), d in deltas.items() if d]
+    added = [row for row in rows if row["count"] > 0]
+    removed = [row for row in rows if row["count"] < 0]
+    if added and conn.dialect.name in ("sqlite", "postgresql"):
+        upsert = (sqlite if conn.dialect.name == "sqlite" else postgresql).insert(_rollups)
+        conn.execute(upsert.on_conflict_do_update(
+            index_elements=["user_id", "granularity", "period", "mood"],
+            set_={"count": c.count + upsert.excluded.count},
+        ), added)
+        added = []
+    for row in added + removed:
+        matched = conn.execute(update(_rollups).where(
+            c.user_id == row["user_id"], c.granularity == row["granularity"],
+            c.period == row["period"], c.mood == row["mood"],
+        ).values(count=c.count + row["count"])).rowcount
+        if not matched and row["count"] > 0:
+            conn.execute(insert(_rollups), row)
+    if removed:
+        conn.execute(delete(_rollups).where(c.user_id.in_({row["user_id"] for row in removed}), c.count <= 0))
+
+
+def _write_streak(conn, user_id, current, longest):
+    conn.execute(delete(_streaks).where(_streaks.c.user_id == user_id))
+    if current:
+        conn.execute(insert(_streaks), {"user_id": user_id, "current_start": current[0], "current_end": current[1],
+                                        "longest_start": longest[0], "longest_end": longest[1]})
+
+
+def _days(run):
+    return (run[1] - run[0]).days + 1
+
+
+def recompute_streak(conn, user_id):
+    """Latest and longest runs of the user from the daily rollups."""
+    c = _rollups.c
+    days = sorted({date.fromisoformat(p) for (p,) in conn.execute(
+        select(c.period).where(c.user_id == user_id, c.granularity == "day", c.count > 0))})
+    current = longest = None
+    for day in days:
+        if current and day == current[1] + timedelta(days=1):
+            current = (current[0], day)
+        else:
+            current = (day, day)
+        if longest is None or _days(current) > _days(longest):
+            longest = current
+    _write_streak(conn, user_id, current, longest)
+
+
+def _update_streak(conn, user_id, changed):
+    """Bring the user's streak up to date after the days in ``changed`` gained or lost entries."""
+    c = _rollups.c
+    present = {date.fromisoformat(p) for (p,) in conn.execute(select(c.period).where(
+        c.user_id == user_id, c.granularity == "day", c.count > 0, c.period.in_([d.isoformat() for d in changed])))}
+    streak = conn.execute(select(_streaks).where(_streaks.c.user_id == user_id)).first()
+    if streak is not None and changed <= present:
+        start, end = streak.current_start, streak.current_end
+        if all(start <= day <= end for day in changed):
+            return  # more entries on days the streak already counts
+        if len(changed) == 1:
+            (day,) = changed
+            if day > end:
+                current = (start, day) if day == end + timedelta(days=1) else (day, day)
+                longest = (streak.longest_start, streak.longest_end)
+                _write_streak(conn, user_id, current, current if _days(current) > _days(longest) else longest)
+                return
+    recompute_streak(conn, user_id)
+
+
+def _after_flush(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, JournalEntry):
+            _count(deltas, obj.user_id, obj.date, obj.mood, 1)
+    for obj in session.deleted:
+        if isinstance(obj, JournalEntry):
+            _count(deltas, obj.user_id, obj.date, obj.mood, -1)
+    for obj in session.dirty:
+        if isinstance(obj, JournalEntry):
+            attrs = inspect(obj).attrs
+            if attrs.date.history.has_changes() or attrs.mood.history.has_changes():
+                old_date = attrs.date.history.deleted[0] if attrs.date.history.deleted else obj.date
+                old_mood = attrs.mood.history.deleted[0] if attrs.mood.history.deleted else obj.mood
+                _count(deltas, obj.user_id, old_date, old_mood, -1)
+                _count(deltas, obj.user_id, obj.date, obj.mood, 1)
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    conn = session.connection()
+    _apply(conn, deltas)
+    changed_days = {}
+    for user_id, granularity, period, _ in deltas:
+        if granularity == "day":
+            changed_days.setdefault(user_id, set()).add(date.fromisoformat(period))
+    for user_id, days in changed_days.items():
+        _update_streak(conn, user_id, days)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+def install(session_factory):
+    """Keep the rollups of journal entries flushed by ``session_factory`` sessions current."""
+    if not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+    # An entry expired by a commit doesn't know its old date and mood when they are
+    # set; active history loads them first, so the flush can take the old counts back
+    for attribute in (JournalEntry.date, JournalEntry.mood):
+        if not event.contains(attribute, "set", _load_old_value):
+            event.listen(attribute, "set", _load_old_value, active_history=True)
+
+
+# --- Reading ---
+def trends(db, user_id, granularity, periods, today=None):
+    """Entries per mood in the last ``periods`` periods (oldest first, empty ones included) and the streaks."""
+    today = today or datetime.utcnow().date()
+    keys = periods_ending(granularity, today, periods)
+    rows = db.query(MoodRollup.period, MoodRollup.mood, MoodRollup.count).filter(
+        MoodRollup.user_id == user_id,
+        MoodRollup.granularity == granularity,
+        MoodRollup.period.between(keys[0], keys[-1]),
+    ).all()
+    moods = {key: {} for key in keys}
+    for period, mood, count in rows:
+        if period in moods:
+            moods[period][mood] = count
+    streak = db.query(MoodStreak).filter(MoodStreak.user_id == user_id).first()
+    if streak is None:
+        streaks = {"current_days": 0, "longest_days": 0, "last_entry_day": None}
+    else:
+        alive = streak.current_end >= today - timedelta(days=1)
+        streaks = {
+            "current_days": _days((streak.current_start, streak.current_end)) if alive else 0,
+            "longest_days": _days((streak.longest_start, streak.longest_end)),
+            "last_entry_day": streak.current_end,
+        }
+    return {
+        "granularity": granularity,
+        "periods": [{"period": key, "total": sum(counts.values()), "moods": counts} for key, counts in moods.items()],
+        "streaks": streaks,
+    }
+
+
+# --- Rebuilding ---
+def rebuild_database(db, user_id=None):
+    """Recompute rollups and streaks from the journal entries of one database. Returns the users rebuilt."""
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = {u for (u,) in db.query(JournalEntry.user_id).distinct()}
+        user_ids |= {u for (u,) in db.query(MoodRollup.user_id).distinct()}
+        user_ids = sorted(user_ids)
+    for uid in user_ids:
+        deltas = {}
+        for when, mood in db.query(JournalEntry.date, JournalEntry.mood).filter(JournalEntry.user_id == uid):
+            _count(deltas, uid, when, mood, 1)
+        # One transaction per user, so the user's rollups are never half rebuilt
+        conn = db.connection()
+        conn.execute(delete(_rollups).where(_rollups.c.user_id == uid))
+        _apply(conn, deltas)
+        recompute_streak(conn, uid)
+        db.commit()
+    return len(user_ids)
+
+
+def rebuild(user_id=None):
+    if user_id is not None:
+        session_factories = [lambda: sharding.user_session(user_id)]
+    else:
+        session_factories = ShardSessions or [SessionLocal]
+    users = 0
+    for session_factory in session_factories:
+        db = session_factory()
+        try:
+            users += rebuild_database(db, user_id)
+        finally:
+            db.close()
+    return {"users": users}
+
+
+def main():
+    import argparse
+    import json
+
+    try:
+        from .database import engine
+        from .models import Base
+    except ImportError:
+        from database import engine
+        from models import Base
+
+    parser = argparse.ArgumentParser(description="SheCare mood trend rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="recompute the rollups and streaks from the journal entries")
+    rebuild_cmd.add_argument("--user", type=int, help="only this user")
+    args = parser.parse_args()
+    Base.metadata.create_all(bind=engine)
+    sharding.create_tables()
+    print(json.dumps(rebuild(args.user), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Async client for the OmniDimension agent API.
+
+One ``httpx.AsyncClient`` is shared by every request so connections are kept
+alive and pooled instead of opening a new TLS connection per message. Calls
+have separate connect/read timeouts, are retried with jittered exponential
+backoff on transport errors and 5xx/429 responses, and go through a circuit
+breaker that fails fast while the upstream is degraded.
+
+Point ``OMNIDIM_BASE_URL`` at ``app.omni_stub`` to run against a local stub.
+
+httpx is imported on first use; it is one of the slowest imports in the app
+and most cold starts never reach the voice agent.
+"""
+
+import asyncio
+import json
+import random
+import time
+
+try:
+    from .config import settings
+    from .metrics import VOICE_LATENCY
+    from . import tracing
+except ImportError:
+    from config import settings
+    from metrics import VOICE_LATENCY
+    import tracing
+
+
+class OmniError(Exception):
+    """The voice agent could not produce a reply."""
+
+
+class CircuitOpenError(OmniError):
+    """Raised without calling the upstream while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. After ``failure_threshold`` consecutive
+    failures the circuit opens and calls fail immediately. Once
+    ``reset_timeout`` has passed a single trial call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold or settings.OMNIDIM_BREAKER_THRESHOLD
+        self.reset_timeout = reset_timeout or settings.OMNIDIM_BREAKER_RESET
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial slot without an outcome (e.g. cancelled call)."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+
+def _is_retryable(exc):
+    import httpx
+    if isinstance(exc, httpx.TransportError):  # connect/read timeouts, resets, DNS...
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+_DONE = object()
+
+
+def _parse_sse_line(line):
+    """Text carried by one upstream event-stream line, _DONE at the end, or None."""
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return _DONE
+    if not data:
+        return None
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(event, dict):
+        return event.get("delta") or event.get("output") or event.get("text") or None
+    return str(event)
+
+
+class OmniClient:
+    def __init__(self, base_url=None, api_key=None, connect_timeout=None, read_timeout=None,
+                 max_connections=None, max_keepalive=None, retries=None,
+                 backoff_base=None, backoff_max=None, breaker=None):
+        self.base_url = (base_url or settings.OMNIDIM_BASE_URL).rstrip("/")
+        self.api_key = api_key if api_key is not None else settings.OMNIDIM_API_KEY
+        self.connect_timeout = connect_timeout or settings.OMNIDIM_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or settings.OMNIDIM_READ_TIMEOUT
+        self.max_connections = max_connections or settings.OMNIDIM_MAX_CONNECTIONS
+        self.max_keepalive = max_keepalive or settings.OMNIDIM_MAX_KEEPALIVE
+        self.retries = settings.OMNIDIM_RETRIES if retries is None else retries
+        self.backoff_base = backoff_base or settings.OMNIDIM_BACKOFF_BASE
+        self.backoff_max = backoff_max or settings.OMNIDIM_BACKOFF_MAX
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+
+    @property
+    def http(self):
+        # Created lazily so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive),
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else None,
+            )
+        return self._client
+
+    @staticmethod
+    def _start_span(call, agent_id, attempt):
+        span = tracing.start_span(f"omni.{call}", tracing.KIND_CLIENT, agent_id=str(agent_id), attempt=attempt)
+        headers = {"traceparent": span.traceparent} if span.sampled else {}
+        return span, headers
+
+    @staticmethod
+    def _end_span(span, error=None):
+        if error is not None and span.sampled:
+            span.error = type(error).__name__
+        span.end()
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def chat(self, agent_id, message):
+        """Send one message to the agent and return its text reply."""
+        import httpx
+        if not self.breaker.allow():
+            raise CircuitOpenError("OmniDimension circuit is open")
+        last_error = None
+        try:
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                span, headers = self._start_span("chat", agent_id, attempt)
+                try:
+                    response = await self.http.post(f"/agent/{agent_id}/chat", json={"input": message}, headers=headers)
+                    response.raise_for_status()
+                    reply = response.json().get("output", "No response from agent.")
+                    VOICE_LATENCY.labels("chat", "ok").observe(time.perf_counter() - started)
+                    self._end_span(span)
+                    self.breaker.record_success()
+                    return reply
+                except (httpx.HTTPError, ValueError) as e:
+                    VOICE_LATENCY.labels("chat", "error").observe(time.perf_counter() - started)
+                    self._end_span(span, e)
+                    last_error = e
+                    if not _is_retryable(e) or attempt == self.retries:
+                        break
+                except asyncio.CancelledError as e:
+                    self._end_span(span, e)
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        if _is_retryable(last_error):
+            # Only upstream health problems count against the breaker. A bad request says nothing
+            # about upstream health either way: it neither resets the failure count nor closes the circuit
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+        if isinstance(last_error, httpx.HTTPStatusError):
+            raise OmniError(f"upstream returned HTTP {last_error.response.status_code}") from last_error
+        raise OmniError(str(last_error) or type(last_error).__name__) from last_error
+
+    async def stream_chat(self, agent_id, message):
+        """
+        Yield the agent's reply in pieces as they arrive. Uses the upstream's
+        event stream when it offers one and falls back to a single piece for a
+        plain JSON reply. Retries only happen before the first piece is sent.
+        """
+        import httpx
+        if not self.breaker.allow():
+            raise CircuitOpenError("OmniDimension circuit is open")
+        last_error = None
+        try:
+            for attempt in range(self.retries + 1):
+                started = False
+                attempt_started = time.perf_counter()
+                span, headers = self._start_span("stream", agent_id, attempt)
+                try:
+                    async with self.http.stream(
+                        "POST", f"/agent/{agent_id}/chat",
+                        json={"input": message, "stream": True},
+                        headers={"Accept": "text/event-stream, application/json", **headers},
+                    ) as response:
+                        response.raise_for_status()
+                        if response.headers.get("content-type", "").startswith("text/event-stream"):
+                            async for line in response.aiter_lines():
+                                piece = _parse_sse_line(line)
+                                if piece is None:
+                                    continue
+                                if piece is _DONE:
+                                    break
+                                started = True
+                                yield piece
+                        else:
+                            body = json.loads(await response.aread())
+                            started = True
+                            yield body.get("output", "No response from agent.")
+                    VOICE_LATENCY.labels("stream", "ok").observe(time.perf_counter() - attempt_started)
+                    self._end_span(span)
+                    self.breaker.record_success()
+                    return
+                except (httpx.HTTPError, ValueError) as e:
+                    VOICE_LATENCY.labels("stream", "error").observe(time.perf_counter() - attempt_started)
+                    self._end_span(span, e)
+                    last_error = e
+                    if started or not _is_retryable(e) or attempt == self.retries:
+                        break
+                except (asyncio.CancelledError, GeneratorExit) as e:
+                    self._end_span(span, e)
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away: the upstream stream is closed by the context manager
+            self.breaker.release()
+            raise
+        if _is_retryable(last_error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+        if isinstance(last_error, httpx.HTTPStatusError):
+            raise OmniError(f"upstream returned HTTP {last_error.response.status_code}") from last_error
+        raise OmniError(str(last_error) or type(last_error).__name__) from last_error
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+omni_client = OmniClient()
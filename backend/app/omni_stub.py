@@ -0,0 +1,55 @@
+"""
+Local stand-in for the OmniDimension agent API, for tests and load benchmarks.
+
+    uvicorn app.omni_stub:app --port 9100
+    OMNIDIM_BASE_URL=http://127.0.0.1:9100 uvicorn app.app:app
+
+Behaviour is controlled with environment variables:
+    OMNI_STUB_LATENCY_MS   mean reply latency (default 200)
+    OMNI_STUB_JITTER_MS    uniform +/- jitter added to the latency (default 50)
+    OMNI_STUB_FAILURE_RATE fraction of calls answered with a 503 (default 0)
+    OMNI_STUB_TOKEN_MS     delay between streamed words when "stream" is set (default 30)
+"""
+
+import asyncio
+import json
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.getenv("OMNI_STUB_LATENCY_MS", "200"))
+JITTER_MS = float(os.getenv("OMNI_STUB_JITTER_MS", "50"))
+FAILURE_RATE = float(os.getenv("OMNI_STUB_FAILURE_RATE", "0"))
+TOKEN_MS = float(os.getenv("OMNI_STUB_TOKEN_MS", "30"))
+
+app = FastAPI(title="OmniDimension stub")
+stats = {"requests": 0, "failures": 0}
+
+@app.post("/agent/{agent_id}/chat")
+async def chat(agent_id: str, request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    await asyncio.sleep(max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000)
+    if random.random() < FAILURE_RATE:
+        stats["failures"] += 1
+        return JSONResponse(status_code=503, content={"detail": "stub failure"})
+    output = f"[stub agent {agent_id}] You said: {body.get('input')}"
+    if body.get("stream"):
+        return StreamingResponse(_stream_words(output), media_type="text/event-stream")
+    return {"output": output}
+
+async def _stream_words(output):
+    for i, word in enumerate(output.split(" ")):
+        yield f"data: {json.dumps({'delta': word if i == 0 else ' ' + word})}\n\n"
+        await asyncio.sleep(TOKEN_MS / 1000)
+    yield "data: [DONE]\n\n"
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("OMNI_STUB_PORT", "9100")))
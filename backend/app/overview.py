@@ -0,0 +1,167 @@
+"""
+Data for ``GET /me/overview`` in one SQL statement.
+
+The dashboard needs the newest cycle entry, journal entry and PCOS check of
+one user. Instead of three ``ORDER BY ... LIMIT 1`` queries they are joined
+onto a one-row ``SELECT <user id>`` (not the users table, which is in another
+database when sharding is on):
+
+- PostgreSQL: ``LEFT JOIN LATERAL (... ORDER BY ... LIMIT 1)`` per table.
+- SQLite (and others): ``LEFT JOIN t ON t.id = (SELECT id ... LIMIT 1)``, a
+  correlated subquery picking the newest row's id.
+
+Global recommendations come from the shared cache, so a warm overview costs
+the auth lookup plus this one statement. Compare it with the
+``/profile`` + ``/dashboard`` + ``/recommendations`` sequence (in a scratch
+database):
+
+    python -m app.overview bench --users 200 --entries 50 --rounds 200
+"""
+
+from types import SimpleNamespace
+
+from sqlalchemy import Integer, literal, select, true
+
+try:
+    from .models import CycleEntry, JournalEntry, PCOSCheck
+except ImportError:
+    from models import CycleEntry, JournalEntry, PCOSCheck
+
+# table -> (column the newest row is picked by, columns returned)
+LATEST = {
+    "cycle": (CycleEntry, CycleEntry.start_date, ("start_date",)),
+    "journal": (JournalEntry, JournalEntry.date, ("date", "mood", "analysis")),
+    "pcos": (PCOSCheck, PCOSCheck.date, ("date", "risk")),
+}
+
+
+def _me(user_id):
+    return select(literal(user_id, Integer).label("id")).subquery("me")
+
+
+def _lateral_statement(user_id):
+    me = _me(user_id)
+    joins = me
+    columns = [me.c.id]
+    for name, (model, order_by, fields) in LATEST.items():
+        newest = (select(*(getattr(model, f) for f in fields))
+                  .where(model.user_id == me.c.id)
+                  .order_by(order_by.desc(), model.id.desc())
+                  .limit(1)
+                  .lateral(name))
+        joins = joins.outerjoin(newest, true())
+        columns += [newest.c[f].label(f"{name}_{f}") for f in fields]
+    return select(*columns).select_from(joins)
+
+
+def _correlated_statement(user_id):
+    me = _me(user_id)
+    joins = me
+    columns = [me.c.id]
+    for name, (model, order_by, fields) in LATEST.items():
+        table = model.__table__.alias(name)
+        newest_id = (select(model.id)
+                     .where(model.user_id == me.c.id)
+                     .order_by(order_by.desc(), model.id.desc())
+                     .limit(1)
+                     .correlate(me)
+                     .scalar_subquery())
+        joins = joins.outerjoin(table, table.c.id == newest_id)
+        columns += [table.c[f].label(f"{name}_{f}") for f in fields]
+    return select(*columns).select_from(joins)
+
+
+def statement(dialect_name, user_id):
+    if dialect_name == "postgresql":
+        return _lateral_statement(user_id)
+    return _correlated_statement(user_id)
+
+
+def latest_activity(db, user_id):
+    """
+    The user's newest cycle entry, journal entry and PCOS check as
+    ``{"cycle": ..., "journal": ..., "pcos": ...}``, each a namespace with the
+    columns in ``LATEST`` or None when the user has no such row.
+    """
+    row = db.execute(statement(db.bind.dialect.name, user_id)).mappings().first()
+    latest = {}
+    for name, (_, _, fields) in LATEST.items():
+        values = {f: row[f"{name}_{f}"] for f in fields} if row else {}
+        # The ordering column is never NULL on a real row
+        latest[name] = SimpleNamespace(**values) if values and values[fields[0]] is not None else None
+    return latest
+
+
+# --- Benchmark ---
+def bench(users, entries, rounds):
+    """Latency and statements of the three dashboard calls vs. one /me/overview, in the current directory's database."""
+    import statistics
+    import time
+
+    from fastapi.testclient import TestClient
+
+    from . import query_counter
+    from .app import app
+    from .loadtest import PASSWORD, seed, user_email
+
+    seed(users, entries)
+    sequences = {
+        "profile+dashboard+recommendations": ["/profile", "/dashboard", "/recommendations"],
+        "overview": ["/me/overview"],
+    }
+    results = {}
+    with TestClient(app) as client:
+        tokens = [client.post("/auth/login", json={"email": user_email(i), "password": PASSWORD}).json()["access_token"]
+                  for i in range(min(users, 20))]
+        for name, paths in sequences.items():
+            for token in tokens:  # warm up caches
+                for path in paths:
+                    client.get(path, headers={"Authorization": f"Bearer {token}"})
+            timings = []
+            with query_counter.query_budget(max_queries=1000, allow_n_plus_one=True) as seen:
+                for r in range(rounds):
+                    headers = {"Authorization": f"Bearer {tokens[r % len(tokens)]}"}
+                    started = time.perf_counter()
+                    for path in paths:
+                        response = client.get(path, headers=headers)
+                        response.raise_for_status()
+                    timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                "requests": len(paths),
+                "statements": round(sum(stats.count for _, stats in seen) / rounds, 2),
+                "p50_ms": round(statistics.median(timings), 3),
+                "mean_ms": round(statistics.fmean(timings), 3),
+            }
+    return {"users": users, "entries_per_user": entries, "rounds": rounds, "results": results}
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="SheCare /me/overview tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_cmd = sub.add_parser("bench", help="compare /me/overview with the three dashboard calls")
+    bench_cmd.add_argument("--users", type=int, default=200)
+    bench_cmd.add_argument("--entries", type=int, default=50, help="journal entries per user")
+    bench_cmd.add_argument("--rounds", type=int, default=200)
+    bench_cmd.add_argument("--here", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if not args.here:
+        # The SQLite path is fixed when the engine is created, so the scratch
+        # database needs a process started in the scratch directory
+        import os
+        import subprocess
+        import sys
+        import tempfile
+
+        from .startup import BACKEND_DIR
+
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+        sys.exit(subprocess.call([sys.executable, "-m", "app.overview", *sys.argv[1:], "--here"],
+                                 cwd=tempfile.mkdtemp(prefix="shecare-overview-bench-"), env=env))
+    print(json.dumps(bench(args.users, args.entries, args.rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+On-demand sampling profiler for single requests.
+
+A request is profiled when it carries ``X-Profile: 1`` together with a valid
+``X-Admin-Token``, or when it is picked by ``PROFILE_SAMPLE_RATE``. While it
+runs, a background thread samples Python stacks every ``PROFILE_INTERVAL_MS``
+from the threads working on that request only: the event loop thread while
+one of the request's tasks is running (middleware, serialization) and the
+threadpool threads while they run a call the request handed them (endpoint,
+dependencies: queries, bcrypt). Other requests, idle workers and background
+threads stay out of the profile.
+
+To know which tasks and threadpool calls belong to the request, the first
+profiled request installs two hooks that look at a ContextVar: a task
+factory on the event loop and a wrapper around ``anyio.to_thread.run_sync``,
+through which Starlette and FastAPI run every sync call.
+
+Each profile is saved as JSON in ``PROFILE_DIR`` (the newest
+``PROFILE_MAX_FILES`` are kept) with collapsed stacks, which load directly
+into speedscope or flamegraph.pl, and can be shown as a call tree at
+``GET /admin/profiles/{id}?format=tree``. The response gets an
+``X-Profile-Id`` header.
+"""
+
+import asyncio
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+try:
+    from .config import settings
+except ImportError:
+    from config import settings
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The Sampler of the request being profiled; tasks and threadpool calls
+# started by the request inherit it
+_active = ContextVar("profiler_sampler", default=None)
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    if filename.startswith(APP_DIR):
+        filename = "app" + filename[len(APP_DIR):]
+    else:
+        # site-packages/fastapi/routing.py -> fastapi/routing.py
+        parts = filename.replace("\\", "/").split("/")
+        filename = "/".join(parts[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """Samples the stacks of the threads working on one request."""
+
+    def __init__(self, interval, loop=None, task=None):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.stacks = {}  # "root;...;leaf" -> samples
+        self.samples = 0
+        self.loop = loop
+        self.loop_thread = threading.get_ident() if loop is not None else None
+        self.tasks = set()  # the request's tasks that haven't finished
+        self.threads = set()  # threadpool threads running a call for the request
+        if task is not None:
+            self.add_task(task)
+        self._finished = threading.Event()
+
+    def add_task(self, task):
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def run_here(self, func):
+        """Wrap ``func`` so the thread running it is sampled while it does."""
+        def run(*args, **kwargs):
+            thread_id = threading.get_ident()
+            self.threads.add(thread_id)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.threads.discard(thread_id)
+        return run
+
+    def _working_threads(self):
+        threads = set(self.threads)
+        # The loop thread serves every request; only count it while one of ours is running
+        if self.loop is not None and asyncio.current_task(self.loop) in self.tasks:
+            threads.add(self.loop_thread)
+        return threads
+
+    def run(self):
+        while not self._finished.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self._working_threads():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def stop(self):
+        self._finished.set()
+        self.join()
+
+
+class ProfileStore:
+    """Profiles as JSON files in one directory, newest ``max_files`` kept."""
+
+    def __init__(self, directory=None, max_files=None):
+        self.directory = directory or settings.PROFILE_DIR
+        self.max_files = max_files or settings.PROFILE_MAX_FILES
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, profile):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(profile["id"]), "w") as f:
+                json.dump(profile, f)
+            files = sorted((os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(".json")),
+                           key=os.path.getmtime)
+            for path in files[:-self.max_files]:
+                os.remove(path)
+
+    def load(self, profile_id):
+        # ids are hex uuids; anything else can't be a file we wrote
+        if not all(c in "0123456789abcdef" for c in profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                profile = self.load(name[:-5])
+                if profile:
+                    summaries.append({k: v for k, v in profile.items() if k != "stacks"})
+        return sorted(summaries, key=lambda p: p["started_at"], reverse=True)
+
+
+def collapsed(profile):
+    """Collapsed-stack text ("frame;frame;frame count" per line) for flame graph tools."""
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(profile["stacks"].items())) + "\n"
+
+
+def call_tree(profile, min_percent=1.0):
+    """Indented call tree with total and self sample percentages."""
+    root = {"children": {}, "total": 0, "self": 0}
+    for stack, count in profile["stacks"].items():
+        node = root
+        node["total"] += count
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"children": {}, "total": 0, "self": 0})
+            node["total"] += count
+        node["self"] += count
+    total = root["total"] or 1
+    lines = [f"{profile['method']} {profile['route']}  {profile['duration_ms']} ms, {profile['samples']} samples",
+             f"{'total%':>7} {'self%':>6}  frame"]
+
+    def walk(node, depth):
+        for frame, child in sorted(node["children"].items(), key=lambda item: item[1]["total"], reverse=True):
+            percent = child["total"] * 100 / total
+            if percent < min_percent:
+                continue
+            lines.append(f"{percent:>7.1f} {child['self'] * 100 / total:>6.1f}  {'  ' * depth}{frame}")
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return "\n".join(lines) + "\n"
+
+
+store = ProfileStore()
+
+_threadpool_hooked = False
+
+
+def _install_hooks(loop):
+    """Let tasks and threadpool calls started by a profiled request join its Sampler."""
+    global _threadpool_hooked
+    factory = loop.get_task_factory()
+    if not getattr(factory, "profiler_hook", False):
+
+        def task_factory(loop, coro, **kwargs):
+            task = factory(loop, coro, **kwargs) if factory else asyncio.Task(coro, loop=loop, **kwargs)
+            sampler = _active.get()
+            if sampler is not None:
+                sampler.add_task(task)
+            return task
+
+        task_factory.profiler_hook = True
+        loop.set_task_factory(task_factory)
+    if not _threadpool_hooked:
+        _threadpool_hooked = True
+        import anyio.to_thread
+
+        run_sync = anyio.to_thread.run_sync
+
+        async def run_sync_profiled(func, *args, **kwargs):
+            sampler = _active.get()
+            if sampler is not None:
+                func = sampler.run_here(func)
+            return await run_sync(func, *args, **kwargs)
+
+        anyio.to_thread.run_sync = run_sync_profiled
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that profiles requests asked for by an admin or picked by the sample rate."""
+
+    def __init__(self, app, sample_rate=None, interval_ms=None):
+        self.app = app
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.interval = (interval_ms or settings.PROFILE_INTERVAL_MS) / 1000
+
+    def _wanted(self, scope):
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile") == b"1":
+            token = headers.get(b"x-admin-token", b"")
+            if settings.ADMIN_TOKEN and token and hmac.compare_digest(token, settings.ADMIN_TOKEN.encode()):
+                return "admin"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trigger = self._wanted(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        from fastapi.concurrency import run_in_threadpool
+
+        profile_id = uuid.uuid4().hex
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        loop = asyncio.get_running_loop()
+        _install_hooks(loop)
+        sampler = Sampler(self.interval, loop, asyncio.current_task())
+        token = _active.set(sampler)
+        started_at = time.time()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            _active.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            profile = {
+                "id": profile_id,
+                "method": scope["method"],
+                "route": route,
+                "path": scope["path"],
+                "status": status,
+                "trigger": trigger,
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "interval_ms": self.interval * 1000,
+                "samples": sampler.samples,
+                "stacks": sampler.stacks,
+            }
+            await run_in_threadpool(store.save, profile)
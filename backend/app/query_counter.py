@@ -0,0 +1,170 @@
+"""
+Per-request SQL instrumentation.
+
+``install(engine)`` hooks SQLAlchemy's cursor events; ``QueryCounter`` is an
+ASGI middleware that gives every request its own tally of statements, DB time
+and statement shapes. A shape executed ``DB_N_PLUS_ONE_THRESHOLD`` or more
+times in one request (typically a lazy-loaded relationship in a loop) is
+flagged as an N+1 candidate.
+
+- Development (``APP_ENV=development`` or ``DB_QUERY_HEADERS=true``): the
+  ``X-DB-Query-Count``, ``X-DB-Query-Time-Ms`` and ``X-DB-N-Plus-One``
+  response headers, plus a log line naming each suspect statement.
+- Always: per-route metrics at ``/metrics`` (queries and DB time per request,
+  N+1 detections).
+
+``query_budget`` turns the same numbers into assertions for tests.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+try:
+    from .config import settings
+    from .metrics import DB_QUERY_TIME, Counter, Histogram
+except ImportError:
+    from config import settings
+    from metrics import DB_QUERY_TIME, Counter, Histogram
+
+QUERIES_PER_REQUEST = Histogram("shecare_db_queries_per_request", "SQL statements run by one request", ("route",),
+                                buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100))
+DB_TIME_PER_REQUEST = Histogram("shecare_db_time_per_request_seconds", "Total SQL time of one request", ("route",),
+                                buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+N_PLUS_ONE = Counter("shecare_db_n_plus_one", "Requests that repeated one statement shape past the threshold",
+                     ("route",))
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = {}  # statement text (parameters are bound separately) -> times run
+
+    def n_plus_one(self, threshold=None):
+        """Statements run at least ``threshold`` times, most repeated first."""
+        threshold = threshold or settings.DB_N_PLUS_ONE_THRESHOLD
+        suspects = [(statement, n) for statement, n in self.shapes.items() if n >= threshold]
+        return sorted(suspects, key=lambda item: item[1], reverse=True)
+
+
+# The middleware sets a fresh QueryStats per request. Sync endpoints run in a
+# copy of the request context, so they update the same object.
+_current = ContextVar("query_stats", default=None)
+
+# Callbacks receiving (route, stats) after every request; used by query_budget
+_listeners = []
+
+
+def current_stats():
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record_query(statement, time.perf_counter() - conn.info["query_started"].pop())
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; pop its start here
+    # so it doesn't stay on the pooled connection, and still count its time
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        _record_query(exception_context.statement, time.perf_counter() - started.pop())
+
+
+def _record_query(statement, elapsed):
+    DB_QUERY_TIME.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        stats.shapes[statement] = stats.shapes.get(statement, 0) + 1
+
+
+def install(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def _route_of(scope):
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class QueryCounter:
+    """ASGI middleware giving each HTTP request its own query tally."""
+
+    def __init__(self, app, headers=None):
+        self.app = app
+        self.headers = settings.DB_QUERY_HEADERS if headers is None else headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and self.headers:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-query-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+                    (b"x-db-n-plus-one", str(len(stats.n_plus_one())).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            self._record(scope, stats)
+
+    def _record(self, scope, stats):
+        route = _route_of(scope)
+        QUERIES_PER_REQUEST.labels(route).observe(stats.count)
+        DB_TIME_PER_REQUEST.labels(route).observe(stats.seconds)
+        suspects = stats.n_plus_one()
+        if suspects:
+            N_PLUS_ONE.labels(route).inc()
+            if self.headers:
+                for statement, n in suspects:
+                    print(f"N+1 candidate in {scope['method']} {route}: {n}x {' '.join(statement.split())[:200]}")
+        for listener in list(_listeners):
+            listener(f"{scope['method']} {route}", stats)
+
+
+@contextmanager
+def query_budget(max_queries, allow_n_plus_one=False):
+    """
+    Assert that every request made inside the block stays within budget:
+
+        with query_budget(max_queries=5):
+            client.get("/recommendations", headers=auth)
+
+    Raises AssertionError listing the offending requests and their statements.
+    """
+    seen = []
+    listener = lambda route, stats: seen.append((route, stats))
+    _listeners.append(listener)
+    try:
+        yield seen
+    finally:
+        _listeners.remove(listener)
+    problems = []
+    for route, stats in seen:
+        if stats.count > max_queries:
+            problems.append(f"{route} ran {stats.count} queries (budget {max_queries})")
+        if not allow_n_plus_one:
+            for statement, n in stats.n_plus_one():
+                problems.append(f"{route} repeated a statement {n}x: {' '.join(statement.split())[:200]}")
+    if problems:
+        raise AssertionError("Query budget exceeded:\n" + "\n".join(problems))
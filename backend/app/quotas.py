@@ -0,0 +1,120 @@
+"""
+Per-user write quotas.
+
+Each (user, endpoint) pair gets a token bucket: ``burst`` writes can go
+through back to back, after which tokens refill at ``per_minute``. A write
+without a token is answered with 429 before it opens a transaction, so one
+client stuck in a retry loop can't hog SQLite's single writer lock.
+
+Buckets live in memory, per worker, in an LRU capped at
+``WRITE_QUOTA_MAX_BUCKETS``. Evicting a bucket only forgets a user who hasn't
+written for a while; their bucket would have refilled in the meantime anyway.
+
+Every response of a limited endpoint carries ``X-RateLimit-Limit``,
+``X-RateLimit-Remaining`` and ``X-RateLimit-Reset`` (seconds until the bucket
+is full again); a 429 adds ``Retry-After`` (seconds until the next token).
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from .config import settings
+    from .metrics import Counter, Gauge
+except ImportError:
+    from config import settings
+    from metrics import Counter, Gauge
+
+ALLOWED = Counter("shecare_write_quota_allowed", "Writes let through by the per-user quota", ("endpoint",))
+THROTTLED = Counter("shecare_write_quota_throttled", "Writes rejected with 429 by the per-user quota", ("endpoint",))
+BUCKETS = Gauge("shecare_write_quota_buckets", "Per-user token buckets held in memory")
+
+
+def default_limits():
+    """endpoint -> (burst, refills per minute)"""
+    return {
+        "journal": (settings.WRITE_QUOTA_JOURNAL_BURST, settings.WRITE_QUOTA_JOURNAL_PER_MINUTE),
+        "cycle-tracker": (settings.WRITE_QUOTA_CYCLE_BURST, settings.WRITE_QUOTA_CYCLE_PER_MINUTE),
+        "pcos-checker": (settings.WRITE_QUOTA_PCOS_BURST, settings.WRITE_QUOTA_PCOS_PER_MINUTE),
+    }
+
+
+class Decision:
+    __slots__ = ("allowed", "limit", "remaining", "reset_after", "retry_after")
+
+    def __init__(self, allowed, limit, remaining, reset_after, retry_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+    def headers(self):
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class WriteQuotas:
+    def __init__(self, limits=None, max_buckets=None, clock=time.monotonic):
+        self.limits = limits or default_limits()
+        for endpoint, (burst, per_minute) in self.limits.items():
+            # A bucket that never fills or never refills would block the endpoint for good
+            if burst < 1 or per_minute <= 0:
+                raise ValueError(f"Write quota for '{endpoint}' needs burst >= 1 and per_minute > 0, "
+                                 f"got {burst} and {per_minute}; set WRITE_QUOTA_ENABLED=false to turn quotas off")
+        self.max_buckets = max_buckets or settings.WRITE_QUOTA_MAX_BUCKETS
+        self.clock = clock
+        self._buckets = OrderedDict()  # (user_id, endpoint) -> [tokens, updated_at]
+        self._lock = threading.Lock()  # dependencies of sync endpoints run in the threadpool
+        self.evicted = 0
+        self.throttled = {endpoint: 0 for endpoint in self.limits}
+
+    def take(self, user_id, endpoint):
+        burst, per_minute = self.limits[endpoint]
+        rate = per_minute / 60
+        key = (user_id, endpoint)
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            allowed = bucket[0] >= 1
+            if allowed:
+                bucket[0] -= 1
+            else:
+                self.throttled[endpoint] += 1
+            tokens = bucket[0]
+            size = len(self._buckets)
+        BUCKETS.set(size)
+        (ALLOWED if allowed else THROTTLED).labels(endpoint).inc()
+        return Decision(allowed, burst, int(tokens), (burst - tokens) / rate, (1 - tokens) / rate)
+
+    def stats(self):
+        with self._lock:
+            buckets = len(self._buckets)
+        return {
+            "limits": {endpoint: {"burst": burst, "per_minute": per_minute}
+                       for endpoint, (burst, per_minute) in self.limits.items()},
+            "buckets": buckets,
+            "max_buckets": self.max_buckets,
+            "evicted": self.evicted,
+            "throttled": dict(self.throttled),
+        }
+
+
+quotas = WriteQuotas()
@@ -0,0 +1,142 @@
+"""
+Local stand-in for Redis, for trying ``CACHE_BACKEND=redis`` without a Redis
+server. It speaks just enough of the Redis protocol for ``app.cache``:
+PING, GET, SET (EX/PX), MGET, DEL, INCR, SCAN, FLUSHDB, SELECT and AUTH.
+
+Run it from the backend folder:
+
+    python -m app.resp_stub --port 6390
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6390/0 uvicorn app.app:app --workers 4
+
+Data lives in memory only; expiry is checked on read.
+"""
+
+import asyncio
+import fnmatch
+import time
+
+_store = {}  # key -> (value, expires_at or None)
+
+
+def _encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _get(key):
+    entry = _store.get(key)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at is not None and expires_at <= time.monotonic():
+        del _store[key]
+        return None
+    return value
+
+
+def _set(args):
+    key, value = args[0], args[1]
+    expires_at = None
+    options = [a.upper() for a in args[2:]]
+    if b"EX" in options:
+        expires_at = time.monotonic() + float(args[2 + options.index(b"EX") + 1])
+    elif b"PX" in options:
+        expires_at = time.monotonic() + float(args[2 + options.index(b"PX") + 1]) / 1000
+    _store[key] = (value, expires_at)
+    return b"+OK\r\n"
+
+
+def _incr(key):
+    value = int(_get(key) or 0) + 1
+    _store[key] = (str(value).encode(), _store.get(key, (None, None))[1])
+    return _encode(value)
+
+
+def _scan(args):
+    pattern = b"*"
+    for i, arg in enumerate(args[1:-1], start=1):
+        if arg.upper() == b"MATCH":
+            pattern = args[i + 1]
+    keys = [k for k in list(_store) if fnmatch.fnmatchcase(k.decode(), pattern.decode()) and _get(k) is not None]
+    # Everything in one page: cursor 0 means done
+    return _encode([b"0", keys])
+
+
+def handle(command, args):
+    if command == b"PING":
+        return b"+PONG\r\n"
+    if command in (b"SELECT", b"AUTH"):
+        return b"+OK\r\n"
+    if command == b"GET":
+        return _encode(_get(args[0]))
+    if command == b"MGET":
+        return _encode([_get(k) for k in args])
+    if command == b"SET":
+        return _set(args)
+    if command == b"DEL":
+        return _encode(sum(1 for k in args if _store.pop(k, None) is not None))
+    if command == b"INCR":
+        return _incr(args[0])
+    if command == b"SCAN":
+        return _scan(args)
+    if command == b"FLUSHDB":
+        _store.clear()
+        return b"+OK\r\n"
+    return b"-ERR unknown command '%s'\r\n" % command
+
+
+async def _read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. from `redis-cli` or telnet
+        return line.strip().split()
+    parts = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        parts.append((await reader.readexactly(length + 2))[:-2])
+    return parts
+
+
+async def serve_client(reader, writer):
+    try:
+        while True:
+            parts = await _read_command(reader)
+            if not parts:
+                break
+            writer.write(handle(parts[0].upper(), parts[1:]))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port):
+    server = await asyncio.start_server(serve_client, host, port)
+    print(f"RESP stub listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Minimal Redis-protocol server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
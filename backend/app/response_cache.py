@@ -0,0 +1,200 @@
+"""
+Response cache for the voice agent.
+
+Many /voice-chat messages are the same FAQ written slightly differently
+("What is PCOS?", "what is pcos"). Messages are normalized (case folding,
+punctuation stripped, whitespace collapsed) and looked up in a TTL + LRU
+cache. With a similarity threshold set, a message whose token set is close
+enough (Jaccard) to a cached one also counts as a hit, so "what's PCOS
+exactly" can reuse the answer to "what is pcos".
+
+With ``shared`` (a function returning a ``Cache``; the app passes
+``get_cache``) exact replies are stored in that cache, so every worker answers
+from the same entries; the fuzzy index only knows the messages this worker has
+seen. ``clear`` starts a new generation in the shared cache, which hides every
+older reply in every worker.
+
+Messages that look personal (numbers, dates, e-mail addresses, names) and
+requests sent with ``"cache": false`` are never cached.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+try:
+    from .config import settings
+except ImportError:
+    from config import settings
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]|_")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Shared-cache key holding the current generation; replies are keyed under it
+GENERATION_KEY = "voice-cache:generation"
+# Long enough to outlive every reply of the generation before it
+GENERATION_TTL = 365 * 24 * 3600
+
+# Words that don't change the meaning of a question
+FILLER_WORDS = {"a", "an", "the", "please", "can", "could", "you", "tell", "me", "about",
+                "exactly", "actually", "hey", "hi", "hello", "is", "s", "are", "what", "whats"}
+
+
+def normalize(message):
+    text = _PUNCTUATION_RE.sub(" ", (message or "").casefold())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def token_set(normalized):
+    return frozenset(t for t in normalized.split() if t not in FILLER_WORDS)
+
+
+def is_personalized(message, pattern=None):
+    """True when a message carries personal details that make the answer user-specific."""
+    pattern = pattern or _personal_re()
+    return bool(pattern.search(message or ""))
+
+
+_personal_pattern = None
+
+
+def _personal_re():
+    global _personal_pattern
+    if _personal_pattern is None:
+        _personal_pattern = re.compile(settings.VOICE_CACHE_PERSONAL_PATTERN, re.IGNORECASE)
+    return _personal_pattern
+
+
+class ResponseCache:
+    def __init__(self, max_entries=None, ttl=None, similarity=None, shared=None):
+        self.max_entries = max_entries or settings.VOICE_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.VOICE_CACHE_TTL
+        # Minimum Jaccard similarity of token sets for a fuzzy hit, 0 disables it
+        self.similarity = settings.VOICE_CACHE_SIMILARITY if similarity is None else similarity
+        self._shared = shared
+        self._generation = 0  # the shared generation the local entries belong to
+        self._entries = OrderedDict()  # key -> (reply, expires_at, tokens)
+        self._index = {}  # token -> set of keys containing it, for fuzzy lookups
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _key(self, namespace, message):
+        return f"{namespace}:{normalize(message)}"
+
+    def _sync_generation(self, shared):
+        """The shared generation; local entries from an older one are dropped."""
+        generation = shared.get(GENERATION_KEY) or 0
+        if generation != self._generation:
+            with self._lock:
+                self._entries.clear()
+                self._index.clear()
+                self._generation = generation
+        return generation
+
+    def _remove(self, key):
+        _, _, tokens = self._entries.pop(key)
+        for token in tokens:
+            keys = self._index.get(token)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[token]
+
+    def _fuzzy_lookup(self, namespace, tokens, now):
+        if not tokens:
+            return None
+        prefix = f"{namespace}:"
+        # Jaccard >= s needs at least s * |tokens| shared tokens, so entries sharing fewer are skipped
+        min_shared = math.ceil(self.similarity * len(tokens))
+        shared = Counter()
+        for token in tokens:
+            shared.update(self._index.get(token, ()))
+        best_key, best_score = None, self.similarity
+        for key, count in shared.items():
+            if count < min_shared or not key.startswith(prefix):
+                continue
+            _, expires_at, cached_tokens = self._entries[key]
+            if expires_at <= now:
+                continue
+            score = count / len(tokens | cached_tokens)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, message, namespace="default"):
+        key = self._key(namespace, message)
+        if self._shared is not None:
+            shared = self._shared()
+            reply = shared.get(f"voice:{self._sync_generation(shared)}:{key}")
+            if reply is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                return reply
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None and self.similarity:
+                fuzzy_key = self._fuzzy_lookup(namespace, token_set(normalize(message)), now)
+                if fuzzy_key is not None:
+                    key, entry = fuzzy_key, self._entries[fuzzy_key]
+                    self.fuzzy_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, message, reply, namespace="default"):
+        key = self._key(namespace, message)
+        tokens = token_set(normalize(message))
+        if self._shared is not None:
+            shared = self._shared()
+            shared.set(f"voice:{self._sync_generation(shared)}:{key}", reply, ttl=self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (reply, time.monotonic() + self.ttl, tokens)
+            for token in tokens:
+                self._index.setdefault(token, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+        if self._shared is not None:
+            # Old replies stay in the shared cache until they expire, but no worker looks them up any more
+            shared = self._shared()
+            shared.set(GENERATION_KEY, time.time_ns(), ttl=GENERATION_TTL)
+            shared.publish(GENERATION_KEY)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -1,32 +1,167 @@
-import requests
 import os
 import json
+import asyncio
+from functools import lru_cache
 from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from jose import JWTError, jwt
+from starlette.background import BackgroundTask
+
+try:
+    from ..cache import get_cache
+    from ..config import settings
+    from ..omni_client import omni_client, OmniError
+    from ..response_cache import ResponseCache, is_personalized, normalize
+    from ..voice_limits import SingleFlight, PerUserLimiter, UpstreamLimiter, LimitExceeded
+except ImportError:
+    from cache import get_cache
+    from config import settings
+    from omni_client import omni_client, OmniError
+    from response_cache import ResponseCache, is_personalized, normalize
+    from voice_limits import SingleFlight, PerUserLimiter, UpstreamLimiter, LimitExceeded
 
 router = APIRouter()
 
-# Load the agent ID from the file
-with open("c:/Users/riyas/SheCare-AI/backend/app/agent_id.json", "r") as f:
-    agent_id = json.load(f)["agent_id"]
+@lru_cache(maxsize=None)
+def get_agent_id():
+    """Agent ID from agent_id.json next to the app package, read on first use."""
+    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), "agent_id.json"), "r") as f:
+        return json.load(f)["agent_id"]
+
+# Exact replies are shared by every worker through the app cache
+response_cache = ResponseCache(shared=get_cache)
+single_flight = SingleFlight()
+user_limiter = PerUserLimiter()
+upstream_limiter = UpstreamLimiter()
+
+def client_key(request: Request):
+    """User id from a valid bearer token, otherwise the client address."""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        # Imported here: app.py imports this router
+        try:
+            from ..app import SECRET_KEY, ALGORITHM
+        except ImportError:
+            from app import SECRET_KEY, ALGORITHM
+        try:
+            payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+            user_id = payload.get("sub") or payload.get("id")
+            if user_id is not None:
+                return f"user:{user_id}"
+        except JWTError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+async def _call_upstream(agent_id, message):
+    async with upstream_limiter.slot():
+        return await omni_client.chat(agent_id, message)
 
-def ask_omni_dimension(agent_id, message):
-    url = f"https://api.omnidim.io/agent/{agent_id}/chat"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('OMNIDIM_API_KEY')}",
-        "Content-Type": "application/json"
+async def ask_omni_dimension(agent_id, message, use_cache=True):
+    use_cache = use_cache and settings.VOICE_CACHE_ENABLED and not is_personalized(message)
+    if use_cache:
+        cached = response_cache.get(message, namespace=agent_id)
+        if cached is not None:
+            return cached
+    # The agent only sees the message text, so identical messages in flight share one call
+    reply = await single_flight.do((agent_id, normalize(message)), lambda: _call_upstream(agent_id, message))
+    if use_cache:
+        response_cache.set(message, reply, namespace=agent_id)
+    return reply
+
+def limits_stats():
+    return {
+        "coalescing": single_flight.stats(),
+        "per_user": user_limiter.stats(),
+        "upstream": upstream_limiter.stats(),
     }
-    data = {"input": message}
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    return response.json().get("output", "No response from agent.")
 
 @router.post("/voice-chat")
 async def voice_chat(request: Request):
     body = await request.json()
     user_message = body.get("message")
     try:
-        bot_reply = ask_omni_dimension(agent_id, user_message)
+        async with user_limiter.slot(client_key(request)):
+            bot_reply = await ask_omni_dimension(get_agent_id(), user_message, use_cache=body.get("cache", True) is not False)
         return {"response": bot_reply}
-    except Exception as e:
+    except LimitExceeded as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers={"Retry-After": "1"})
+    except OmniError as e:
+        print("Error from OmniDimension:", e)
+        return {"response": "Sorry, I couldn't get a response from OmniDimension."}
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _relay_upstream(agent_id, message, queue):
+    """Producer: push upstream pieces into the bounded queue, then a sentinel."""
+    try:
+        async with upstream_limiter.slot():
+            pieces = omni_client.stream_chat(agent_id, message)
+            try:
+                async for piece in pieces:
+                    # Blocks while the client is slow, which stops us reading the upstream
+                    await queue.put(("token", piece))
+            finally:
+                # Cancelled mid-stream: close the upstream response and free the breaker now, not at GC
+                await pieces.aclose()
+        await queue.put(("done", None))
+    except LimitExceeded as e:
+        await queue.put(("error", e.detail))
+    except OmniError as e:
         print("Error from OmniDimension:", e)
-        return {"response": "Sorry, I couldn't get a response from OmniDimension."}
\ No newline at end of file
+        await queue.put(("error", "Sorry, I couldn't get a response from OmniDimension."))
+
+async def _stream_events(request, message, use_cache):
+    agent_id = get_agent_id()
+    if use_cache:
+        cached = response_cache.get(message, namespace=agent_id)
+        if cached is not None:
+            yield _sse("token", {"text": cached})
+            yield _sse("done", {"response": cached, "cached": True})
+            return
+    queue = asyncio.Queue(maxsize=settings.VOICE_STREAM_BUFFER)
+    producer = asyncio.create_task(_relay_upstream(agent_id, message, queue))
+    parts = []
+    try:
+        while True:
+            try:
+                kind, value = await asyncio.wait_for(queue.get(), timeout=settings.VOICE_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": heartbeat\n\n"
+                continue
+            if kind == "token":
+                parts.append(value)
+                yield _sse("token", {"text": value})
+            elif kind == "done":
+                reply = "".join(parts)
+                if use_cache:
+                    response_cache.set(message, reply, namespace=agent_id)
+                yield _sse("done", {"response": reply})
+                break
+            else:
+                yield _sse("error", {"response": value})
+                break
+    finally:
+        # Client disconnected or stream finished: stop talking to the upstream
+        producer.cancel()
+
+@router.post("/voice-chat/stream")
+async def voice_chat_stream(request: Request):
+    body = await request.json()
+    user_message = body.get("message")
+    use_cache = body.get("cache", True) is not False and settings.VOICE_CACHE_ENABLED and not is_personalized(user_message)
+    user_key = client_key(request)
+    try:
+        # Released by the background task once the stream has ended or the client left
+        user_limiter.acquire(user_key)
+    except LimitExceeded as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers={"Retry-After": "1"})
+    return StreamingResponse(
+        _stream_events(request, user_message, use_cache),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(user_limiter.release, user_key),
+    )
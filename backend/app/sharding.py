@@ -0,0 +1,416 @@
+"""
+Per-user sharding of the SQLite database.
+
+One SQLite file takes one writer at a time, so every journal, cycle and PCOS
+write of every user queues on the same lock. With ``SQLITE_SHARDS=N`` those
+per-user tables live in N files (``SQLITE_SHARD_PATH``), each with its own
+engine and sessionmaker (database.py), and writes of users on different shards
+no longer wait for each other. Users, jobs, recommendations and the shard
+directory stay in the main database.
+
+- A user's home shard is a stable hash of the user id (``shard_hash``). The
+  ``user_shards`` directory records where each user actually is; the first
+  request of a user writes the home shard there. Lookups are cached
+  in-process, so a warm request doesn't touch the directory.
+- Per-user requests use ``user_session(user_id)``; the API's
+  ``get_user_db`` dependency does this for the current user.
+- Admin queries over all users use ``fan_out(fn)``, which runs
+  ``fn(session)`` on every shard in parallel threads.
+
+Moving a user copies the entries to the new shard (they get new ids there),
+points the directory at it and then deletes them from the old one. The
+directory's generation is bumped, so sync tokens issued before the move are
+refused and the client syncs again from scratch. Workers cache the directory:
+run the moving commands while the API is stopped.
+
+    SQLITE_SHARDS=4 python -m app.sharding migrate     # entries of the main database into shards
+    SQLITE_SHARDS=4 python -m app.sharding rebalance   # even out rows per shard (--dry-run to plan only)
+    SQLITE_SHARDS=4 python -m app.sharding move --user 42 --to 3
+    python -m app.sharding bench --shards 1 4 16       # write throughput, in scratch databases
+
+SQLITE_SHARDS can grow (existing users stay where the directory says, new
+users spread over all shards; rebalance to move old ones) but must not shrink.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import delete, func, insert, select, update
+
+try:
+    from .config import settings
+    from .database import SHARD_COUNT, Base, SessionLocal, ShardSessions, engine, shard_engines, shard_hash
+    from .models import ChangeLog, CycleEntry, JournalArchive, JournalEntry, MoodRollup, MoodStreak, PCOSCheck, UserShard
+    from . import archive
+except ImportError:
+    from config import settings
+    from database import SHARD_COUNT, Base, SessionLocal, ShardSessions, engine, shard_engines, shard_hash
+    from models import ChangeLog, CycleEntry, JournalArchive, JournalEntry, MoodRollup, MoodStreak, PCOSCheck, UserShard
+    import archive
+
+# Tables of per-user rows, created in every shard
+SHARDED_MODELS = (CycleEntry, JournalEntry, PCOSCheck, JournalArchive, MoodRollup, MoodStreak, ChangeLog)
+# Rows copied when a user moves, in this order; the change log starts over on the new shard
+MOVED_MODELS = (CycleEntry, JournalEntry, PCOSCheck, JournalArchive, MoodRollup, MoodStreak)
+
+
+def enabled():
+    return SHARD_COUNT > 0
+
+
+def create_tables():
+    for shard_engine in shard_engines:
+        Base.metadata.create_all(bind=shard_engine, tables=[model.__table__ for model in SHARDED_MODELS])
+
+
+# --- Directory ---
+class Directory:
+    """user id -> (shard, generation) from ``user_shards``, with an in-process LRU."""
+
+    def __init__(self, size=None):
+        self.size = size or settings.SHARD_DIRECTORY_CACHE
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, user_id):
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        query = select(UserShard.shard, UserShard.generation).where(UserShard.user_id == user_id)
+        with engine.begin() as conn:
+            row = conn.execute(query).first()
+            if row is None:
+                # First request of this user; OR IGNORE lets a concurrent first request win
+                conn.execute(insert(UserShard).prefix_with("OR IGNORE"),
+                             {"user_id": user_id, "shard": shard_hash(user_id, SHARD_COUNT), "generation": 0})
+                row = conn.execute(query).first()
+        entry = (row.shard, row.generation)
+        with self._lock:
+            self._cache[user_id] = entry
+            if len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def shard_of(self, user_id):
+        return self.lookup(user_id)[0]
+
+    def generation_of(self, user_id):
+        """How often the user was moved; part of their sync tokens. 0 without sharding."""
+        return self.lookup(user_id)[1] if enabled() else 0
+
+    def forget(self, user_id):
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"cached": len(self._cache), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+directory = Directory()
+
+
+# --- Routing ---
+def shard_session(shard):
+    return ShardSessions[shard]()
+
+
+def user_session(user_id):
+    """New session on the database holding ``user_id``'s entries."""
+    if not enabled():
+        return SessionLocal()
+    return shard_session(directory.shard_of(user_id))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def fan_out(fn):
+    """
+    ``fn(session)`` on every shard at once, each in its own thread and session;
+    the results in shard order. Without sharding, ``fn`` runs once on the main
+    database.
+    """
+    global _pool
+    factories = ShardSessions or [SessionLocal]
+
+    def run(factory):
+        db = factory()
+        try:
+            return fn(db)
+        finally:
+            db.close()
+
+    if len(factories) == 1:
+        return [run(factories[0])]
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=len(factories), thread_name_prefix="shard-fan-out")
+    return list(_pool.map(run, factories))
+
+
+def row_counts(db):
+    return {model.__tablename__: db.query(func.count(model.id)).scalar() for model in SHARDED_MODELS}
+
+
+def stats():
+    """Rows per shard, counted on all shards in parallel, and the users the directory places there."""
+    counts = fan_out(row_counts)
+    if not enabled():
+        return {"shards": 0, "main": counts[0]}
+    with engine.connect() as conn:
+        users = dict(conn.execute(select(UserShard.shard, func.count()).group_by(UserShard.shard)).all())
+    return {
+        "shards": SHARD_COUNT,
+        "per_shard": [{"shard": i, "users": users.get(i, 0), **c} for i, c in enumerate(counts)],
+        "directory": directory.stats(),
+    }
+
+
+# --- Moving users ---
+def move_user(user_id, source, target):
+    """
+    Move a user's entries from shard ``source`` (None: the main database) to
+    shard ``target`` and point the directory there. Safe to run again after an
+    interruption. Returns the number of entries moved.
+    """
+    source_db = SessionLocal() if source is None else shard_session(source)
+    target_db = shard_session(target)
+    try:
+        rows = {}
+        for model in MOVED_MODELS:
+            table = model.__table__
+            rows[model] = [dict(r._mapping) for r in source_db.execute(select(table).where(table.c.user_id == user_id))]
+        # Leftovers of an interrupted move of this user are replaced, not duplicated
+        for model in SHARDED_MODELS:
+            target_db.execute(delete(model.__table__).where(model.__table__.c.user_id == user_id))
+        new_journal_ids = {}
+        for model, values in rows.items():
+            for row in values:
+                old_id = row.pop("id")
+                if model is JournalArchive:
+                    # Archive blocks are keyed by journal entry id
+                    row["codec"], row["data"], row["raw_bytes"] = archive.remap(row["codec"], row["data"], new_journal_ids)
+                new_id = target_db.execute(insert(model.__table__), row).inserted_primary_key[0]
+                if model is JournalEntry:
+                    new_journal_ids[old_id] = new_id
+        target_db.commit()
+
+        with engine.begin() as conn:
+            moved = conn.execute(update(UserShard).where(UserShard.user_id == user_id)
+                                 .values(shard=target, generation=UserShard.generation + 1)).rowcount
+            if not moved:
+                conn.execute(insert(UserShard), {"user_id": user_id, "shard": target, "generation": 1})
+        directory.forget(user_id)
+
+        for model in SHARDED_MODELS:
+            source_db.execute(delete(model.__table__).where(model.__table__.c.user_id == user_id))
+        source_db.commit()
+        return sum(len(rows[model]) for model in (CycleEntry, JournalEntry, PCOSCheck))
+    finally:
+        source_db.close()
+        target_db.close()
+
+
+def migrate():
+    """Move every user's entries out of the main database onto their shard."""
+    db = SessionLocal()
+    try:
+        user_ids = set()
+        for model in MOVED_MODELS:
+            user_ids.update(u for (u,) in db.query(model.user_id).distinct())
+    finally:
+        db.close()
+    moved = sum(move_user(user_id, None, directory.shard_of(user_id)) for user_id in sorted(user_ids))
+    return {"users": len(user_ids), "entries": moved}
+
+
+def user_rows(db):
+    """Entries per user on one shard."""
+    totals = {}
+    for model in (CycleEntry, JournalEntry, PCOSCheck):
+        for user_id, count in db.query(model.user_id, func.count(model.id)).group_by(model.user_id):
+            totals[user_id] = totals.get(user_id, 0) + count
+    return totals
+
+
+def plan_rebalance(max_moves=100, tolerance=0.1):
+    """
+    Moves that even out entries per shard: repeatedly the biggest user of the
+    fullest shard that still narrows its gap to the emptiest one goes there,
+    until every shard is within ``tolerance`` of the mean.
+    """
+    per_shard = fan_out(user_rows)
+    loads = [sum(rows.values()) for rows in per_shard]
+    allowed_gap = tolerance * max(1, sum(loads) / len(loads))
+    moves = []
+    while len(moves) < max_moves:
+        heavy = max(range(len(loads)), key=loads.__getitem__)
+        light = min(range(len(loads)), key=loads.__getitem__)
+        gap = loads[heavy] - loads[light]
+        if gap <= allowed_gap:
+            break
+        candidates = [(rows, user_id) for user_id, rows in per_shard[heavy].items() if rows < gap]
+        if not candidates:
+            break
+        rows, user_id = max(candidates)
+        per_shard[light][user_id] = per_shard[heavy].pop(user_id)
+        loads[heavy] -= rows
+        loads[light] += rows
+        moves.append({"user_id": user_id, "from": heavy, "to": light, "entries": rows})
+    return moves, loads
+
+
+def rebalance(max_moves=100, tolerance=0.1, dry_run=False):
+    moves, loads = plan_rebalance(max_moves, tolerance)
+    if not dry_run:
+        for move in moves:
+            move_user(move["user_id"], move["from"], move["to"])
+    return {"moves": moves, "entries_per_shard_after": loads, "dry_run": dry_run}
+
+
+# --- Benchmark ---
+def bench_writes(users, writes, threads):
+    """Journal entries committed per second by ``threads`` writers, in the current directory's databases."""
+    import random
+    import time
+    from datetime import datetime
+
+    from sqlalchemy.exc import OperationalError
+
+    try:
+        from . import sync
+        from .models import User
+    except ImportError:
+        import sync
+        from models import User
+
+    Base.metadata.create_all(bind=engine)
+    create_tables()
+    # The API logs journal changes in the same transaction; so does the benchmark
+    for factory in ShardSessions:
+        sync.install(factory)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": f"shard-bench-{i}@example.com", "hashed_password": "x"}
+                                    for i in range(users)])
+        user_ids = [u for (u,) in conn.execute(select(User.id))]
+    for user_id in user_ids:
+        directory.shard_of(user_id)  # warm the directory, as in a running worker
+
+    errors = 0
+    lock = threading.Lock()
+
+    def writer(n):
+        nonlocal errors
+        rng = random.Random(n)
+        for _ in range(writes // threads):
+            user_id = rng.choice(user_ids)
+            db = user_session(user_id)
+            try:
+                db.add(JournalEntry(user_id=user_id, date=datetime.utcnow(), mood="calm", text="benchmark entry " * 8))
+                db.commit()
+            except OperationalError:
+                # database is locked: the writer waited out the SQLite busy timeout
+                with lock:
+                    errors += 1
+            finally:
+                db.close()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    committed = (writes // threads) * threads - errors
+    return {
+        "shards": SHARD_COUNT,
+        "writes": committed,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "writes_per_sec": round(committed / elapsed, 1),
+    }
+
+
+def bench(shard_counts, users, writes, threads):
+    """``bench_writes`` for each shard count, each in a fresh scratch directory."""
+    import json
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    from .startup import BACKEND_DIR
+
+    results = []
+    for shards in shard_counts:
+        # The database paths are fixed when the engines are created, so each
+        # run is a process started in its own scratch directory
+        env = dict(os.environ, SQLITE_SHARDS=str(shards), PYTHONPATH=BACKEND_DIR)
+        output = subprocess.check_output(
+            [sys.executable, "-m", "app.sharding", "bench-here",
+             "--users", str(users), "--writes", str(writes), "--threads", str(threads)],
+            cwd=tempfile.mkdtemp(prefix=f"shecare-shard-bench-{shards}-"), env=env)
+        results.append(json.loads(output))
+    return {"users": users, "writers": threads, "results": results}
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="SheCare SQLite sharding tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="entries per shard and users per shard")
+    sub.add_parser("migrate", help="move entries from the main database onto the shards")
+    rebalance_cmd = sub.add_parser("rebalance", help="move users until the shards hold about as many entries each")
+    rebalance_cmd.add_argument("--max-moves", type=int, default=100)
+    rebalance_cmd.add_argument("--tolerance", type=float, default=0.1, help="allowed gap as a fraction of the mean")
+    rebalance_cmd.add_argument("--dry-run", action="store_true")
+    move_cmd = sub.add_parser("move", help="move one user to another shard")
+    move_cmd.add_argument("--user", type=int, required=True)
+    move_cmd.add_argument("--to", type=int, required=True)
+    for name in ("bench", "bench-here"):
+        bench_cmd = sub.add_parser(name, help="write throughput at several shard counts" if name == "bench"
+                                   else argparse.SUPPRESS)
+        if name == "bench":
+            bench_cmd.add_argument("--shards", type=int, nargs="+", default=[1, 4, 16])
+        bench_cmd.add_argument("--users", type=int, default=200)
+        bench_cmd.add_argument("--writes", type=int, default=4000)
+        bench_cmd.add_argument("--threads", type=int, default=16, help="concurrent writers")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        result = bench(args.shards, args.users, args.writes, args.threads)
+    elif args.command == "bench-here":
+        result = bench_writes(args.users, args.writes, args.threads)
+    else:
+        if not enabled():
+            parser.error("set SQLITE_SHARDS to the number of shards first")
+        Base.metadata.create_all(bind=engine)
+        create_tables()
+        if args.command == "stats":
+            result = stats()
+        elif args.command == "migrate":
+            result = migrate()
+        elif args.command == "rebalance":
+            result = rebalance(args.max_moves, args.tolerance, args.dry_run)
+        else:
+            if not 0 <= args.to < SHARD_COUNT:
+                parser.error(f"--to must be a shard between 0 and {SHARD_COUNT - 1}")
+            result = {"user_id": args.user, "from": directory.shard_of(args.user), "to": args.to}
+            result["entries"] = move_user(args.user, result["from"], args.to) if result["from"] != args.to else 0
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
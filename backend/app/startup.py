@@ -0,0 +1,199 @@
+"""
+Cold-start instrumentation for SheCare AI.
+
+The running app records how long its import and lifespan startup took and the
+latency of the first request it served (``startup_stats``, shown at
+``GET /admin/startup``). The command line tools measure a fresh process:
+
+    python -m app.startup imports --top 20
+    python -m app.startup bench --runs 5 --save startup.json
+    python -m app.startup bench --baseline startup.json --tolerance 0.2
+
+``bench`` boots ``app.app:app`` under uvicorn in an empty working directory
+(so the SQLite file is created from scratch) and times spawn -> first
+successful ``GET /health``. With ``--baseline`` it exits non-zero when the
+median time-to-first-response regresses by more than the tolerance.
+"""
+
+import os
+import re
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+startup_stats = {
+    "import_seconds": None,
+    "lifespan_seconds": None,
+    "first_request_path": None,
+    "first_request_seconds": None,
+    "first_request_after_start_seconds": None,
+}
+
+_import_started = None
+
+
+def mark_import_started():
+    global _import_started
+    _import_started = time.perf_counter()
+
+
+def mark_import_finished():
+    if _import_started is not None:
+        startup_stats["import_seconds"] = round(time.perf_counter() - _import_started, 4)
+
+
+class FirstRequestTimer:
+    """ASGI middleware that times the first HTTP request, then gets out of the way."""
+
+    def __init__(self, app):
+        self.app = app
+        self.done = False
+
+    async def __call__(self, scope, receive, send):
+        if self.done or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.done = True
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            finished = time.perf_counter()
+            startup_stats["first_request_path"] = scope.get("path")
+            startup_stats["first_request_seconds"] = round(finished - started, 4)
+            if _import_started is not None:
+                startup_stats["first_request_after_start_seconds"] = round(finished - _import_started, 4)
+
+
+# --- Command line tools ---
+# Their imports live inside the functions so the app itself only pays for the timers above.
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_profile(module="app.app"):
+    """Run ``python -X importtime`` in a fresh interpreter and parse its tree."""
+    import subprocess
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd, env={**os.environ, "PYTHONPATH": BACKEND_DIR}, capture_output=True, text=True,
+        )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": (len(indent) - 1) // 2,
+            })
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    return rows
+
+
+def _free_port():
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_response(path="/health", timeout=30.0):
+    """Spawn uvicorn on a fresh database and time spawn -> first 200 on ``path``."""
+    import subprocess
+    import tempfile
+    import urllib.request
+
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as cwd:
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.app:app", "--port", str(port), "--log-level", "warning"],
+            cwd=cwd, env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            while time.perf_counter() - started < timeout:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                        if response.status == 200:
+                            return time.perf_counter() - started
+                except OSError:
+                    time.sleep(0.005)
+            raise RuntimeError(f"server did not answer {path} within {timeout}s")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def run_bench(runs, path):
+    import statistics
+
+    samples = [time_to_first_response(path) for _ in range(runs)]
+    imports = import_profile()
+    total = next((r for r in reversed(imports) if r["module"] == "app.app"), None)
+    return {
+        "path": path,
+        "runs": runs,
+        "time_to_first_response_ms": {
+            "median": round(statistics.median(samples) * 1000, 1),
+            "min": round(min(samples) * 1000, 1),
+            "max": round(max(samples) * 1000, 1),
+        },
+        "import_app_ms": total["cumulative_ms"] if total else None,
+        "python": sys.version.split()[0],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="SheCare cold-start report")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imports = sub.add_parser("imports", help="import tree timing for app.app")
+    imports.add_argument("--top", type=int, default=25, help="show the N slowest imports (cumulative)")
+    imports.add_argument("--module", default="app.app")
+
+    bench = sub.add_parser("bench", help="time-to-first-response benchmark")
+    bench.add_argument("--runs", type=int, default=5)
+    bench.add_argument("--path", default="/health")
+    bench.add_argument("--save", help="write results as JSON to this file")
+    bench.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    bench.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+
+    args = parser.parse_args()
+    if args.command == "imports":
+        rows = import_profile(args.module)
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for row in sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:args.top]:
+            print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {'  ' * row['depth']}{row['module']}")
+        return
+
+    result = run_bench(args.runs, args.path)
+    print(json.dumps(result, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        before = baseline["time_to_first_response_ms"]["median"]
+        after = result["time_to_first_response_ms"]["median"]
+        limit = before * (1 + args.tolerance)
+        if after > limit:
+            print(f"❌ Time to first response regressed: {after}ms vs baseline {before}ms (limit {limit:.1f}ms)")
+            sys.exit(1)
+        print(f"✅ Time to first response {after}ms within {args.tolerance:.0%} of baseline {before}ms")
+
+
+if __name__ == "__main__":
+    main()
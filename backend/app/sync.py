@@ -0,0 +1,194 @@
+"""
+Incremental sync for offline clients: ``GET /sync?since=<token>``.
+
+Every insert, update and delete of a journal or cycle entry appends a row to
+``change_log`` (user, entity, id, ``upsert``/``delete``) in the same
+transaction as the change. The log's autoincrement id is the change sequence
+and the ``(user_id, id)`` index makes "what changed for this user after N" a
+range scan. A sync token is the last sequence number the client has seen.
+
+Ids are handed out at insert, not at commit: on PostgreSQL or MySQL a
+transaction holding id 10 can commit after one holding id 11, and a sync in
+between would move the token past 10 for good. So the transactions logging
+one user's changes take turns: the first to log locks the user's row until it
+commits, and a user's log rows become visible in id order. SQLite has one
+writer at a time, which does the same.
+
+- No token: the full current state and a token to continue from.
+- A token: only what changed after it, each entry once in its latest state,
+  deleted entries as ids (tombstones). At most ``SYNC_MAX_CHANGES`` log rows
+  are read per call; ``has_more`` says to call again with the new token.
+
+Log rows older than ``SYNC_LOG_RETENTION_DAYS`` are pruned, oldest first,
+every ``SYNC_PRUNE_EVERY`` logged changes (the newest row always stays, so
+sequence numbers are never reused). A token from before the oldest remaining
+row may have missed pruned changes: the client gets the full state with
+``reset`` set and replaces its copy, as after a sync without a token.
+
+With sharding the log lives on the user's shard and its sequence is per
+shard; moving a user bumps their directory generation, which tokens carry, so
+tokens from before a move are refused and the client starts over.
+
+ORM flushes are logged automatically (``install``). Bulk writes that skip the
+ORM's unit of work call ``record_updates``.
+"""
+
+import itertools
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, literal, select
+
+try:
+    from .config import settings
+    from .models import ChangeLog, CycleEntry, JournalEntry, User
+except ImportError:
+    from config import settings
+    from models import ChangeLog, CycleEntry, JournalEntry, User
+
+ENTITIES = {"journal": JournalEntry, "cycle": CycleEntry}
+_ENTITY_OF = {model: name for name, model in ENTITIES.items()}
+
+# Log rows written by this process since the last prune (races only cost an extra prune)
+_logged = 0
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(sequence, generation=0):
+    return f"{generation}.{sequence}" if generation else str(sequence)
+
+
+def decode_token(token, generation=0):
+    """The sequence number in ``token``; it must come from the user's current ``generation``."""
+    token_generation, _, sequence = (token or "").rpartition(".")
+    try:
+        sequence = int(sequence)
+        token_generation = int(token_generation or 0)
+    except ValueError:
+        raise InvalidToken("Invalid sync token.")
+    if sequence < 0 or token_generation < 0:
+        raise InvalidToken("Invalid sync token.")
+    if token_generation != generation:
+        raise InvalidToken("Your entries moved since this sync token was issued. Sync again without a token.")
+    return sequence
+
+
+def _lock_users(conn, user_ids):
+    """Hold the users' rows until commit so their log rows commit in id order (see above)."""
+    if conn.dialect.name != "sqlite":
+        conn.execute(select(User.id).where(User.id.in_(sorted(set(user_ids)))).order_by(User.id).with_for_update())
+
+
+def _after_flush(session, flush_context):
+    global _logged
+    rows = []
+    for objects, op in ((session.new, "upsert"), (session.dirty, "upsert"), (session.deleted, "delete")):
+        for obj in objects:
+            entity = _ENTITY_OF.get(type(obj))
+            if entity is None or (op == "upsert" and obj in session.dirty and not session.is_modified(obj)):
+                continue
+            rows.append({"user_id": obj.user_id, "entity": entity, "entity_id": obj.id, "op": op})
+    if rows:
+        conn = session.connection()
+        _lock_users(conn, [row["user_id"] for row in rows])
+        conn.execute(insert(ChangeLog), rows)
+        _logged += len(rows)
+        if _logged >= settings.SYNC_PRUNE_EVERY:
+            _logged = 0
+            prune(conn)
+
+
+def install(session_factory):
+    """Log journal and cycle changes flushed by sessions of ``session_factory``."""
+    if not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+
+
+def record_updates(db, entity, ids):
+    """Log updates made with bulk operations (no ORM events); commits with ``db``."""
+    model = ENTITIES[entity]
+    conn = db.connection()
+    if conn.dialect.name != "sqlite":
+        _lock_users(conn, conn.execute(select(model.user_id).where(model.id.in_(list(ids)))).scalars())
+    db.execute(insert(ChangeLog).from_select(
+        ["user_id", "entity", "entity_id", "op"],
+        select(model.user_id, literal(entity), model.id, literal("upsert")).where(model.id.in_(list(ids))),
+    ))
+
+
+def prune(conn, older_than_days=None, limit=None):
+    """Delete up to ``limit`` of the oldest log rows past the retention period. Returns the count."""
+    older_than_days = settings.SYNC_LOG_RETENTION_DAYS if older_than_days is None else older_than_days
+    limit = limit or settings.SYNC_PRUNE_EVERY * 5
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    oldest = conn.execute(select(ChangeLog.id, ChangeLog.created_at).order_by(ChangeLog.id).limit(limit + 1)).all()
+    # Ids first (DELETE ... LIMIT isn't portable); stop at the first row still kept, and keep the newest
+    ids = list(itertools.takewhile(lambda row: row.created_at is not None and row.created_at < cutoff, oldest[:-1]))
+    if not ids:
+        return 0
+    table = ChangeLog.__table__
+    return conn.execute(delete(table).where(table.c.id.in_([row.id for row in ids]))).rowcount
+
+
+def horizon(db):
+    """
+    Oldest sequence number that is still a valid token: changes after older
+    ones may be pruned. Conservative, since rows removed with an account or a
+    shard move count too; that only costs some clients an extra reset.
+    """
+    oldest = db.query(func.min(ChangeLog.id)).scalar()
+    return oldest - 1 if oldest else 0
+
+
+def latest_sequence(db, user_id=None):
+    query = db.query(func.max(ChangeLog.id))
+    if user_id is not None:
+        query = query.filter(ChangeLog.user_id == user_id)
+    return query.scalar() or 0
+
+
+def changes(db, user_id, since=None, limit=None, generation=0):
+    """
+    ``(token, {entity: {"upserted": [rows], "deleted": [ids]}}, has_more, reset)``
+    for one user, either everything (``since`` is None, or ``reset`` when
+    ``since`` is older than the pruned log) or what changed after the
+    sequence number ``since``.
+    """
+    limit = limit or settings.SYNC_MAX_CHANGES
+    oldest_valid = horizon(db)
+    reset = since is not None and since < oldest_valid
+    if since is None or reset:
+        # Read the sequence first: a write landing in between is sent again next time.
+        # Never below the horizon, or the token would expire at once.
+        token = max(latest_sequence(db, user_id), oldest_valid)
+        payload = {entity: {"upserted": db.query(model).filter(model.user_id == user_id).order_by(model.id).all(),
+                            "deleted": []}
+                   for entity, model in ENTITIES.items()}
+        return encode_token(token, generation), payload, False, reset
+
+    log = (db.query(ChangeLog.id, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op)
+           .filter(ChangeLog.user_id == user_id, ChangeLog.id > since)
+           .order_by(ChangeLog.id)
+           .limit(limit + 1)
+           .all())
+    if not log and since > latest_sequence(db):
+        # Tokens never pass the newest change unless the database was reset
+        raise InvalidToken("Sync token is ahead of the server. Sync again without a token.")
+    has_more = len(log) > limit
+    log = log[:limit]
+    latest_op = {}  # (entity, id) -> last op in this window
+    for _, entity, entity_id, op in log:
+        latest_op[(entity, entity_id)] = op
+    payload = {}
+    for entity, model in ENTITIES.items():
+        upserted = sorted(i for (e, i), op in latest_op.items() if e == entity and op == "upsert")
+        deleted = sorted(i for (e, i), op in latest_op.items() if e == entity and op == "delete")
+        rows = []
+        if upserted:
+            # An entry deleted after this window is missing here; its delete comes next time
+            rows = db.query(model).filter(model.id.in_(upserted), model.user_id == user_id).order_by(model.id).all()
+        payload[entity] = {"upserted": rows, "deleted": deleted}
+    token = log[-1][0] if log else since
+    return encode_token(token, generation), payload, has_more, False
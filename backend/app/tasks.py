@@ -0,0 +1,33 @@
+"""
+Background job handlers. Imported by the job worker (python -m app.job_queue).
+"""
+
+try:
+    from .job_queue import task
+    from . import journal_analysis
+    from . import archive
+    from . import accounts
+except ImportError:
+    from job_queue import task
+    import journal_analysis
+    import archive
+    import accounts
+
+
+@task("journal.backfill")
+def backfill_journal_analysis(payload, db):
+    return journal_analysis.backfill(
+        batch_size=payload.get("batch_size", 500),
+        workers=payload.get("workers", 1),
+        force=payload.get("force", False),
+    )
+
+
+@task("journal.archive")
+def archive_journal_entries(payload, db):
+    return archive.run(older_than_days=payload.get("older_than_days"))
+
+
+@task("account.purge")
+def purge_account(payload, db):
+    return accounts.purge(payload["deletion_id"])
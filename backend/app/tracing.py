@@ -0,0 +1,347 @@
+"""
+Lightweight request tracing.
+
+Spans cover the request itself, ``get_current_user`` (JWT decode + user
+lookup), every SQL statement, bcrypt, JSON encoding of the response and calls
+to OmniDimension. Trace context follows the W3C ``traceparent`` header: an
+incoming one is continued (and its sampled flag honoured), the response
+carries the request span's ``traceparent``, and outbound OmniDimension calls
+forward it.
+
+Configure with:
+
+- ``TRACE_EXPORTER``: ``none`` (default, tracing off), ``console``, ``jsonl``
+  (one span per line in ``TRACE_FILE``) or ``otlp`` (OTLP/HTTP JSON to
+  ``TRACE_OTLP_ENDPOINT``, e.g. a local OpenTelemetry collector).
+- ``TRACE_SAMPLE_RATE``: share of new traces recorded (0.0 - 1.0).
+
+Unsampled requests get a shared no-op span, so tracing costs next to nothing
+when it is off.
+"""
+
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from .config import settings
+except ImportError:
+    from config import settings
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    sampled = True
+
+    def __init__(self, name, trace_id, parent_id=None, kind=KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            exporter().export(self)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    sampled = False
+    traceparent = None
+
+    def set(self, key, value):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP = _NoopSpan()
+
+_current = ContextVar("trace_span", default=NOOP)
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name, kind=KIND_INTERNAL, **attributes):
+    """A child of the current span; the caller must ``end()`` it."""
+    parent = _current.get()
+    if not parent.sampled:
+        return NOOP
+    return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+
+
+@contextmanager
+def span(name, kind=KIND_INTERNAL, **attributes):
+    """Record a child span of the current one around a block."""
+    child = start_span(name, kind, **attributes)
+    if not child.sampled:
+        yield child
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+def outbound_headers():
+    """``traceparent`` header for outgoing calls made inside the current span."""
+    traceparent = _current.get().traceparent
+    return {"traceparent": traceparent} if traceparent else {}
+
+
+# --- Exporters ---
+class Exporter:
+    enabled = False
+
+    def export(self, span):
+        pass
+
+
+class ConsoleExporter(Exporter):
+    enabled = True
+
+    def export(self, span):
+        print(f"[trace {span.trace_id[:8]}] {span.name} {(span.end_ns - span.start_ns) / 1e6:.2f}ms "
+              f"{span.attributes if span.attributes else ''}{' error=' + span.error if span.error else ''}")
+
+
+class JSONLinesExporter(Exporter):
+    enabled = True
+
+    def __init__(self, path=None):
+        self.path = path or settings.TRACE_FILE
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict())
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter(Exporter):
+    """Batches spans and posts them as OTLP/HTTP JSON from a background thread."""
+
+    enabled = True
+
+    def __init__(self, endpoint=None, max_queue=2048, batch_size=256, flush_interval=1.0):
+        self.endpoint = endpoint or settings.TRACE_OTLP_ENDPOINT
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            # Never slow requests down because the collector is behind
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._send(batch)
+
+    def _payload(self, spans):
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": settings.TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "shecare.tracing"}, "spans": [{
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.parent_id or "",
+                "name": s.name,
+                "kind": s.kind,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            } for s in spans]}],
+        }]}
+
+    def _send(self, spans):
+        import urllib.request
+
+        request = urllib.request.Request(self.endpoint, data=json.dumps(self._payload(spans)).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+        except OSError as e:
+            self.failed += len(spans)
+            print("Trace export failed:", e)
+
+
+EXPORTERS = {"none": Exporter, "console": ConsoleExporter, "jsonl": JSONLinesExporter, "otlp": OTLPExporter}
+
+_exporter = None
+
+
+def exporter():
+    global _exporter
+    if _exporter is None:
+        exporter_cls = EXPORTERS.get(settings.TRACE_EXPORTER)
+        if exporter_cls is None:
+            raise ValueError(f"Unknown TRACE_EXPORTER '{settings.TRACE_EXPORTER}', use one of {sorted(EXPORTERS)}")
+        _exporter = exporter_cls()
+    return _exporter
+
+
+# --- Instrumentation ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_span = start_span("db.query", KIND_CLIENT)
+    if db_span.sampled:
+        db_span.set("db.statement", " ".join(statement.split())[:500])
+    conn.info.setdefault("trace_spans", []).append(db_span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["trace_spans"].pop().end()
+
+
+def _handle_error(exception_context):
+    spans = exception_context.connection.info.get("trace_spans") if exception_context.connection else None
+    if spans:
+        failed = spans.pop()
+        if failed.sampled:
+            failed.error = type(exception_context.original_exception).__name__
+        failed.end()
+
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    if not exporter().enabled or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the request span and handling ``traceparent``."""
+
+    def __init__(self, app, sample_rate=None):
+        self.app = app
+        self.sample_rate = settings.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def _root(self, scope):
+        trace_id, parent_id, sampled = None, None, None
+        for name, value in scope.get("headers") or []:
+            if name == b"traceparent":
+                match = _TRACEPARENT_RE.match(value.decode("latin-1").strip().lower())
+                if match:
+                    trace_id, parent_id = match.group(1), match.group(2)
+                    sampled = int(match.group(3), 16) & 1 == 1
+                break
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return NOOP
+        return Span(scope["method"], trace_id or os.urandom(16).hex(), parent_id, KIND_SERVER,
+                    {"http.method": scope["method"], "http.target": scope["path"]})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not exporter().enabled:
+            return await self.app(scope, receive, send)
+        request_span = self._root(scope)
+        if not request_span.sampled:
+            return await self.app(scope, receive, send)
+
+        async def send_with_context(message):
+            if message["type"] == "http.response.start":
+                request_span.set("http.status_code", message["status"])
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"traceparent", request_span.traceparent.encode())]
+            await send(message)
+
+        token = _current.set(request_span)
+        try:
+            await self.app(scope, receive, send_with_context)
+        except BaseException as e:
+            request_span.error = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                request_span.set("http.route", route)
+            request_span.name = f"{scope['method']} {route or scope['path']}"
+            request_span.end()
+
+
+def traced_json_response():
+    """JSONResponse whose body encoding is recorded as a span."""
+    from fastapi.responses import JSONResponse
+
+    class TracedJSONResponse(JSONResponse):
+        def render(self, content):
+            with span("json.encode") as encode_span:
+                body = super().render(content)
+                encode_span.set("size", len(body))
+                return body
+
+    return TracedJSONResponse
@@ -0,0 +1,140 @@
+"""
+Concurrency controls for the voice agent.
+
+- ``SingleFlight`` lets concurrent identical requests share one upstream call.
+- ``PerUserLimiter`` caps how many voice requests one user can have in flight.
+- ``UpstreamLimiter`` is a global semaphore in front of OmniDimension with a
+  bounded wait queue, so bursts queue up (or are rejected) instead of
+  exceeding the upstream's rate limits.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+try:
+    from .config import settings
+except ImportError:
+    from config import settings
+
+
+class LimitExceeded(Exception):
+    """Raised when a request can't be admitted; carries the HTTP status to return."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, make_call):
+        """Run ``make_call()`` once per key at a time; concurrent callers share the result."""
+        future = self._flights.get(key)
+        if future is not None:
+            self.followers += 1
+            # shield: a follower giving up must not cancel the shared call
+            return await asyncio.shield(future)
+        self.leaders += 1
+        future = asyncio.ensure_future(make_call())
+        self._flights[key] = future
+        future.add_done_callback(lambda _: self._flights.pop(key, None))
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.followers}
+
+
+class PerUserLimiter:
+    def __init__(self, max_per_user=None):
+        self.max_per_user = max_per_user or settings.VOICE_MAX_PER_USER
+        self._active = {}
+        self.rejected = 0
+
+    def acquire(self, user_key):
+        if self._active.get(user_key, 0) >= self.max_per_user:
+            self.rejected += 1
+            raise LimitExceeded(429, "Too many voice requests in progress. Please wait for a reply.")
+        self._active[user_key] = self._active.get(user_key, 0) + 1
+
+    def release(self, user_key):
+        remaining = self._active.get(user_key, 0) - 1
+        if remaining > 0:
+            self._active[user_key] = remaining
+        else:
+            self._active.pop(user_key, None)
+
+    @asynccontextmanager
+    async def slot(self, user_key):
+        self.acquire(user_key)
+        try:
+            yield
+        finally:
+            self.release(user_key)
+
+    def stats(self):
+        return {"max_per_user": self.max_per_user, "active_users": len(self._active), "rejected": self.rejected}
+
+
+class UpstreamLimiter:
+    def __init__(self, max_concurrency=None, max_queue=None, queue_timeout=None):
+        self.max_concurrency = max_concurrency or settings.VOICE_UPSTREAM_CONCURRENCY
+        self.max_queue = settings.VOICE_UPSTREAM_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or settings.VOICE_UPSTREAM_QUEUE_TIMEOUT
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting_seen = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait_seconds = 0.0
+
+    @property
+    def semaphore(self):
+        # Created on first use so it belongs to the server's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise LimitExceeded(503, "The voice agent is busy. Please try again shortly.")
+        self.waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise LimitExceeded(503, "The voice agent is busy. Please try again shortly.")
+        finally:
+            self.waiting -= 1
+            self.total_wait_seconds += time.perf_counter() - started
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_length": self.waiting,
+            "max_queue_length_seen": self.max_waiting_seen,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait_seconds / self.admitted * 1000, 2) if self.admitted else 0.0,
+        }
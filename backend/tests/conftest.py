@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# The app opens ./shecare.db when it is imported: keep the tests away from the developer's database
+os.chdir(tempfile.mkdtemp(prefix="shecare-tests-"))
+os.environ.setdefault("SQLITE_SHARDS", "0")
+os.environ.setdefault("WRITE_QUOTA_ENABLED", "false")
+os.environ.setdefault("ADMIN_TOKEN", "test-admin-token")
@@ -0,0 +1,125 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app import accounts, sharding, tasks  # noqa: F401 (tasks registers account.purge)
+from app.app import app
+from app.config import settings
+from app.database import SessionLocal
+from app.job_queue import Worker
+from app.models import JournalEntry, User
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def login(client, email, password="pw123456"):
+    client.post("/auth/signup", json={"email": email, "password": password})
+    token = client.post("/auth/login", json={"email": email, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def add_entries(client, auth, count):
+    for i in range(count):
+        assert client.post("/journal", json={"mood": "calm", "text": f"entry {i}"}, headers=auth).status_code == 200
+    return client.get("/profile", headers=auth).json()["id"]
+
+
+def journal_count(user_id):
+    db = sharding.user_session(user_id)
+    try:
+        return db.query(JournalEntry).filter(JournalEntry.user_id == user_id).count()
+    finally:
+        db.close()
+
+
+def only_the_locked_user_row_is_left(user_id):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).one()
+        return accounts.is_locked(user) and user.email.endswith("@deleted.invalid") and journal_count(user_id) == 0
+    finally:
+        db.close()
+
+
+def test_deletion_locks_out_old_tokens_and_frees_the_email(client):
+    auth = login(client, "delete-me@example.com")
+    user_id = add_entries(client, auth, 2)
+    response = client.delete("/profile", headers=auth)
+    assert response.status_code == 200
+    deletion = response.json()["deletion"]
+    assert deletion["status"] == "completed" and deletion["rows_deleted"] >= 2
+
+    assert client.get("/profile", headers=auth).status_code == 401
+    assert client.post("/journal", json={"mood": "calm", "text": "late"}, headers=auth).status_code == 401
+    assert only_the_locked_user_row_is_left(user_id)
+    # The address can sign up again, as a new account the old tokens don't open
+    assert client.post("/auth/signup", json={"email": "delete-me@example.com", "password": "new-pw123"}).status_code == 200
+    fresh = login(client, "delete-me@example.com", "new-pw123")
+    assert client.get("/profile", headers=fresh).json()["id"] != user_id
+    assert client.get("/profile", headers=auth).status_code == 401
+
+
+def test_big_account_is_locked_at_once_and_purged_by_the_job_worker(client, monkeypatch):
+    monkeypatch.setattr(settings, "ACCOUNT_DELETE_INLINE_ROWS", 2)
+    auth = login(client, "delete-big@example.com")
+    user_id = add_entries(client, auth, 3)
+    response = client.delete("/profile", headers=auth)
+    assert response.status_code == 202
+    status_url = response.json()["status_url"]
+    assert client.get(status_url).json()["status"] == "pending"
+    assert client.get("/profile", headers=auth).status_code == 401
+    assert journal_count(user_id) == 3
+
+    worker = Worker(concurrency=1, visibility_timeout=30, names=["account.purge"])
+    db = SessionLocal()
+    try:
+        job = worker.claim(db)
+        assert json.loads(job.payload)["deletion_id"] == status_url.rsplit("/", 1)[-1]
+        assert worker.run_job(db, job)
+    finally:
+        db.close()
+    status = client.get(status_url).json()
+    assert status["status"] == "completed" and status["finished_at"]
+    assert only_the_locked_user_row_is_left(user_id)
+
+
+def test_purge_runs_again_after_a_failed_chunk(client, monkeypatch):
+    monkeypatch.setattr(settings, "ACCOUNT_DELETE_INLINE_ROWS", 0)
+    auth = login(client, "delete-retry@example.com")
+    user_id = add_entries(client, auth, 3)
+    deletion_id = client.delete("/profile", headers=auth).json()["deletion"]["id"]
+    real_delete_chunked = accounts._delete_chunked
+    failures = []
+
+    def fails_after_one_chunk(db, model, owner, chunk):
+        if model is JournalEntry and not failures:
+            failures.append(model)
+            table = model.__table__
+            ids = [i for (i,) in db.query(model.id).filter(model.user_id == owner).limit(chunk)]
+            db.execute(delete(table).where(table.c.id.in_(ids)))
+            db.commit()
+            raise RuntimeError("disk I/O error")
+        return real_delete_chunked(db, model, owner, chunk)
+
+    monkeypatch.setattr(accounts, "_delete_chunked", fails_after_one_chunk)
+    with pytest.raises(RuntimeError):
+        accounts.purge(deletion_id, chunk=1)
+    status = client.get(f"/account-deletions/{deletion_id}").json()
+    assert status["status"] == "failed"
+    assert journal_count(user_id) == 2
+
+    assert accounts.purge(deletion_id, chunk=1)["deletion_id"] == deletion_id
+    assert client.get(f"/account-deletions/{deletion_id}").json()["status"] == "completed"
+    assert only_the_locked_user_row_is_left(user_id)
+    # Once completed, running it again is a no-op
+    assert accounts.purge(deletion_id) is None
+
+
+def test_unknown_deletion_is_404(client):
+    assert client.get("/account-deletions/not-a-deletion").status_code == 404
@@ -0,0 +1,16 @@
+from fastapi.testclient import TestClient
+
+from app import admission
+from app.app import app
+
+
+def test_shed_response_is_readable_cross_origin(monkeypatch):
+    async def full(priority):
+        raise admission.Shed("queue_full")
+
+    monkeypatch.setattr(admission.admission, "acquire", full)
+    response = TestClient(app).get("/journal", headers={"Origin": "http://localhost:3000"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"]
+    # Without it the browser reports a network error instead of the 503
+    assert response.headers["access-control-allow-origin"] in ("*", "http://localhost:3000")
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, delete, event
+from sqlalchemy.orm import sessionmaker
+
+from app import archive
+from app.models import Base, JournalArchive, JournalEntry
+
+OLD = datetime(2020, 1, 15)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(JournalEntry.__table__.insert(), [
+            {"user_id": 1, "date": OLD + timedelta(days=i), "mood": "calm", "text": f"entry {i}",
+             "analysis": "{}", "deleted": False}
+            for i in range(3)
+        ])
+    return engine
+
+
+def archived_texts(db):
+    texts = {}
+    for block in db.query(JournalArchive):
+        texts.update(archive.decompress(block.codec, block.data))
+    return texts
+
+
+def test_archive_and_load(engine):
+    db = sessionmaker(bind=engine)()
+    assert archive.archive_database(db, datetime(2021, 1, 1)) == 3
+    entries = db.query(JournalEntry).order_by(JournalEntry.id).all()
+    assert [e.text for e in archive.load_texts(db, entries)] == ["entry 0", "entry 1", "entry 2"]
+
+
+def test_entry_deleted_during_archive_run_stays_out_of_the_block(engine):
+    db = sessionmaker(bind=engine)()
+    deleted_id = 2
+
+    def delete_before_update(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE journal_entries") and not fired:
+            fired.append(True)
+            # Another request deletes an entry between the archive's SELECT and UPDATE
+            with engine.begin() as other:
+                other.execute(delete(JournalEntry.__table__).where(JournalEntry.__table__.c.id == deleted_id))
+
+    fired = []
+    event.listen(engine, "before_cursor_execute", delete_before_update)
+    try:
+        assert archive.archive_database(db, datetime(2021, 1, 1)) == 2
+    finally:
+        event.remove(engine, "before_cursor_execute", delete_before_update)
+    assert fired
+    texts = archived_texts(db)
+    assert deleted_id not in texts
+    assert sorted(texts) == [1, 3]
+
+
+def test_forget_removes_text_from_block(engine):
+    db = sessionmaker(bind=engine)()
+    archive.archive_database(db, datetime(2021, 1, 1))
+    entry = db.query(JournalEntry).filter(JournalEntry.id == 2).one()
+    db.delete(entry)
+    db.flush()
+    archive.forget(db, entry)
+    db.commit()
+    assert sorted(archived_texts(db)) == [1, 3]
+
+
+def test_missing_archived_text_reads_as_empty(engine):
+    db = sessionmaker(bind=engine)()
+    db.query(JournalEntry).filter(JournalEntry.id == 1).update({JournalEntry.text: None})
+    db.commit()
+    entry = db.query(JournalEntry).filter(JournalEntry.id == 1).one()
+    assert archive.load_texts(db, [entry])[0].text == ""
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app as app_module
+from app import batch
+from app.app import BatchRequestItem, app
+from app.config import settings
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def login(client, email):
+    client.post("/auth/signup", json={"email": email, "password": "pw123456"})
+    token = client.post("/auth/login", json={"email": email, "password": "pw123456"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def run_batch(client, auth, *requests):
+    return client.post("/batch", json={"requests": list(requests)}, headers=auth)
+
+
+@pytest.mark.parametrize("method, path", [
+    ("POST", "/batch"),
+    ("GET", "/events"),
+    ("POST", "/auth/login"),
+    ("GET", "/admin/profiles"),
+    ("GET", "/metrics"),
+    ("DELETE", "/profile"),
+    ("PATCH", "/profile"),
+    ("GET", "journal"),
+])
+def test_blocked_sub_requests_reject_the_whole_batch(client, method, path):
+    auth = login(client, "batch-blocked@example.com")
+    response = run_batch(client, auth, {"method": "POST", "path": "/journal", "body": {"mood": "calm", "text": "x"}},
+                         {"method": method, "path": path})
+    assert response.status_code == 400
+    # Nothing ran, not even the valid sub-request before it
+    assert client.get("/journal", headers=auth).json() == []
+
+
+def test_batch_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_REQUESTS", 3)
+    auth = login(client, "batch-size@example.com")
+    assert run_batch(client, auth, *[{"path": "/profile"}] * 4).status_code == 400
+    assert run_batch(client, auth, *[{"path": "/profile"}] * 3).status_code == 200
+
+
+def test_reads_see_the_writes_before_them(client):
+    auth = login(client, "batch-order@example.com")
+    responses = run_batch(
+        client, auth,
+        {"id": "a", "method": "POST", "path": "/journal", "body": {"mood": "calm", "text": "first"}},
+        {"id": "after-a", "path": "/journal"},
+        {"id": "b", "method": "POST", "path": "/journal", "body": {"mood": "calm", "text": "second"}},
+        {"id": "after-b", "path": "/journal"},
+        {"id": "bad", "method": "POST", "path": "/journal", "body": {"mood": "calm"}},
+    ).json()["responses"]
+    assert [r["id"] for r in responses] == ["a", "after-a", "b", "after-b", "bad"]
+    assert [e["text"] for e in responses[1]["body"]] == ["first"]
+    assert [e["text"] for e in responses[3]["body"]] == ["first", "second"]
+    assert responses[4]["status"] == 422
+
+
+class RecordingDispatcher:
+    """Stands in for the app: records when each sub-request starts and ends."""
+
+    def __init__(self):
+        self.events = []
+        self.running = 0
+        self.most_running = 0
+
+    async def call(self, parent_scope, item, context):
+        self.events.append(("start", item.id))
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.02)
+        self.running -= 1
+        self.events.append(("end", item.id))
+        return {"status": 500 if item.path == "/fails" else 200, "headers": {}, "body": context.db is not None}
+
+
+class RecordingSession:
+    def __init__(self):
+        self.rollbacks = 0
+        self.refreshes = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def refresh(self, obj):
+        self.refreshes += 1
+
+
+def test_gets_run_concurrently_between_ordered_writes():
+    items = [BatchRequestItem(id=i, method=m, path=p) for i, m, p in [
+        ("g1", "GET", "/journal"), ("g2", "GET", "/journal"),
+        ("w1", "POST", "/journal"),
+        ("g3", "GET", "/journal"), ("g4", "GET", "/journal"),
+        ("w2", "POST", "/fails"),
+        ("g5", "GET", "/journal"),
+    ]]
+    dispatcher, db = RecordingDispatcher(), RecordingSession()
+    results = asyncio.run(batch.run(dispatcher, {}, items, object(), db))
+
+    assert [r["id"] for r in results] == [item.id for item in items]
+    # Only writes get the batch's session
+    assert [r["body"] for r in results] == [False, False, True, False, False, True, False]
+    assert dispatcher.most_running == 2
+    position = {event: n for n, event in enumerate(dispatcher.events)}
+    for n, write in ((2, "w1"), (5, "w2")):
+        before, after = [item.id for item in items[:n]], [item.id for item in items[n + 1:]]
+        assert all(position[("end", i)] < position[("start", write)] for i in before)
+        assert all(position[("end", write)] < position[("start", i)] for i in after)
+    # The failed write is rolled back; the user is reloaded once before each group of GETs after a write
+    assert db.rollbacks == 1 and db.refreshes == 2
+
+
+def test_failed_write_is_rolled_back_and_the_batch_goes_on(client, monkeypatch):
+    auth = login(client, "batch-rollback@example.com")
+    entry_id = client.post("/journal", json={"mood": "calm", "text": "keep me"}, headers=auth).json()["id"]
+
+    def broken_forget(db, entry):
+        raise RuntimeError("archive unavailable")
+
+    monkeypatch.setattr(app_module.archive, "forget", broken_forget)
+    responses = run_batch(
+        client, auth,
+        {"method": "DELETE", "path": f"/journal/{entry_id}"},
+        {"path": "/journal"},
+        {"method": "POST", "path": "/journal", "body": {"mood": "calm", "text": "after the failure"}},
+    ).json()["responses"]
+    assert responses[0]["status"] == 500
+    # The DELETE was flushed but never committed
+    assert [e["text"] for e in responses[1]["body"]] == ["keep me"]
+    assert responses[2]["status"] == 200
+    assert [e["text"] for e in client.get("/journal", headers=auth).json()] == ["keep me", "after the failure"]
+
+
+def test_sub_requests_after_the_account_is_deleted_get_401(client, monkeypatch):
+    # validate() keeps DELETE /profile out of batches; were it let through,
+    # the lockout must still reach the sub-requests after it
+    monkeypatch.setattr(batch, "validate", lambda items: None)
+    auth = login(client, "batch-deleted@example.com")
+    responses = run_batch(
+        client, auth,
+        {"method": "DELETE", "path": "/profile"},
+        {"path": "/profile"},
+        {"method": "POST", "path": "/journal", "body": {"mood": "calm", "text": "too late"}},
+    ).json()["responses"]
+    assert responses[0]["status"] == 200
+    assert [r["status"] for r in responses[1:]] == [401, 401]
+    assert client.get("/profile", headers=auth).status_code == 401
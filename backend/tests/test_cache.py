@@ -0,0 +1,39 @@
+from app.cache import Cache, SQLiteBackend
+
+
+def two_workers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    return (Cache(SQLiteBackend(path), local_ttl=60, poll_interval=0),
+            Cache(SQLiteBackend(path), local_ttl=60, poll_interval=0))
+
+
+def test_invalidate_reaches_other_near_caches(tmp_path):
+    a, b = two_workers(tmp_path)
+    a.set("k", 1)
+    assert b.get("k") == 1  # now in b's near cache
+    a.invalidate("k")
+    assert b.get("k") is None
+
+
+def test_clear_reaches_other_near_caches(tmp_path):
+    a, b = two_workers(tmp_path)
+    a.set("k1", 1)
+    a.set("k2", 2)
+    assert b.get("k1") == 1 and b.get("k2") == 2
+    a.clear()
+    assert b.get("k1") is None
+    assert b.get("k2") is None
+    assert b.near_hits == 0
+
+
+class DownBackend(SQLiteBackend):
+    def clear(self):
+        raise OSError("backend unreachable")
+
+
+def test_clear_survives_a_backend_outage(tmp_path):
+    cache = Cache(DownBackend(str(tmp_path / "cache.db")), local_ttl=60, poll_interval=0)
+    cache.set("k", 1)
+    cache.clear()
+    assert cache.errors == 1
+    assert cache._near.get("k") is None
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import events
+from app.events import EventBroker
+from app.models import Base, JournalEntry
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    # stream() reads the module's broker
+    broker = EventBroker(buffer_size=3)
+    monkeypatch.setattr(events, "broker", broker)
+    return broker
+
+
+def parse(chunk):
+    lines = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+    return lines["event"], json.loads(lines["data"])
+
+
+def test_full_buffer_drops_oldest_and_resends_overview(broker):
+    async def scenario():
+        subscription = broker.subscribe(1, {"n": 0})
+        for n in range(1, 6):
+            broker.publish(1, {"n": n})
+        assert [data for _, data in subscription.buffer] == [{"n": 3}, {"n": 4}, {"n": 5}]
+        assert subscription.dropped == 2
+
+        body = events.stream(subscription, {"n": 0}, heartbeat=5)
+        assert parse(await body.__anext__()) == ("overview", {"n": 0})
+        # Deltas were lost, so the client gets the latest full overview instead of them
+        assert parse(await body.__anext__()) == ("overview", {"n": 5})
+        assert not subscription.buffer
+        await body.aclose()
+        assert broker.stats()["connections"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_idle_stream_gets_heartbeats(broker):
+    async def scenario():
+        subscription = broker.subscribe(1, {})
+        body = events.stream(subscription, {}, heartbeat=0.05)
+        await body.__anext__()  # starting overview
+        assert await asyncio.wait_for(body.__anext__(), timeout=1) == ": heartbeat\n\n"
+        assert await asyncio.wait_for(body.__anext__(), timeout=1) == ": heartbeat\n\n"
+        await body.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_thousands_of_idle_streams(broker):
+    async def scenario():
+        bodies = [events.stream(broker.subscribe(user_id, {}), {}, heartbeat=0.2) for user_id in range(2000)]
+        await asyncio.gather(*(body.__anext__() for body in bodies))
+        assert broker.stats()["connections"] == 2000
+        beats = await asyncio.wait_for(asyncio.gather(*(body.__anext__() for body in bodies)), timeout=10)
+        assert set(beats) == {": heartbeat\n\n"}
+        for body in bodies:
+            await body.aclose()
+        assert broker.stats()["connections"] == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def session_factory(tmp_path, broker):
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    factory.snapshots = []  # users whose overview was recomputed for a publish
+    factory.snapshot_threads = set()
+    factory.hold = threading.Event()  # cleared: snapshots wait until it is set again
+    factory.hold.set()
+
+    def snapshot(user_id):
+        factory.snapshots.append(user_id)
+        factory.snapshot_threads.add(threading.get_ident())
+        factory.hold.wait(5)
+        db = factory()
+        try:
+            return {"entries": db.query(JournalEntry).filter(JournalEntry.user_id == user_id).count()}
+        finally:
+            db.close()
+
+    events.install(factory, snapshot)
+    return factory
+
+
+def write_entry(factory, user_id, commit=True):
+    db = factory()
+    try:
+        db.add(JournalEntry(user_id=user_id, mood="calm", text="entry"))
+        db.flush()
+        if commit:
+            db.commit()
+        else:
+            db.rollback()
+            db.commit()  # nothing left to publish
+    finally:
+        db.close()
+
+
+async def settle(broker):
+    # Publishes from worker threads reach the loop through call_soon_threadsafe,
+    # then the overview is recomputed in the threadpool
+    for _ in range(200):
+        await asyncio.sleep(0.01)
+        if not broker.stats()["refreshing"]:
+            return
+
+
+def test_commit_publishes_to_the_owning_user_only(broker, session_factory):
+    async def scenario():
+        mine = broker.subscribe(1, {"entries": 0})
+        other = broker.subscribe(2, {"entries": 0})
+        await asyncio.to_thread(write_entry, session_factory, 1)
+        await settle(broker)
+        assert list(mine.buffer) == [("delta", {"entries": 1})]
+        assert not other.buffer
+        assert session_factory.snapshots == [1]
+
+    asyncio.run(scenario())
+
+
+def test_rollback_publishes_nothing(broker, session_factory):
+    async def scenario():
+        mine = broker.subscribe(1, {"entries": 0})
+        await asyncio.to_thread(write_entry, session_factory, 1, False)
+        await settle(broker)
+        assert not mine.buffer
+        assert session_factory.snapshots == []
+
+    asyncio.run(scenario())
+
+
+def test_commit_does_not_wait_for_the_overview(broker, session_factory):
+    async def scenario():
+        mine = broker.subscribe(1, {"entries": 0})
+        write_entry(session_factory, 1)  # commits on the loop thread itself
+        assert session_factory.snapshots == []
+        await settle(broker)
+        assert list(mine.buffer) == [("delta", {"entries": 1})]
+        assert threading.get_ident() not in session_factory.snapshot_threads
+
+    asyncio.run(scenario())
+
+
+def test_commits_during_a_refresh_are_coalesced(broker, session_factory):
+    async def scenario():
+        mine = broker.subscribe(1, {"entries": 0})
+        session_factory.hold.clear()
+        await asyncio.to_thread(write_entry, session_factory, 1)
+        while not session_factory.snapshots:
+            await asyncio.sleep(0.01)
+        # The first refresh is still running: these only ask for one more
+        for _ in range(5):
+            await asyncio.to_thread(write_entry, session_factory, 1)
+        session_factory.hold.set()
+        await settle(broker)
+        assert session_factory.snapshots == [1, 1]
+        assert list(mine.buffer)[-1] == ("delta", {"entries": 6})
+
+    asyncio.run(scenario())
+
+
+def test_query_string_takes_only_short_lived_stream_tokens():
+    from datetime import timedelta
+
+    from fastapi import HTTPException
+    from fastapi.testclient import TestClient
+
+    from app import app as app_module
+
+    with TestClient(app_module.app) as client:
+        client.post("/auth/signup", json={"email": "stream@example.com", "password": "pw123456"})
+        access = client.post("/auth/login", json={"email": "stream@example.com", "password": "pw123456"}).json()["access_token"]
+        issued = client.post("/events/token", headers={"Authorization": f"Bearer {access}"}).json()
+        assert issued["expires_in"] == app_module.settings.EVENTS_TOKEN_TTL
+
+        # The access token must not travel in URLs
+        assert client.get("/events", params={"token": access}).status_code == 401
+        # and the stream token opens nothing but the stream
+        assert client.get("/profile", headers={"Authorization": f"Bearer {issued['token']}"}).status_code == 401
+        assert client.post("/events/token", headers={"Authorization": f"Bearer {issued['token']}"}).status_code == 401
+
+    user_id = app_module.stream_user_id(issued["token"], stream_token=True)
+    assert app_module.stream_user_id(access, stream_token=False) == user_id
+    expired = app_module.create_access_token({"user_id": user_id, "scope": "events"}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(HTTPException):
+        app_module.stream_user_id(expired, stream_token=True)
@@ -0,0 +1,116 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import job_queue
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.job_queue import Worker, backoff_delay, enqueue, enqueue_and_commit, task
+from app.models import Base, Job, User
+
+
+@task("test.ok")
+def ok(payload, db):
+    return {"echo": payload.get("value")}
+
+
+@task("test.fail")
+def fail(payload, db):
+    raise RuntimeError("boom")
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.query(Job).delete()
+    db.commit()
+    yield db
+    db.close()
+
+
+def worker(worker_id="w1", **options):
+    w = Worker(concurrency=1, visibility_timeout=30, names=["test.ok", "test.fail"], **options)
+    w.worker_id = worker_id
+    return w
+
+
+def test_dedupe_key_reuses_the_active_job(db):
+    first = enqueue_and_commit(db, "test.ok", dedupe_key="k")
+    assert enqueue_and_commit(db, "test.ok", dedupe_key="k").id == first.id
+    w = worker()
+    assert w.run_job(db, w.claim(db))
+    # Finished jobs release the key
+    assert enqueue_and_commit(db, "test.ok", dedupe_key="k").id != first.id
+
+
+def test_racing_enqueue_returns_the_winners_job(db, monkeypatch):
+    winner = enqueue_and_commit(db, "test.ok", dedupe_key="k")
+    other = SessionLocal()
+    checks = []
+    real_active_job = job_queue._active_job
+
+    def checked_before_the_winner_committed(session, key):
+        checks.append(key)
+        return None if len(checks) == 1 else real_active_job(session, key)
+
+    monkeypatch.setattr(job_queue, "_active_job", checked_before_the_winner_committed)
+    try:
+        assert enqueue_and_commit(other, "test.ok", dedupe_key="k").id == winner.id
+    finally:
+        other.close()
+    assert db.query(Job).count() == 1
+
+
+def test_job_is_rolled_back_with_the_callers_transaction(db):
+    # Nothing else has been written in the transaction before the job
+    enqueue(db, "test.ok", dedupe_key="k")
+    db.add(User(email="job-owner@example.com", hashed_password="x"))
+    db.rollback()
+    assert db.query(Job).count() == 0
+
+
+def test_expired_lock_is_claimed_again_and_the_late_result_discarded(db):
+    enqueue_and_commit(db, "test.ok", {"value": 1})
+    first, second = worker("w1"), worker("w2")
+    other = SessionLocal()  # the second worker's own session
+    try:
+        job = first.claim(db)
+        assert second.claim(other) is None
+        other.query(Job).update({Job.locked_until: datetime.utcnow() - timedelta(seconds=1)})
+        other.commit()
+        reclaimed = second.claim(other)
+        assert reclaimed.id == job.id and reclaimed.attempts == 2
+        assert not first.run_job(db, job)  # lost the lock
+        assert db.query(Job).one().status == "running"
+        assert second.run_job(other, reclaimed)
+    finally:
+        other.close()
+    db.expire_all()
+    finished = db.query(Job).one()
+    assert finished.status == "succeeded" and json.loads(finished.result) == {"echo": 1}
+
+
+def test_failed_job_backs_off_then_fails_for_good(db):
+    enqueue_and_commit(db, "test.fail", dedupe_key="k", max_attempts=2)
+    w = worker()
+    before = datetime.utcnow()
+    assert not w.run_job(db, w.claim(db))
+    job = db.query(Job).one()
+    assert job.status == "queued" and job.attempts == 1 and "boom" in job.last_error
+    assert before <= job.run_at <= datetime.utcnow() + timedelta(seconds=settings.JOB_BACKOFF_BASE)
+    db.query(Job).update({Job.run_at: datetime.utcnow()})
+    db.commit()
+    assert not w.run_job(db, w.claim(db))
+    job = db.query(Job).one()
+    assert job.status == "failed" and job.attempts == 2 and job.dedupe_key is None
+
+
+def test_backoff_is_exponential_with_full_jitter():
+    random.seed(1)
+    for attempts, ceiling in [(1, 1), (2, 2), (3, 4), (4, 8), (10, 30)]:
+        delays = [backoff_delay(attempts, base=1, maximum=30) for _ in range(200)]
+        assert 0 <= min(delays) and max(delays) <= ceiling
+        assert max(delays) > ceiling / 2
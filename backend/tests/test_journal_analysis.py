@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from app import journal_analysis
+from app.database import SessionLocal, ShardSessions, engine, shard_engines
+from app.journal_analysis import JournalAnalysisPipeline, analyze_text, backfill
+from app.models import Base, JournalEntry
+
+
+def test_analysis_reads_negation_and_symptoms():
+    happy = analyze_text("Feeling really happy and calm today", mood="happy")
+    assert happy["sentiment"]["label"] == "positive"
+    low = analyze_text("Not happy at all, awful cramps and a headache", mood="sad")
+    assert low["sentiment"]["label"] == "negative"
+    assert low["symptoms"] == ["cramps", "headache"]
+
+
+@pytest.fixture
+def databases():
+    """(shard, session factory) of every database holding journal entries, emptied."""
+    databases = list(enumerate(ShardSessions)) if ShardSessions else [(None, SessionLocal)]
+    for db_engine in [engine, *shard_engines]:
+        Base.metadata.create_all(bind=db_engine)
+
+    def empty():
+        for _, session_factory in databases:
+            db = session_factory()
+            db.query(JournalEntry).delete()
+            db.commit()
+            db.close()
+
+    empty()
+    yield databases
+    empty()
+
+
+def add_entries(session_factory, texts, **values):
+    db = session_factory()
+    try:
+        entries = [JournalEntry(user_id=1, mood="calm", text=text, **values) for text in texts]
+        db.add_all(entries)
+        db.commit()
+        return [entry.id for entry in entries]
+    finally:
+        db.close()
+
+
+def analyses(session_factory):
+    db = session_factory()
+    try:
+        return {entry.id: entry.analysis for entry in db.query(JournalEntry)}
+    finally:
+        db.close()
+
+
+def test_pipeline_analyses_submitted_entries_in_batches(databases):
+    shard, session_factory = databases[0]
+    entry_ids = add_entries(session_factory, [f"good day {i}" for i in range(5)])
+    pipeline = JournalAnalysisPipeline(workers=2, batch_size=2, batch_wait=0.01)
+    for entry_id in entry_ids:
+        pipeline.submit(entry_id, shard)
+    pipeline.join()
+    assert all(analyses(session_factory).values())
+    stats = pipeline.stats()
+    assert stats["processed"] == 5 and stats["errors"] == 0 and stats["batches"] >= 3
+
+
+def test_startup_requeues_entries_a_previous_run_lost(databases):
+    # Queued in a run that stopped before analysing them
+    pending = {shard: add_entries(session_factory, ["lost in the restart"]) for shard, session_factory in databases}
+    done = add_entries(databases[0][1], ["already done"], analysis="{}")
+    archived = add_entries(databases[0][1], [None])
+    pipeline = JournalAnalysisPipeline(workers=1, batch_wait=0)
+    assert pipeline.requeue_pending() == len(databases)
+    pipeline.join()
+    for shard, session_factory in databases:
+        stored = analyses(session_factory)
+        assert json.loads(stored[pending[shard][0]])["version"] == journal_analysis.ANALYSIS_VERSION
+    stored = analyses(databases[0][1])
+    assert stored[done[0]] == "{}" and stored[archived[0]] is None
+
+
+def test_requeue_only_checks_the_newest_entries(databases):
+    _, session_factory = databases[0]
+    old, new = add_entries(session_factory, ["old", "new"])
+    pipeline = JournalAnalysisPipeline(workers=1, batch_wait=0)
+    assert pipeline.requeue_pending(window=1) == 1
+    pipeline.join()
+    stored = analyses(session_factory)
+    assert stored[new] and stored[old] is None
+
+
+def test_backfill_skips_analysed_and_archived_entries_unless_forced(databases):
+    _, session_factory = databases[0]
+    fresh = add_entries(session_factory, ["one", "two", "three"])
+    done = add_entries(session_factory, ["done"], analysis="{}")
+    add_entries(session_factory, [None])
+    assert backfill(batch_size=2)["processed"] == 3
+    stored = analyses(session_factory)
+    assert all(stored[i] for i in fresh) and stored[done[0]] == "{}"
+    assert backfill(batch_size=2)["processed"] == 0
+    assert backfill(batch_size=2, force=True)["processed"] == 4
+    assert analyses(session_factory)[done[0]] != "{}"
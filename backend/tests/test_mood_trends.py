@@ -0,0 +1,154 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app import mood_trends
+from app.models import Base, JournalEntry, MoodRollup, MoodStreak
+
+DAY = date(2024, 3, 1)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'moods.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    mood_trends.install(factory)
+    db = factory()
+    yield db
+    db.close()
+    engine.dispose()
+
+
+def add(db, day, mood="happy", user_id=1):
+    entry = JournalEntry(user_id=user_id, date=datetime.combine(day, datetime.min.time()) + timedelta(hours=9),
+                         mood=mood, text="entry")
+    db.add(entry)
+    db.commit()
+    return entry
+
+
+def rollups(db, user_id=1):
+    return {(r.granularity, r.period, r.mood): r.count for r in db.query(MoodRollup).filter(MoodRollup.user_id == user_id)}
+
+
+def streak(db, user_id=1):
+    row = db.execute(select(MoodStreak.__table__).where(MoodStreak.user_id == user_id)).first()
+    return None if row is None else ((row.current_start, row.current_end), (row.longest_start, row.longest_end))
+
+
+def days(first, last):
+    return (DAY + timedelta(days=first), DAY + timedelta(days=last))
+
+
+def test_next_day_extends_and_a_gap_starts_a_new_run(db):
+    for offset in (0, 1, 2):
+        add(db, DAY + timedelta(days=offset))
+    assert streak(db) == (days(0, 2), days(0, 2))
+    add(db, DAY + timedelta(days=5))
+    assert streak(db) == (days(5, 5), days(0, 2))
+    add(db, DAY + timedelta(days=5), mood="sad")  # a second entry on a counted day
+    assert streak(db) == (days(5, 5), days(0, 2))
+
+
+def test_back_dated_entry_joins_the_runs_it_touches(db):
+    for offset in (0, 1, 3, 4, 5):
+        add(db, DAY + timedelta(days=offset))
+    assert streak(db) == (days(3, 5), days(3, 5))
+    add(db, DAY + timedelta(days=2))
+    assert streak(db) == (days(0, 5), days(0, 5))
+    add(db, DAY - timedelta(days=1))
+    assert streak(db) == (days(-1, 5), days(-1, 5))
+
+
+def test_deleting_a_day_inside_the_current_run_splits_it(db):
+    entries = [add(db, DAY + timedelta(days=offset)) for offset in range(6)]
+    db.delete(entries[2])
+    db.commit()
+    assert streak(db) == (days(3, 5), days(3, 5))
+    db.delete(entries[4])
+    db.commit()
+    assert streak(db) == (days(5, 5), days(0, 1))
+    assert ("day", (DAY + timedelta(days=4)).isoformat(), "happy") not in rollups(db)
+
+
+def test_deleting_the_last_entry_clears_the_streak(db):
+    entry = add(db, DAY)
+    db.delete(entry)
+    db.commit()
+    assert streak(db) is None and rollups(db) == {}
+
+
+def test_mood_edit_on_a_dirty_entry_moves_the_counts(db):
+    entry = add(db, DAY, mood="Happy")
+    entry.text = "edited"
+    entry.mood = "sad"
+    entry.mood = "angry"  # only the flushed value counts
+    db.commit()
+    counts = rollups(db)
+    assert counts[("day", DAY.isoformat(), "angry")] == 1
+    assert counts[("month", "2024-03", "angry")] == 1
+    assert not any(mood in ("happy", "sad") for _, _, mood in counts)
+    # Only the text changes: nothing to count
+    entry.text = "edited again"
+    entry.mood = "ANGRY "
+    db.commit()
+    assert rollups(db) == counts
+    assert streak(db) == (days(0, 0), days(0, 0))
+
+
+def test_moving_an_entry_to_another_day_updates_both(db):
+    entry = add(db, DAY)
+    add(db, DAY + timedelta(days=1))
+    entry.date = datetime.combine(DAY + timedelta(days=3), datetime.min.time())
+    db.commit()
+    counts = rollups(db)
+    assert ("day", DAY.isoformat(), "happy") not in counts
+    assert counts[("day", (DAY + timedelta(days=3)).isoformat(), "happy")] == 1
+    assert streak(db) == (days(3, 3), days(1, 1))
+
+
+@pytest.mark.parametrize("day, week", [
+    (date(2020, 12, 31), "2020-W53"),
+    (date(2021, 1, 3), "2020-W53"),
+    (date(2021, 1, 4), "2021-W01"),
+    (date(2018, 12, 31), "2019-W01"),
+])
+def test_weeks_are_iso_weeks_across_new_year(day, week):
+    assert mood_trends.period_of("week", day) == week
+
+
+def test_weekly_trend_across_new_year(db):
+    for day in (date(2020, 12, 28), date(2021, 1, 3), date(2021, 1, 4)):
+        add(db, day)
+    assert mood_trends.periods_ending("week", date(2021, 1, 5), 3) == ["2020-W52", "2020-W53", "2021-W01"]
+    result = mood_trends.trends(db, 1, "week", 3, today=date(2021, 1, 5))
+    assert [(p["period"], p["total"]) for p in result["periods"]] == [("2020-W52", 0), ("2020-W53", 2), ("2021-W01", 1)]
+    assert result["streaks"] == {"current_days": 2, "longest_days": 2, "last_entry_day": date(2021, 1, 4)}
+
+
+def test_incremental_updates_match_a_rebuild(db):
+    rng = random.Random(7)
+    entries = []
+    for step in range(300):
+        action = rng.random()
+        if action < 0.55 or not entries:
+            entries.append(add(db, DAY + timedelta(days=rng.randrange(40)), rng.choice(["happy", "sad", "Calm"]),
+                               user_id=rng.choice([1, 2])))
+        elif action < 0.85:
+            db.delete(entries.pop(rng.randrange(len(entries))))
+            db.commit()
+        else:
+            entry = rng.choice(entries)
+            if rng.random() < 0.5:
+                entry.mood = rng.choice(["happy", "sad", "calm"])
+            else:
+                entry.date = datetime.combine(DAY + timedelta(days=rng.randrange(40)), datetime.min.time())
+            db.commit()
+        if step % 50 == 49:
+            incremental = {user_id: (rollups(db, user_id), streak(db, user_id)) for user_id in (1, 2)}
+            assert mood_trends.rebuild_database(db) == 2
+            assert {user_id: (rollups(db, user_id), streak(db, user_id)) for user_id in (1, 2)} == incremental
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import profiler
+from app.profiler import ProfilerMiddleware, ProfileStore
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def unrelated_work(stop):
+    # Another thread of the same process, e.g. a background worker or another request
+    while not stop.is_set():
+        busy(0.001)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "store", ProfileStore(str(tmp_path), max_files=10))
+    app = FastAPI()
+    app.add_middleware(ProfilerMiddleware, sample_rate=1.0, interval_ms=2)
+
+    @app.get("/sync")
+    def sync_endpoint():
+        busy(0.2)
+        return {}
+
+    @app.get("/async")
+    async def async_endpoint():
+        async def child():
+            busy(0.1)
+        await asyncio.create_task(child())
+        busy(0.1)
+        return {}
+
+    stop = threading.Event()
+    other = threading.Thread(target=unrelated_work, args=(stop,), daemon=True)
+    other.start()
+    with TestClient(app) as client:
+        yield client
+    stop.set()
+    other.join()
+
+
+def profile_of(response):
+    return profiler.store.load(response.headers["x-profile-id"])
+
+
+@pytest.mark.parametrize("path, frame", [("/sync", "sync_endpoint"), ("/async", "child")])
+def test_only_the_requests_threads_are_sampled(client, path, frame):
+    profile = profile_of(client.get(path))
+    stacks = profile["stacks"]
+    assert profile["samples"] > 10
+    assert any(frame in stack for stack in stacks)
+    assert not any("unrelated_work" in stack for stack in stacks)
+    # Most samples are the request doing its work, not the loop waiting
+    working = sum(count for stack, count in stacks.items() if stack.split(";")[-1].startswith("busy "))
+    assert working / profile["samples"] > 0.8
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.cache import get_cache
+from app.query_counter import query_budget
+
+# Statements per request, including the token's user lookup. The cache is
+# emptied before each request, so the global recommendations query counts too.
+# Lower a budget when an endpoint gets cheaper; raising one needs a reason.
+BUDGETS = {
+    "/dashboard": 4,
+    "/journal": 2,
+    "/recommendations": 5,
+    "/me/overview": 3,
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def make_user(client, email, entries):
+    client.post("/auth/signup", json={"email": email, "password": "pw123456"})
+    token = client.post("/auth/login", json={"email": email, "password": "pw123456"}).json()["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+    now = datetime.utcnow()
+    for i in range(entries):
+        day = now - timedelta(days=i)
+        writes = [
+            client.post("/journal", json={"date": day.isoformat(), "mood": "calm", "text": "entry"}, headers=auth),
+            client.post("/cycle-tracker", json={"start_date": day.date().isoformat()}, headers=auth),
+            client.post("/pcos-checker", json={"age": 25, "weight": 60}, headers=auth),
+        ]
+        assert [response.status_code for response in writes] == [200, 200, 200]
+    return auth
+
+
+@pytest.fixture(scope="module")
+def users(client):
+    # The same budget must hold however much history a user has (no N+1)
+    return {entries: make_user(client, f"budget-{entries}@example.com", entries) for entries in (1, 10)}
+
+
+@pytest.mark.parametrize("entries", [1, 10])
+@pytest.mark.parametrize("path", sorted(BUDGETS))
+def test_endpoint_query_budget(client, users, path, entries):
+    get_cache().clear()
+    with query_budget(max_queries=BUDGETS[path]) as seen:
+        response = client.get(path, headers=users[entries])
+    assert response.status_code == 200
+    assert [stats.count for _, stats in seen] == [BUDGETS[path]]
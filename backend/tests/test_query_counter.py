@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app import query_counter
+from app.query_counter import QueryStats
+
+
+def test_failed_statement_is_counted_and_leaves_no_state_on_the_connection():
+    engine = create_engine("sqlite://")
+    query_counter.install(engine)
+    stats = QueryStats()
+    token = query_counter._current.set(stats)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            assert conn.info["query_started"] == []
+            conn.execute(text("SELECT 1"))
+            assert conn.info["query_started"] == []
+    finally:
+        query_counter._current.reset(token)
+    assert stats.count == 2
+    assert stats.shapes == {"SELECT * FROM missing_table": 1, "SELECT 1": 1}
@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app as app_module
+from app.app import app
+from app.quotas import WriteQuotas
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_burst_then_refill(clock):
+    quotas = WriteQuotas({"journal": (3, 6)}, max_buckets=10, clock=clock)
+    assert [quotas.take(1, "journal").allowed for _ in range(4)] == [True, True, True, False]
+    # 6 per minute is one token every 10 seconds
+    clock.now = 9
+    assert not quotas.take(1, "journal").allowed
+    clock.now = 10
+    assert quotas.take(1, "journal").allowed
+    clock.now = 1000
+    assert quotas.take(1, "journal").remaining == 2  # refills up to the burst, not beyond
+    assert quotas.stats()["throttled"] == {"journal": 2}
+
+
+def test_users_have_separate_buckets(clock):
+    quotas = WriteQuotas({"journal": (1, 1)}, max_buckets=10, clock=clock)
+    assert quotas.take(1, "journal").allowed
+    assert quotas.take(2, "journal").allowed
+    assert not quotas.take(1, "journal").allowed
+
+
+def test_least_recently_used_bucket_is_evicted(clock):
+    quotas = WriteQuotas({"journal": (1, 1)}, max_buckets=2, clock=clock)
+    quotas.take(1, "journal")
+    quotas.take(2, "journal")
+    quotas.take(1, "journal")  # user 2 is now the least recently used
+    quotas.take(3, "journal")
+    assert quotas.stats()["buckets"] == 2 and quotas.evicted == 1
+    assert not quotas.take(1, "journal").allowed  # kept, still empty
+    assert quotas.take(2, "journal").allowed  # forgotten, so full again
+
+
+@pytest.mark.parametrize("limit", [(0, 20), (10, 0)])
+def test_zero_limits_are_rejected(limit):
+    with pytest.raises(ValueError, match="journal"):
+        WriteQuotas({"journal": limit}, max_buckets=10)
+
+
+def test_throttled_write_gets_429_with_retry_after(monkeypatch, clock):
+    monkeypatch.setattr(app_module.settings, "WRITE_QUOTA_ENABLED", True)
+    monkeypatch.setattr(app_module, "write_quotas", WriteQuotas({"journal": (2, 12)}, max_buckets=10, clock=clock))
+    with TestClient(app) as client:
+        client.post("/auth/signup", json={"email": "quota@example.com", "password": "pw123456"})
+        token = client.post("/auth/login", json={"email": "quota@example.com", "password": "pw123456"}).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+        write = lambda: client.post("/journal", json={"mood": "calm", "text": "entry"}, headers=auth)
+
+        first = write()
+        assert first.status_code == 200
+        assert first.headers["x-ratelimit-limit"] == "2"
+        assert first.headers["x-ratelimit-remaining"] == "1"
+        assert first.headers["x-ratelimit-reset"] == "5"  # one token at 12 per minute
+        assert write().status_code == 200
+
+        throttled = write()
+        assert throttled.status_code == 429
+        assert throttled.headers["retry-after"] == "5"
+        assert throttled.headers["x-ratelimit-remaining"] == "0"
+        assert throttled.headers["x-ratelimit-reset"] == "10"
+
+        clock.now = 5
+        assert write().status_code == 200
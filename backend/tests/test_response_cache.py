@@ -0,0 +1,64 @@
+from app.cache import Cache, SQLiteBackend
+from app.response_cache import ResponseCache
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = ResponseCache(similarity=0)
+    cache.set("What is PCOS?", "A")
+    assert cache.get("what is pcos") == "A"
+
+
+def test_fuzzy_hit_for_paraphrase_with_a_new_word():
+    cache = ResponseCache(similarity=0.5)
+    cache.set("pcos symptoms list", "A")
+    # "explained" has never been cached: the lookup must not depend on it
+    assert cache.get("pcos symptoms list explained") == "A"
+    assert cache.fuzzy_hits == 1
+
+
+def test_fuzzy_lookup_picks_the_closest_entry():
+    cache = ResponseCache(similarity=0.5)
+    cache.set("pcos symptoms", "symptoms")
+    cache.set("pcos symptoms treatment options", "treatment")
+    assert cache.get("pcos symptoms treatment") == "treatment"
+
+
+def test_fuzzy_miss_below_threshold():
+    cache = ResponseCache(similarity=0.8)
+    cache.set("pcos symptoms list", "A")
+    assert cache.get("pcos diet plan ideas") is None
+
+
+def test_fuzzy_lookup_stays_in_namespace():
+    cache = ResponseCache(similarity=0.5)
+    cache.set("pcos symptoms list", "A", namespace="agent-1")
+    assert cache.get("pcos symptoms list explained", namespace="agent-2") is None
+
+
+def two_workers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    caches = [Cache(SQLiteBackend(path), local_ttl=60, poll_interval=0) for _ in range(2)]
+    return [ResponseCache(similarity=0.5, shared=lambda cache=cache: cache) for cache in caches]
+
+
+def test_exact_replies_are_shared_between_workers(tmp_path):
+    a, b = two_workers(tmp_path)
+    a.set("What is PCOS?", "A")
+    assert b.get("what is pcos") == "A"
+    assert b.shared_hits == 1
+    # The fuzzy index is per worker: b has never seen the message itself
+    assert b.get("pcos explained") is None
+    assert a.get("pcos explained") == "A"
+
+
+def test_clear_reaches_every_worker(tmp_path):
+    a, b = two_workers(tmp_path)
+    a.set("what is pcos", "A")
+    b.set("pcos symptoms list", "B")
+    assert b.get("what is pcos") == "A"  # now in b's near cache as well
+    a.clear()
+    assert a.get("what is pcos") is None
+    assert b.get("what is pcos") is None
+    assert b.get("pcos symptoms list explained") is None  # b's fuzzy index was dropped too
+    b.set("what is pcos", "new")
+    assert a.get("what is pcos") == "new"
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app import archive, sharding, sync
+from app.database import shard_hash
+from app.models import Base, JournalArchive, JournalEntry, UserShard
+
+OLD = datetime(2020, 1, 15)
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    """Session factories of three scratch shards, with a scratch main database and directory."""
+    main = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    engines = [create_engine(f"sqlite:///{tmp_path / f'shard-{i}.db'}") for i in range(3)]
+    factories = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in engines]
+    Base.metadata.create_all(bind=main)
+    monkeypatch.setattr(sharding, "engine", main)
+    monkeypatch.setattr(sharding, "SessionLocal", sessionmaker(bind=main))
+    monkeypatch.setattr(sharding, "SHARD_COUNT", len(engines))
+    monkeypatch.setattr(sharding, "shard_engines", engines)
+    monkeypatch.setattr(sharding, "ShardSessions", factories)
+    monkeypatch.setattr(sharding, "directory", sharding.Directory())
+    sharding.create_tables()
+    yield factories
+    for db_engine in [main, *engines]:
+        db_engine.dispose()
+
+
+def add_entries(shard, user_id, count, **values):
+    """Entries of ``user_id`` written straight into ``shard``, placed there in the directory."""
+    with sharding.shard_engines[shard].begin() as conn:
+        conn.execute(insert(JournalEntry), [
+            {"user_id": user_id, "date": OLD + timedelta(days=i), "mood": "calm", "text": f"user {user_id} entry {i}",
+             "deleted": False, **values}
+            for i in range(count)
+        ])
+    with sharding.engine.begin() as conn:
+        if conn.execute(select(UserShard.user_id).where(UserShard.user_id == user_id)).first() is None:
+            conn.execute(insert(UserShard), {"user_id": user_id, "shard": shard, "generation": 0})
+
+
+def texts_of(shard, user_id):
+    db = sharding.shard_session(shard)
+    try:
+        entries = db.query(JournalEntry).filter(JournalEntry.user_id == user_id).order_by(JournalEntry.date).all()
+        return [entry.text for entry in archive.load_texts(db, entries)]
+    finally:
+        db.close()
+
+
+def test_directory_places_new_users_on_their_home_shard_and_caches(shards):
+    directory = sharding.directory
+    assert directory.lookup(42) == (shard_hash(42, 3), 0)
+    assert directory.lookup(42) == (shard_hash(42, 3), 0)
+    assert directory.stats()["misses"] == 1 and directory.stats()["hits"] == 1
+    with sharding.engine.connect() as conn:
+        assert conn.execute(select(UserShard.shard).where(UserShard.user_id == 42)).scalar() == shard_hash(42, 3)
+
+
+def test_move_keeps_texts_and_archive_blocks_readable(shards):
+    add_entries(0, 1, 3, analysis="{}")
+    add_entries(0, 1, 1, date=datetime(2030, 1, 1), analysis="{}")  # recent, not archived
+    add_entries(1, 2, 2)  # the target's ids 1 and 2 are taken
+    db = sharding.shard_session(0)
+    assert archive.archive_database(db, datetime(2021, 1, 1)) == 3
+    db.close()
+    before = texts_of(0, 1)
+
+    assert sharding.move_user(1, 0, 1) == 4
+    assert texts_of(1, 1) == before
+    assert texts_of(1, 2) == ["user 2 entry 0", "user 2 entry 1"]
+    assert texts_of(0, 1) == []
+    db = sharding.shard_session(1)
+    try:
+        # The block is keyed by the entries' new ids
+        block = archive.decompress(*db.query(JournalArchive.codec, JournalArchive.data).one())
+        archived = {i for (i,) in db.query(JournalEntry.id).filter(JournalEntry.user_id == 1, JournalEntry.text.is_(None))}
+        assert set(block) == archived and not archived & {1, 2}
+    finally:
+        db.close()
+
+
+def test_move_bumps_the_generation_so_old_sync_tokens_are_refused(shards):
+    add_entries(0, 1, 2)
+    old_token = sync.encode_token(5, sharding.directory.generation_of(1))
+    sharding.move_user(1, 0, 2)
+    assert sharding.directory.lookup(1) == (2, 1)
+    with pytest.raises(sync.InvalidToken):
+        sync.decode_token(old_token, sharding.directory.generation_of(1))
+    # Moving back is another generation
+    sharding.move_user(1, 2, 0)
+    assert sharding.directory.lookup(1) == (0, 2)
+
+
+def test_interrupted_move_runs_again_without_duplicates(shards):
+    add_entries(0, 1, 3)
+    sharding.move_user(1, 0, 1)
+    # As if the first run died before deleting from the source
+    add_entries(0, 1, 3)
+    sharding.move_user(1, 0, 1)
+    assert len(texts_of(1, 1)) == 3 and texts_of(0, 1) == []
+
+
+def test_rebalance_dry_run_plans_what_the_run_does(shards):
+    for shard, user_id, count in [(0, 1, 10), (0, 2, 6), (0, 3, 4), (1, 4, 2)]:
+        add_entries(shard, user_id, count)
+
+    planned = sharding.rebalance(tolerance=0.5, dry_run=True)
+    assert planned["moves"] and sum(planned["entries_per_shard_after"]) == 22
+    # A dry run moves nothing
+    assert sharding.plan_rebalance(tolerance=0.5) == (planned["moves"], planned["entries_per_shard_after"])
+
+    done = sharding.rebalance(tolerance=0.5)
+    assert done["moves"] == planned["moves"]
+    loads = [sum(rows.values()) for rows in sharding.fan_out(sharding.user_rows)]
+    assert loads == planned["entries_per_shard_after"]
+    assert max(loads) - min(loads) < 20
+    # and the plan converged: nothing left to move
+    assert sharding.plan_rebalance(tolerance=0.5)[0] == []
+    for move in done["moves"]:
+        assert sharding.directory.shard_of(move["user_id"]) == move["to"]
+
+
+def test_remap_rekeys_a_block():
+    codec, data, _ = archive.compress({1: "one", 2: "two"}, "zlib")
+    codec, data, _ = archive.remap(codec, data, {1: 7, 2: 8})
+    assert archive.decompress(codec, data) == {7: "one", 8: "two"}
@@ -0,0 +1,151 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import sync
+from app.app import app
+from app.database import SessionLocal, ShardSessions
+from app.models import Base, ChangeLog, JournalEntry, User
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def login(client, email):
+    client.post("/auth/signup", json={"email": email, "password": "pw123456"})
+    token = client.post("/auth/login", json={"email": email, "password": "pw123456"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def add_entry(client, auth, text):
+    response = client.post("/journal", json={"mood": "calm", "text": text}, headers=auth)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def each_database(fn):
+    # The change log lives on the shards when sharding is on
+    results = []
+    for session_factory in ShardSessions or [SessionLocal]:
+        db = session_factory()
+        try:
+            results.append(fn(db))
+            db.commit()
+        finally:
+            db.close()
+    return results
+
+
+def age_log(days):
+    each_database(lambda db: db.query(ChangeLog).update({ChangeLog.created_at: datetime.utcnow() - timedelta(days=days)}))
+
+
+def prune_log(days):
+    return sum(each_database(lambda db: sync.prune(db.connection(), older_than_days=days)))
+
+
+def log_ids():
+    return each_database(lambda db: [i for (i,) in db.query(ChangeLog.id).order_by(ChangeLog.id)])
+
+
+def test_incremental_sync(client):
+    auth = login(client, "sync-incremental@example.com")
+    add_entry(client, auth, "first")
+    full = client.get("/sync", headers=auth).json()
+    assert not full["reset"] and len(full["journal"]["upserted"]) == 1
+    second = add_entry(client, auth, "second")
+    changed = client.get("/sync", params={"since": full["token"]}, headers=auth).json()
+    assert not changed["reset"]
+    assert [e["id"] for e in changed["journal"]["upserted"]] == [second]
+
+
+def test_prune_keeps_recent_rows_and_the_newest(client):
+    auth = login(client, "sync-prune@example.com")
+    for i in range(3):
+        add_entry(client, auth, f"entry {i}")
+    assert prune_log(30) == 0
+    age_log(60)
+    newest = [ids[-1:] for ids in log_ids()]
+    assert prune_log(30) > 0
+    # The newest row stays so that sequence numbers are never reused
+    assert log_ids() == newest
+
+
+def test_expired_token_gets_full_state_with_reset(client):
+    auth = login(client, "sync-expired@example.com")
+    add_entry(client, auth, "old")
+    stale = client.get("/sync", headers=auth).json()["token"]
+    add_entry(client, auth, "missed")
+    age_log(60)
+    add_entry(client, auth, "new")
+    assert prune_log(30) > 0
+
+    response = client.get("/sync", params={"since": stale}, headers=auth).json()
+    assert response["reset"]
+    assert [e["text"] for e in response["journal"]["upserted"]] == ["old", "missed", "new"]
+
+    # The new token is valid again
+    add_entry(client, auth, "after reset")
+    follow_up = client.get("/sync", params={"since": response["token"]}, headers=auth).json()
+    assert not follow_up["reset"]
+    assert [e["text"] for e in follow_up["journal"]["upserted"]] == ["after reset"]
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def log_sessions(request, tmp_path):
+    """Sessions of a database of its own that log changes, on SQLite and (given TEST_POSTGRES_URL) PostgreSQL."""
+    if request.param == "sqlite":
+        db_engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}", connect_args={"check_same_thread": False})
+    elif os.getenv("TEST_POSTGRES_URL"):
+        db_engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    else:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    Base.metadata.create_all(bind=db_engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+    sync.install(factory)
+    yield factory
+    Base.metadata.drop_all(bind=db_engine)
+    db_engine.dispose()
+
+
+def test_token_never_skips_a_change_still_being_committed(log_sessions):
+    db = log_sessions()
+    user = User(email="sync-race@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    first = log_sessions()
+    first.add(JournalEntry(user_id=user_id, mood="calm", text="first"))
+    first.flush()  # logged, not committed
+
+    def second_writer():
+        second = log_sessions()
+        second.add(JournalEntry(user_id=user_id, mood="calm", text="second"))
+        second.commit()  # waits for the first writer
+        second.close()
+
+    writer = threading.Thread(target=second_writer)
+    writer.start()
+    writer.join(0.3)
+    reader = log_sessions()
+    token, payload, _, _ = sync.changes(reader, user_id)
+    reader.close()
+    assert payload["journal"]["upserted"] == []
+    first.commit()
+    first.close()
+    writer.join()
+
+    reader = log_sessions()
+    _, payload, _, _ = sync.changes(reader, user_id, since=sync.decode_token(token))
+    assert sorted(entry.text for entry in payload["journal"]["upserted"]) == ["first", "second"]
+    reader.close()
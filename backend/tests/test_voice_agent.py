@@ -0,0 +1,38 @@
+import asyncio
+
+from app.routes import voice_agent
+
+
+class EndlessUpstream:
+    def __init__(self):
+        self.closed = False
+        self.streams = []  # keeps the generators alive, so garbage collection can't close them for us
+
+    def stream_chat(self, agent_id, message):
+        stream = self._stream()
+        self.streams.append(stream)
+        return stream
+
+    async def _stream(self):
+        try:
+            while True:
+                yield "piece"
+        finally:
+            self.closed = True
+
+
+def test_cancelled_relay_closes_the_upstream_stream(monkeypatch):
+    upstream = EndlessUpstream()
+    monkeypatch.setattr(voice_agent, "omni_client", upstream)
+
+    async def scenario():
+        queue = asyncio.Queue(maxsize=1)
+        producer = asyncio.create_task(voice_agent._relay_upstream("agent", "hi", queue))
+        while not queue.full():
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)  # producer is now blocked in queue.put
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        assert upstream.closed
+
+    asyncio.run(scenario())
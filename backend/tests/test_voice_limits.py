@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.routes import voice_agent
+from app.voice_limits import LimitExceeded, PerUserLimiter, SingleFlight, UpstreamLimiter
+
+
+def test_identical_requests_in_flight_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await release.wait()
+            return "reply"
+
+        waiters = [asyncio.create_task(flight.do("key", call)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*waiters) == ["reply"] * 5
+        assert len(calls) == 1
+        assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+    asyncio.run(scenario())
+
+
+def test_error_reaches_every_waiter_and_is_not_kept():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("upstream down")
+
+        waiters = [asyncio.create_task(flight.do("key", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert [str(r) for r in results] == ["upstream down"] * 3
+
+        async def working():
+            return "reply"
+
+        # The failed call is forgotten, so the next request tries again
+        assert await flight.do("key", working) == "reply"
+
+    asyncio.run(scenario())
+
+
+def test_follower_giving_up_does_not_cancel_the_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "reply"
+
+        leader = asyncio.create_task(flight.do("key", call))
+        follower = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        follower.cancel()
+        release.set()
+        assert await leader == "reply"
+
+    asyncio.run(scenario())
+
+
+def test_per_user_cap():
+    limiter = PerUserLimiter(max_per_user=2)
+    limiter.acquire("user:1")
+    limiter.acquire("user:1")
+    limiter.acquire("user:2")
+    with pytest.raises(LimitExceeded) as raised:
+        limiter.acquire("user:1")
+    assert raised.value.status_code == 429
+    limiter.release("user:1")
+    limiter.acquire("user:1")
+    assert limiter.stats() == {"max_per_user": 2, "active_users": 2, "rejected": 1}
+
+
+def test_upstream_cap_rejects_beyond_the_queue_and_times_out_in_it():
+    async def scenario():
+        limiter = UpstreamLimiter(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+        async with limiter.slot():
+            # One caller may wait for the slot; it gives up after the queue timeout
+            waiting = asyncio.create_task(limiter.slot().__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(LimitExceeded) as rejected:
+                async with limiter.slot():
+                    pass
+            assert rejected.value.status_code == 503
+            with pytest.raises(LimitExceeded) as timed_out:
+                await waiting
+            assert timed_out.value.status_code == 503
+        async with limiter.slot():
+            pass
+        stats = limiter.stats()
+        assert (stats["admitted"], stats["rejected"], stats["timed_out"], stats["in_flight"]) == (2, 1, 1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_voice_chat_returns_429_and_503(monkeypatch):
+    client = TestClient(app)
+    limiter = PerUserLimiter(max_per_user=1)
+    monkeypatch.setattr(voice_agent, "user_limiter", limiter)
+    limiter.acquire("ip:testclient")
+    response = client.post("/voice-chat", json={"message": "hello", "cache": False})
+    assert response.status_code == 429 and response.headers["retry-after"] == "1"
+
+    limiter.release("ip:testclient")
+    busy = UpstreamLimiter(max_concurrency=1, max_queue=0)
+    busy._semaphore = asyncio.Semaphore(0)  # every slot taken
+    monkeypatch.setattr(voice_agent, "upstream_limiter", busy)
+    response = client.post("/voice-chat", json={"message": "hello", "cache": False})
+    assert response.status_code == 503 and response.headers["retry-after"] == "1"
+    assert limiter.stats()["active_users"] == 0
@@ -69,6 +69,67 @@ export const getRecommendations = async () => {
   return response.data;
 };
 
+// Voice agent reply streamed over server-sent events.
+// Calls onToken(text) for every piece as it arrives and resolves with the full reply.
+export const streamVoiceChat = async (message, onToken, signal) => {
+  // fetch doesn't go through the axios instance, so the token is added here;
+  // the server caps concurrent voice requests per user by it
+  const token = localStorage.getItem("shecare_token");
+  const headers = { "Content-Type": "application/json" };
+  if (token) headers["Authorization"] = `Bearer ${token}`;
+  const response = await fetch(`${BASE_URL}/voice-chat/stream`, {
+    method: "POST",
+    headers,
+    body: JSON.stringify({ message }),
+    signal,
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Voice chat failed with status ${response.status}`);
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let reply = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    // Events are separated by a blank line; keep any partial event in the buffer
+    const events = buffer.split("\n\n");
+    buffer = events.pop();
+    for (const raw of events) {
+      let event = "message";
+      let data = "";
+      raw.split("\n").forEach(line => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      if (!data) continue; // heartbeat
+      const payload = JSON.parse(data);
+      if (event === "token") {
+        reply += payload.text;
+        onToken(payload.text);
+      } else if (event === "done") {
+        return payload.response;
+      } else if (event === "error") {
+        throw new Error(payload.response);
+      }
+    }
+  }
+  return reply;
+};
+
+// Live dashboard updates over server-sent events.
+// Calls onUpdate(fields) with the full overview first, then with the fields that changed.
+// EventSource reconnects by itself; returns a function that closes the stream.
+export const subscribeDashboard = (token, onUpdate) => {
+  const source = new EventSource(`${BASE_URL}/events?token=${encodeURIComponent(token)}`);
+  ["overview", "delta"].forEach(name =>
+    source.addEventListener(name, e => onUpdate(JSON.parse(e.data)))
+  );
+  return () => source.close();
+};
+
 export const get = (url, config) => api.get(url, config);
 export const post = (url, data, config) => api.post(url, data, config);
 export const put = (url, data, config) => api.put(url, data, config);
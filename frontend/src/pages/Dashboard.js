@@ -23,12 +23,18 @@ const Dashboard = () => {
   useEffect(() => {
     setLoading(true);
     setError("");
-    api.get("/dashboard")
-      .then(res => setData(res.data))
+    api.get("/me/overview")
+      .then(res => setData({ ...res.data, name: res.data.profile.full_name }))
       .catch(() => setError("Failed to load dashboard data."))
       .finally(() => setLoading(false));
   }, []);
 
+  useEffect(() => {
+    const token = localStorage.getItem("shecare_token");
+    if (!token) return undefined;
+    return api.subscribeDashboard(token, fields => setData(prev => ({ ...prev, ...fields })));
+  }, []);
+
   return (
     <div style={{
       minHeight: "100vh",
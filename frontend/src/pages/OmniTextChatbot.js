@@ -1,6 +1,59 @@
-import React, { useEffect } from "react";
+import React, { useState, useRef, useEffect } from "react";
+import { streamVoiceChat } from "../api";
+
+const launcherStyle = {
+  position: "fixed",
+  bottom: 24,
+  left: 24,
+  width: 56,
+  height: 56,
+  borderRadius: "50%",
+  border: "none",
+  background: "linear-gradient(135deg, #f8bbd0 0%, #d72660 100%)",
+  color: "#fff",
+  fontSize: 26,
+  cursor: "pointer",
+  boxShadow: "0 4px 16px rgba(215, 38, 96, 0.3)",
+  zIndex: 1000
+};
+
+const panelStyle = {
+  position: "fixed",
+  bottom: 92,
+  left: 24,
+  width: 340,
+  maxWidth: "calc(100vw - 48px)",
+  height: 440,
+  background: "#fff",
+  borderRadius: 16,
+  boxShadow: "0 8px 32px rgba(215, 38, 96, 0.25)",
+  display: "flex",
+  flexDirection: "column",
+  overflow: "hidden",
+  zIndex: 1000
+};
+
+const bubbleStyle = (fromUser) => ({
+  alignSelf: fromUser ? "flex-end" : "flex-start",
+  background: fromUser ? "#d72660" : "#fce4ec",
+  color: fromUser ? "#fff" : "#b71c4a",
+  borderRadius: 12,
+  padding: "8px 12px",
+  margin: "4px 0",
+  maxWidth: "80%",
+  whiteSpace: "pre-wrap",
+  fontSize: 15
+});
 
 const OmniTextChatbot = () => {
+  const [open, setOpen] = useState(false);
+  const [messages, setMessages] = useState([]);
+  const [input, setInput] = useState("");
+  const [streaming, setStreaming] = useState(false);
+  const abortRef = useRef(null);
+  const endRef = useRef(null);
+
+  // The OmniDimension voice widget floats on its own; the streaming text panel sits next to it
   useEffect(() => {
     if (!document.getElementById("omnidimension-web-widget")) {
       const script = document.createElement("script");
@@ -11,7 +64,87 @@ const OmniTextChatbot = () => {
     }
   }, []);
 
-  return null; // Widget will appear automatically as a floating chat
+  useEffect(() => {
+    endRef.current?.scrollIntoView({ behavior: "smooth" });
+  }, [messages]);
+
+  // Closing the panel or leaving the page cancels the upstream request
+  useEffect(() => () => abortRef.current?.abort(), []);
+
+  const appendToReply = (text) => {
+    setMessages(prev => {
+      const next = [...prev];
+      const last = next[next.length - 1];
+      next[next.length - 1] = { ...last, text: last.text + text };
+      return next;
+    });
+  };
+
+  const sendMessage = async (e) => {
+    e.preventDefault();
+    const message = input.trim();
+    if (!message || streaming) return;
+    setInput("");
+    setMessages(prev => [...prev, { fromUser: true, text: message }, { fromUser: false, text: "" }]);
+    setStreaming(true);
+    const controller = new AbortController();
+    abortRef.current = controller;
+    try {
+      await streamVoiceChat(message, appendToReply, controller.signal);
+    } catch (err) {
+      if (err.name !== "AbortError") {
+        appendToReply("Sorry, I couldn't get a response right now.");
+      }
+    } finally {
+      setStreaming(false);
+      abortRef.current = null;
+    }
+  };
+
+  const closePanel = () => {
+    abortRef.current?.abort();
+    setOpen(false);
+  };
+
+  return (
+    <>
+      {open && (
+        <div style={panelStyle}>
+          <div style={{ background: "linear-gradient(90deg, #d72660 0%, #f8bbd0 100%)", color: "#fff", padding: "12px 16px", fontWeight: 600, display: "flex", justifyContent: "space-between" }}>
+            <span>SheBot</span>
+            <button onClick={closePanel} style={{ background: "none", border: "none", color: "#fff", fontSize: 22, cursor: "pointer" }} title="Close">×</button>
+          </div>
+          <div style={{ flex: 1, overflowY: "auto", padding: 12, display: "flex", flexDirection: "column" }}>
+            {messages.length === 0 && (
+              <div style={{ color: "#b71c4a", fontSize: 14, textAlign: "center", marginTop: 16 }}>
+                Ask me anything about your cycle, PCOS or wellness.
+              </div>
+            )}
+            {messages.map((m, i) => (
+              <div key={i} style={bubbleStyle(m.fromUser)}>
+                {m.text || (streaming && i === messages.length - 1 ? "…" : "")}
+              </div>
+            ))}
+            <div ref={endRef} />
+          </div>
+          <form onSubmit={sendMessage} style={{ display: "flex", borderTop: "1px solid #f8bbd0" }}>
+            <input
+              value={input}
+              onChange={e => setInput(e.target.value)}
+              placeholder="Type your question..."
+              style={{ flex: 1, border: "none", padding: 12, fontSize: 15, outline: "none" }}
+            />
+            <button type="submit" disabled={streaming || !input.trim()} style={{ border: "none", background: "#d72660", color: "#fff", padding: "0 16px", fontWeight: 600, cursor: "pointer" }}>
+              Send
+            </button>
+          </form>
+        </div>
+      )}
+      <button style={launcherStyle} onClick={() => (open ? closePanel() : setOpen(true))} title="Chat with SheBot">
+        💬
+      </button>
+    </>
+  );
 };
 
-export default OmniTextChatbot;
\ No newline at end of file
+export default OmniTextChatbot;